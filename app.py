@@ -4,15 +4,41 @@ A Streamlit app to add and delete annotations on Domo cards.
 Configured for Streamlit Cloud deployment.
 """
 
+import asyncio
+import contextlib
+import cProfile
+import csv
+import gzip
+import functools
+import hashlib
+import io
+import json
+import logging
+import os
+import pstats
+import queue
+import shutil
+import sqlite3
+import tempfile
+import time
+import threading
+import zlib
 import streamlit as st
 import requests
+import aiohttp
 import pandas as pd
-from typing import Any, Dict, List, Optional
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from datetime import datetime, date, timedelta
 from pathlib import Path
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.backends import default_backend
 import snowflake.connector
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+import migrations
+
+logger = logging.getLogger("annotations_manager")
 
 
 # ==========================
@@ -39,6 +65,959 @@ def check_password():
             st.error("Invalid username or password.")
     return False
 
+# ==========================
+# SHARED ANNOTATION STORE
+# ==========================
+class AnnotationStore:
+    """
+    Process-wide, versioned copy of the annotations table as a single pandas frame
+    with Arrow-backed strings. Sessions keep only their filters and read views from
+    it, so memory does not grow with the number of users.
+    
+    With a `delta_loader`, invalidate() only marks the copy stale: the next read
+    fetches the rows written and deleted since the last change watermark and merges
+    them in. The TTL still forces a full reload to pick up writes made outside the app.
+    Rows with a NULL DOMO_INSTANCE belong to `default_instance`.
+    """
+
+    COLUMNS = ["ID", "CARD_ID", "DOMO_USER_ID", "DOMO_USER_NAME", "COLOR", "CONTENT", "ENTRY_DATE", "CREATED_DATE", "DOMO_INSTANCE", "ROW_KEY"]
+
+    def __init__(self, loader, ttl_seconds: int, delta_loader=None, default_instance: Optional[str] = None):
+        self._loader = loader
+        self._delta_loader = delta_loader
+        self._default_instance = default_instance
+        self._ttl_seconds = ttl_seconds
+        self._lock = threading.RLock()
+        self._frame = None
+        self._stale = False
+        self._watermark = None
+        self._loaded_at = 0.0
+        self._last_access = 0.0
+        self.version = 0
+        threading.Thread(target=self._evict_when_idle, daemon=True).start()
+
+    def frame(self) -> pd.DataFrame:
+        """The full table, (re)loaded when missing or older than the TTL."""
+        return self.snapshot()[0]
+
+    def snapshot(self) -> Tuple[pd.DataFrame, int]:
+        """The full table together with the version it belongs to."""
+        with self._lock:
+            now = time.time()
+            if self._frame is None or now - self._loaded_at > self._ttl_seconds:
+                rows = self._loader()
+                self._frame = self.to_frame(rows)
+                self._watermark = self.high_water_mark(None, rows, "UPDATED_AT")
+                self._loaded_at = now
+                self._stale = False
+                self.version += 1
+            elif self._stale:
+                rows, tombstones = self._delta_loader(self._watermark)
+                if rows or tombstones:
+                    self._frame = self.merge_changes(self._frame, rows, tombstones, self._default_instance)
+                    self._watermark = self.high_water_mark(self._watermark, rows, "UPDATED_AT")
+                    self._watermark = self.high_water_mark(self._watermark, tombstones, "DELETED_AT")
+                    self.version += 1
+                self._stale = False
+            self._last_access = now
+            return self._frame, self.version
+
+    def view(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> pd.DataFrame:
+        """Rows with ENTRY_DATE in the range (YYYY-MM-DD strings, inclusive)."""
+        frame = self.frame()
+        mask = pd.Series(True, index=frame.index)
+        if start_date:
+            mask &= frame["ENTRY_DATE"] >= start_date
+        if end_date:
+            mask &= frame["ENTRY_DATE"] <= end_date
+        return frame[mask.fillna(False)]
+
+    def invalidate(self) -> None:
+        """Call after a write; the next read fetches the changes (or reloads without a delta loader)."""
+        with self._lock:
+            if self._delta_loader is None:
+                self._frame = None
+                self.version += 1
+            else:
+                self._stale = True
+
+    def _evict_when_idle(self) -> None:
+        while True:
+            time.sleep(60)
+            with self._lock:
+                if self._frame is not None and time.time() - self._last_access > self._ttl_seconds:
+                    self._frame = None
+
+    @classmethod
+    def to_frame(cls, rows: List[Dict[str, Any]]) -> pd.DataFrame:
+        frame = pd.DataFrame(rows, columns=cls.COLUMNS)
+        for column in ("ID", "CARD_ID", "DOMO_USER_ID"):
+            frame[column] = pd.to_numeric(frame[column]).astype("Int64")
+        frame["ENTRY_DATE"] = frame["ENTRY_DATE"].map(lambda v: None if v is None else str(v))
+        for column in ("ENTRY_DATE", "CONTENT", "COLOR", "DOMO_USER_NAME", "DOMO_INSTANCE", "ROW_KEY"):
+            frame[column] = frame[column].astype("string[pyarrow]")
+        frame["CREATED_DATE"] = pd.to_datetime(frame["CREATED_DATE"])
+        return frame
+    
+    @classmethod
+    def merge_changes(
+        cls,
+        frame: pd.DataFrame,
+        rows: List[Dict[str, Any]],
+        tombstones: List[Dict[str, Any]],
+        default_instance: Optional[str] = None
+    ) -> pd.DataFrame:
+        """
+        Apply changed rows and tombstones to a frame. They replace the rows with the
+        same ROW_KEY, or without one, the same (DOMO_INSTANCE, ID): Domo IDs are only
+        unique per instance, and a NULL instance is `default_instance`. Tombstones
+        without either (global rows deleted before ROW_KEY existed) match by
+        CONTENT + ENTRY_DATE, like the DELETE that made them.
+        """
+        changed = cls.to_frame(rows)
+        deleted = cls.to_frame(tombstones)
+        updates = pd.concat([changed, deleted], ignore_index=True)
+        drop = frame["ROW_KEY"].isin(updates["ROW_KEY"].dropna())
+        unkeyed = updates[updates["ROW_KEY"].isna() & updates["ID"].notna()]
+        if len(unkeyed):
+            def instance_ids(rows_frame: pd.DataFrame) -> pd.MultiIndex:
+                return pd.MultiIndex.from_arrays([
+                    rows_frame["DOMO_INSTANCE"].fillna(default_instance or "").astype(object),
+                    rows_frame["ID"].astype(object),
+                ])
+            drop |= instance_ids(frame).isin(instance_ids(unkeyed))
+        deleted_global = deleted[deleted["ID"].isna() & deleted["ROW_KEY"].isna()]
+        if len(deleted_global):
+            keys = ["CONTENT", "ENTRY_DATE"]
+            drop |= frame["ID"].isna() & pd.MultiIndex.from_frame(frame[keys]).isin(
+                pd.MultiIndex.from_frame(deleted_global[keys])
+            )
+        merged = pd.concat([frame[~drop.fillna(False)], changed], ignore_index=True)
+        # Global rows without a ROW_KEY have nothing to upsert on; deltas overlap, so drop repeats
+        repeated = merged["ID"].isna() & merged["ROW_KEY"].isna() & merged.duplicated(["CONTENT", "ENTRY_DATE", "COLOR", "CREATED_DATE"], keep="last")
+        merged = merged[~repeated]
+        return merged.sort_values("ENTRY_DATE", ascending=False, kind="stable", ignore_index=True)
+    
+    @staticmethod
+    def high_water_mark(current, rows: List[Dict[str, Any]], column: str):
+        """The later of `current` and the newest `column` value in rows."""
+        marks = [row[column] for row in rows if row.get(column) is not None]
+        if current is not None:
+            marks.append(current)
+        return max(marks) if marks else None
+
+
+class AnnotationSearchIndex:
+    """
+    In-memory SQLite FTS5 mirror of the annotation store's CONTENT column.
+    The trigram tokenizer gives substring matches, so Hebrew words are found
+    even with attached prefixes (ה, ו, ב, ל...). The mirror is rebuilt whenever
+    the store's version changes, i.e. after every reload or write.
+    """
+
+    def __init__(self, store: AnnotationStore):
+        self._store = store
+        self._lock = threading.Lock()
+        self._version = None
+        self._db = sqlite3.connect(":memory:", check_same_thread=False)
+        self._db.execute(
+            "CREATE VIRTUAL TABLE annotations_fts USING fts5(content, tokenize = 'trigram case_sensitive 0')"
+        )
+
+    def search(self, query: str, limit: int = 200) -> pd.DataFrame:
+        """Rows whose content contains every word of `query`, best matches first."""
+        terms = [term.replace('"', "") for term in query.split()]
+        terms = [term for term in terms if term]
+        with self._lock:
+            frame = self._refresh()
+            if not terms:
+                return frame.iloc[0:0]
+            indexed = [term for term in terms if len(term) >= 3]
+            if indexed:
+                match = " ".join(f'"{term}"' for term in indexed)
+                rows = self._db.execute(
+                    "SELECT rowid FROM annotations_fts WHERE annotations_fts MATCH ? ORDER BY rank",
+                    (match,)
+                ).fetchall()
+                results = frame.iloc[[row[0] for row in rows]]
+            else:
+                results = frame
+        # Trigrams need 3 characters - shorter words are matched on the candidates
+        for term in terms:
+            if len(term) < 3:
+                results = results[results["CONTENT"].str.contains(term, case=False, regex=False, na=False)]
+        return results.head(limit)
+
+    def _refresh(self) -> pd.DataFrame:
+        frame, version = self._store.snapshot()
+        if version != self._version:
+            with self._db:
+                self._db.execute("DELETE FROM annotations_fts")
+                self._db.executemany(
+                    "INSERT INTO annotations_fts (rowid, content) VALUES (?, ?)",
+                    ((i, content or "") for i, content in enumerate(frame["CONTENT"].tolist()))
+                )
+            self._version = version
+        return frame
+
+
+class CardCatalog:
+    """
+    Local SQLite index of every card - ID, title, page and dataset - across the
+    Domo instances, for typeahead search in the card pickers. A daemon thread
+    reloads it from `loader` every `refresh_seconds`. The file outlives restarts,
+    so a new process searches the last catalog while its first refresh runs.
+    
+    `loader()` returns dicts with card_ref, instance, card_id, title, page and
+    dataset; a failed load keeps the previous catalog and sets `last_error`.
+    """
+
+    def __init__(self, loader, path: str, refresh_seconds: int):
+        self._loader = loader
+        self._refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self.refreshed_at = None
+        self.last_error = None
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cards "
+                "(card_ref TEXT PRIMARY KEY, instance TEXT, card_id TEXT, title TEXT, page TEXT, dataset TEXT)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS cards_card_id ON cards (card_id)")
+            self._db.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS cards_fts USING fts5("
+                "title, page, dataset, content = 'cards', tokenize = 'trigram case_sensitive 0')"
+            )
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def search(self, query: str, limit: int = 50) -> List[Dict[str, str]]:
+        """
+        Cards whose ID (or card reference) starts with `query`, then cards whose
+        title, page or dataset contains every word of it. Both lookups read an
+        index and stop at `limit`, so the cost does not grow with the catalog.
+        """
+        terms = [term.replace('"', "") for term in query.split()]
+        terms = [term for term in terms if term]
+        if not terms:
+            return []
+        columns = "c.card_ref, c.title, c.page, c.dataset"
+        prefix = query.strip()
+        # Index range for "starts with": every string from the prefix up to its last character + 1
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        
+        # Trigrams need 3 characters - shorter words filter the FTS matches (or scan, if all are short)
+        indexed = [term for term in terms if len(term) >= 3]
+        short = [term for term in terms if len(term) < 3]
+        text_sql = f"SELECT {columns} FROM cards c"
+        text_params = []
+        conditions = []
+        if indexed:
+            text_sql += " JOIN cards_fts ON cards_fts.rowid = c.rowid"
+            conditions.append("cards_fts MATCH ?")
+            text_params.append(" ".join(f'"{term}"' for term in indexed))
+        for term in short:
+            # % and _ in the query are literal characters, not wildcards
+            pattern = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            conditions.append(
+                "(c.title LIKE ? ESCAPE '\\' OR c.page LIKE ? ESCAPE '\\' OR c.dataset LIKE ? ESCAPE '\\')"
+            )
+            text_params.extend([pattern] * 3)
+        text_sql += " WHERE " + " AND ".join(conditions) + " LIMIT ?"
+        
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {columns} FROM cards c WHERE (c.card_ref >= ? AND c.card_ref < ?) "
+                f"OR (c.card_id >= ? AND c.card_id < ?) ORDER BY c.card_id LIMIT ?",
+                (prefix, upper, prefix, upper, limit)
+            ).fetchall()
+            if len(rows) < limit:
+                rows += self._db.execute(text_sql, text_params + [limit]).fetchall()
+        
+        results = {}
+        for row in rows:
+            results.setdefault(row[0], dict(zip(("card_ref", "title", "page", "dataset"), row)))
+        return list(results.values())[:limit]
+
+    def titles(self, card_refs: List[str]) -> Dict[str, str]:
+        """{card_ref: title} for the cards that are in the catalog."""
+        if not card_refs:
+            return {}
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT card_ref, title FROM cards WHERE card_ref IN ({', '.join(['?'] * len(card_refs))})",
+                list(card_refs)
+            ).fetchall()
+        return dict(rows)
+
+    def size(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM cards").fetchone()[0]
+
+    def refresh(self) -> None:
+        """Replace the catalog with a fresh load. Raises on failure."""
+        cards = self._loader()
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM cards")
+            self._db.executemany(
+                "INSERT OR REPLACE INTO cards (card_ref, instance, card_id, title, page, dataset) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (card["card_ref"], card["instance"], card["card_id"], card["title"], card["page"], card["dataset"])
+                    for card in cards
+                ]
+            )
+            self._db.execute("INSERT INTO cards_fts (cards_fts) VALUES ('rebuild')")
+        self.refreshed_at = time.time()
+        self.last_error = None
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                self.last_error = str(e)
+            time.sleep(self._refresh_seconds)
+
+
+class CardWriteQueue:
+    """
+    Process-wide, per-card write queue. Annotation adds and deletes for the same
+    card that arrive within `window_seconds` - from any session - are merged into
+    one fetch + save, and saves to a card never overlap, so concurrent writers
+    no longer overwrite each other's changes.
+    
+    `flush(card_id, adds, deletes)` performs the merged write and returns the
+    created annotation (or None) for each add, in order.
+    """
+
+    def __init__(self, flush, window_seconds: float):
+        self._flush = flush
+        self._window_seconds = window_seconds
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._card_locks = {}
+
+    def add(self, card_id: str, annotation: Dict[str, Any]) -> Future:
+        """Queue a new annotation; the future resolves to the created Domo annotation or None."""
+        return self._submit(card_id, "adds", annotation)
+
+    def delete(self, card_id: str, annotation_id: int) -> Future:
+        """Queue a deletion; the future resolves to True once saved."""
+        return self._submit(card_id, "deletes", annotation_id)
+
+    def _submit(self, card_id: str, kind: str, item) -> Future:
+        future = Future()
+        with self._lock:
+            batch = self._pending.get(card_id)
+            if batch is None:
+                batch = self._pending[card_id] = {"adds": [], "deletes": []}
+                threading.Thread(target=self._drain, args=(card_id,), daemon=True).start()
+            batch[kind].append((item, future))
+        return future
+
+    def _drain(self, card_id: str) -> None:
+        time.sleep(self._window_seconds)
+        with self._lock:
+            card_lock = self._card_locks.setdefault(card_id, threading.Lock())
+        # Writes queued while an earlier save is in flight join this batch
+        with card_lock:
+            with self._lock:
+                batch = self._pending.pop(card_id)
+            adds = [annotation for annotation, _ in batch["adds"]]
+            deletes = list(dict.fromkeys(annotation_id for annotation_id, _ in batch["deletes"]))
+            try:
+                created = self._flush(card_id, adds, deletes)
+            except Exception as e:
+                for _, future in batch["adds"] + batch["deletes"]:
+                    future.set_exception(e)
+                return
+            # A flush that returns fewer annotations than adds leaves the rest unconfirmed
+            created = list(created or [])
+            for i, (_, future) in enumerate(batch["adds"]):
+                future.set_result(created[i] if i < len(created) else None)
+            for _, future in batch["deletes"]:
+                future.set_result(True)
+
+
+class AutoSyncScheduler:
+    """
+    Background poller that keeps registered cards synced from Domo. Each card's
+    poll interval adapts to how often it changes: halved after a poll that found
+    changes, doubled after one that did not, within [min_interval, max_interval].
+    Every poll draws from one token bucket of `budget_per_minute` Domo requests,
+    so the daemon's total load is capped however many cards are registered.
+    
+    `sync_card(card_id)` returns sync results, with the reason in `error` when
+    `failed` is set; errors are kept per card for status(), as the poller has no
+    script context to show them in. `load_cards()` returns the registered
+    card IDs and is re-read every `reload_seconds`; `on_change()` runs after a poll
+    that wrote to Snowflake.
+    """
+
+    def __init__(
+        self,
+        sync_card,
+        load_cards,
+        budget_per_minute: int,
+        min_interval: int,
+        max_interval: int,
+        on_change=None,
+        reload_seconds: int = 300
+    ):
+        self._sync_card = sync_card
+        self._load_cards = load_cards
+        self._budget = float(budget_per_minute)
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._on_change = on_change
+        self._reload_seconds = reload_seconds
+        self._lock = threading.Lock()
+        self._cards = {}
+        self._tokens = self._budget
+        self._refilled_at = time.time()
+        self._reloaded_at = 0.0
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def register(self, card_id: str) -> None:
+        """Start polling a card (first poll as soon as the budget allows)."""
+        with self._lock:
+            self._cards.setdefault(card_id, {
+                "interval": self._min_interval,
+                "next_run": time.time(),
+                "last_sync": None,
+                "last_change": None,
+                "last_error": None,
+                "polls": 0,
+            })
+
+    def unregister(self, card_id: str) -> None:
+        with self._lock:
+            self._cards.pop(card_id, None)
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Per-card schedule; `lag` is seconds since the last successful sync (None if never)."""
+        now = time.time()
+        with self._lock:
+            return [
+                {
+                    "card_id": card_id,
+                    "interval": state["interval"],
+                    "lag": now - state["last_sync"] if state["last_sync"] else None,
+                    "next_run_in": max(0.0, state["next_run"] - now),
+                    "last_change": state["last_change"],
+                    "last_error": state["last_error"],
+                    "polls": state["polls"],
+                }
+                for card_id, state in sorted(self._cards.items())
+            ]
+
+    def _take_token(self) -> bool:
+        now = time.time()
+        self._tokens = min(self._budget, self._tokens + (now - self._refilled_at) * self._budget / 60.0)
+        self._refilled_at = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    def _reload(self) -> None:
+        self._reloaded_at = time.time()
+        try:
+            registered = set(self._load_cards())
+        except Exception:
+            return
+        for card_id in registered:
+            self.register(card_id)
+        with self._lock:
+            for card_id in set(self._cards) - registered:
+                del self._cards[card_id]
+
+    def _run(self) -> None:
+        while True:
+            if time.time() - self._reloaded_at > self._reload_seconds:
+                self._reload()
+            card_id = None
+            with self._lock:
+                now = time.time()
+                due = [(state["next_run"], card_id) for card_id, state in self._cards.items() if state["next_run"] <= now]
+                if due and self._take_token():
+                    card_id = min(due)[1]
+            if card_id is None:
+                time.sleep(1)
+                continue
+            self._poll(card_id)
+
+    def _poll(self, card_id: str) -> None:
+        try:
+            results = self._sync_card(card_id)
+            error = (results.get("error") or "sync failed") if results.get("failed") else None
+        except Exception as e:
+            results, error = {}, str(e)
+        changed = results.get("inserted", 0) + results.get("updated", 0)
+        now = time.time()
+        with self._lock:
+            state = self._cards.get(card_id)
+            if state is None:
+                return
+            state["polls"] += 1
+            state["last_error"] = error
+            if not error:
+                state["last_sync"] = now
+                if changed:
+                    state["last_change"] = now
+                    state["interval"] = max(self._min_interval, state["interval"] / 2)
+                else:
+                    state["interval"] = min(self._max_interval, state["interval"] * 2)
+            # A failed poll is retried at the card's current pace
+            state["next_run"] = now + state["interval"]
+        if changed and self._on_change:
+            self._on_change()
+
+
+class RateLimiter:
+    """
+    Process-wide request pacing for one Domo instance. `reserve()` books the next
+    request slot at `per_second` and returns how long the caller must wait for
+    it (0 when unlimited), so threads (time.sleep) and coroutines (asyncio.sleep)
+    share one schedule.
+    """
+
+    def __init__(self, per_second: float):
+        self._interval = 1.0 / per_second if per_second > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def reserve(self) -> float:
+        if not self._interval:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self._interval
+            return slot - now
+
+
+class LatencyTracker:
+    """
+    Rolling latency samples per endpoint of one Domo instance, shared by threads
+    and coroutines. `percentile()` is None until an endpoint has `min_samples`,
+    so nothing is hedged before there is a baseline.
+    """
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self._window = window
+        self._min_samples = min_samples
+        self._lock = threading.Lock()
+        self._samples = {}
+
+    def record(self, endpoint: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(endpoint, deque(maxlen=self._window)).append(seconds)
+
+    def percentile(self, endpoint: str, pct: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(endpoint, ()))
+        if len(samples) < self._min_samples:
+            return None
+        return self._pick(samples, pct)
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """p50 / p95 / p99 in milliseconds and sample count, per endpoint."""
+        with self._lock:
+            endpoints = {endpoint: sorted(samples) for endpoint, samples in self._samples.items()}
+        return [
+            {
+                "Endpoint": endpoint,
+                "Samples": len(samples),
+                **{f"p{pct} ms": round(self._pick(samples, pct) * 1000, 1) for pct in (50, 95, 99)},
+            }
+            for endpoint, samples in endpoints.items() if samples
+        ]
+
+    @staticmethod
+    def _pick(sorted_samples: List[float], pct: float) -> float:
+        return sorted_samples[min(len(sorted_samples) - 1, int(len(sorted_samples) * pct / 100))]
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a Domo instance while its circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Process-wide failure gate for one Domo instance. Once at least `min_requests`
+    calls were made in the last `window_seconds` and `error_rate` of them failed,
+    the circuit opens and `allow()` refuses calls for `cooldown_seconds`. Then one
+    trial call is let through: success closes the circuit, failure reopens it.
+    """
+
+    def __init__(self, error_rate: float, min_requests: int, window_seconds: float, cooldown_seconds: float):
+        self._error_rate = error_rate
+        self._min_requests = min_requests
+        self._window_seconds = window_seconds
+        self._cooldown_seconds = cooldown_seconds
+        self._lock = threading.Lock()
+        self._outcomes = deque()
+        self._opened_at = None
+        self._trial_at = None
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self._opened_at < self._cooldown_seconds:
+                return False
+            # One trial at a time; a trial that never reported back is replaced after a cooldown
+            if self._trial_at is not None and now - self._trial_at < self._cooldown_seconds:
+                return False
+            self._trial_at = now
+            return True
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if self._opened_at is not None:
+                if self._trial_at is None:
+                    return
+                # The trial's outcome decides; late answers from before the opening land here too
+                self._trial_at = None
+                self._opened_at = None if ok else now
+                return
+            self._outcomes.append((now, ok))
+            while self._outcomes and now - self._outcomes[0][0] > self._window_seconds:
+                self._outcomes.popleft()
+            failures = sum(1 for _, outcome_ok in self._outcomes if not outcome_ok)
+            if len(self._outcomes) >= self._min_requests and failures >= self._error_rate * len(self._outcomes):
+                self._opened_at = now
+                self._outcomes.clear()
+
+    def retry_in(self) -> Optional[float]:
+        """None while closed, else seconds until the next trial call (0 once it is due)."""
+        with self._lock:
+            if self._opened_at is None:
+                return None
+            return max(0.0, self._cooldown_seconds - (time.monotonic() - self._opened_at))
+
+
+class RerunProfiler:
+    """
+    Per-session section timings for profiling mode. `begin()` / `end()` bracket a
+    full rerun; a `section()` entered with no rerun open (a fragment rerun, or a
+    deferred download) records a rerun of its own. With `deep`, cProfile runs for
+    each rerun and its stats are kept for the hot-function table and download.
+    """
+
+    def __init__(self, deep: bool = False, keep: int = 20):
+        self.deep = deep
+        self.history = deque(maxlen=keep)
+        self._current = None
+        self._profile = None
+        self._stats = None
+        self._lock = threading.Lock()
+
+    def begin(self, scope: str) -> None:
+        """
+        Open a rerun record; one left open by an interrupted rerun is dropped. If
+        cProfile cannot start (Python 3.12+ allows one active profiler per process,
+        so another session may hold it), the rerun is timed without it.
+        """
+        with self._lock:
+            if self._profile is not None:
+                self._profile.disable()
+            self._current = {"scope": scope, "started": time.time(), "sections": [], "depth": 0, "cprofile": self.deep}
+            self._profile = cProfile.Profile() if self.deep else None
+            if self._profile is not None:
+                try:
+                    self._profile.enable()
+                except ValueError as e:
+                    logger.warning("cProfile skipped for rerun %s: %s", scope, e)
+                    self._profile = None
+                    self._current["cprofile"] = False
+
+    def end(self) -> Optional[Dict[str, Any]]:
+        """Close the open rerun record and return it."""
+        with self._lock:
+            record, self._current = self._current, None
+            profile, self._profile = self._profile, None
+            if record is None:
+                return None
+            if profile is not None:
+                profile.disable()
+                self._stats = pstats.Stats(profile)
+            record["seconds"] = time.time() - record.pop("started")
+            record.pop("depth")
+            self.history.append(record)
+        logger.info("Rerun %s took %.0f ms", record["scope"], record["seconds"] * 1000)
+        return record
+
+    @contextlib.contextmanager
+    def section(self, name: str):
+        """Time a block; nested sections are indented in the breakdown."""
+        own_rerun = self._current is None
+        if own_rerun:
+            self.begin(name)
+        record = self._current
+        entry = {"section": name, "depth": record["depth"], "seconds": None}
+        record["sections"].append(entry)
+        record["depth"] += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry["seconds"] = time.perf_counter() - started
+            record["depth"] -= 1
+            if own_rerun:
+                self.end()
+
+    def hot_functions(self, limit: int = 25) -> pd.DataFrame:
+        """Top functions by cumulative time in the last deep-profiled rerun."""
+        if self._stats is None:
+            return pd.DataFrame()
+        rows = []
+        for (path, line, function), (_, calls, own, cumulative, _) in self._stats.stats.items():
+            rows.append({
+                "Function": f"{function} ({Path(path).name}:{line})",
+                "Calls": calls,
+                "Own ms": round(own * 1000, 1),
+                "Cumulative ms": round(cumulative * 1000, 1),
+            })
+        return pd.DataFrame(rows).sort_values("Cumulative ms", ascending=False).head(limit)
+
+    def profile_bytes(self) -> bytes:
+        """Last deep profile in pstats format (snakeviz / `python -m pstats`)."""
+        if self._stats is None:
+            return b""
+        with tempfile.NamedTemporaryFile(suffix=".prof", delete=False) as f:
+            path = f.name
+        try:
+            self._stats.dump_stats(path)
+            return Path(path).read_bytes()
+        finally:
+            os.remove(path)
+
+
+def frame_records(frame: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Rows of a store view as plain dicts (missing values as None)."""
+    return frame.astype(object).where(frame.notna(), None).to_dict("records")
+
+
+def parse_import_row(
+    row: Dict[str, Any], colors: Dict[str, str], date_formats: List[str], card_ref_from_input
+) -> Dict[str, Any]:
+    """
+    Check one import row and return {"content", "entry_date", "color", "card_refs"}.
+    Raises ValueError naming the problem. The color may be a name or hex value of
+    `colors` (Blue if empty); cards are optional and may list several IDs, each
+    resolved by `card_ref_from_input` (None = unknown card).
+    """
+    content = str(row.get("content") or "").strip()
+    if not content:
+        raise ValueError("Content is empty")
+
+    raw_date = row.get("date")
+    if isinstance(raw_date, datetime):
+        entry_date = raw_date.date()
+    elif isinstance(raw_date, date):
+        entry_date = raw_date
+    else:
+        entry_date = None
+        for date_format in date_formats:
+            try:
+                entry_date = datetime.strptime(str(raw_date or "").strip(), date_format).date()
+                break
+            except ValueError:
+                continue
+        if entry_date is None:
+            raise ValueError(f"Date '{raw_date or ''}' is not YYYY-MM-DD or DD/MM/YYYY")
+
+    raw_color = str(row.get("color") or "").strip()
+    colors_by_name = {name.lower(): hex_color for name, hex_color in colors.items()}
+    colors_by_hex = {hex_color.lower(): hex_color for hex_color in colors.values()}
+    color = colors_by_name.get(raw_color.lower()) or colors_by_hex.get(raw_color.lower())
+    if not raw_color:
+        color = colors["Blue"]
+    elif color is None:
+        raise ValueError(f"Unknown color '{raw_color}' - use one of {', '.join(colors)}")
+
+    raw_cards = row.get("cards")
+    if isinstance(raw_cards, float) and raw_cards.is_integer():
+        raw_cards = int(raw_cards)
+    card_refs = []
+    for card_input in str(raw_cards or "").replace(";", ",").replace(" ", ",").split(","):
+        if not card_input:
+            continue
+        card_ref = card_ref_from_input(card_input)
+        if card_ref is None:
+            raise ValueError(f"Unknown card or Domo instance: {card_input}")
+        if card_ref not in card_refs:
+            card_refs.append(card_ref)
+
+    return {
+        "content": content,
+        "entry_date": entry_date.strftime("%Y-%m-%d"),
+        "color": color,
+        "card_refs": card_refs,
+    }
+
+
+def plan_push(
+    rows_by_key: Dict[str, Dict[str, Any]], already_pushed: Dict[str, int], load_card_annotations
+) -> Tuple[Dict[str, Dict[str, Any]], List[Tuple[str, int]]]:
+    """
+    Split Snowflake rows bound for a Domo card, keyed by their source key, into the
+    rows still to push and (source_key, domo_annotation_id) pairs to adopt. Rows the
+    mapping index lists in `already_pushed` are left out. Rows whose text, date and
+    color are already on the card (e.g. pushed before the index existed) are
+    adopted. `load_card_annotations()` returns the card's Domo annotations and is
+    only called when a row is missing from the index.
+    """
+    missing = {key: row for key, row in rows_by_key.items() if key not in already_pushed}
+    if not missing:
+        return missing, []
+
+    on_card = {
+        (ann.get("content"), ann.get("dataPoint", {}).get("point1"), ann.get("color")): ann.get("id")
+        for ann in load_card_annotations()
+    }
+    adopted = []
+    for key, row in list(missing.items()):
+        domo_id = on_card.get((row.get("CONTENT"), str(row.get("ENTRY_DATE", "")), row.get("COLOR")))
+        if domo_id is not None:
+            adopted.append((key, domo_id))
+            del missing[key]
+    return missing, adopted
+
+
+def diff_card_annotations(
+    instance: str,
+    card_id: str,
+    domo_annotations: List[Dict[str, Any]],
+    sf_annotations: List[Dict[str, Any]],
+    default_instance: str
+) -> Dict[str, Any]:
+    """
+    Compare a card's Domo annotations with its Snowflake rows. The card is
+    `card_id` on Domo `instance`; rows with no instance belong to `default_instance`.
+    Returns {"inserts": [...], "updates": [...], "skipped": n} where inserts and
+    updates are parameter tuples for apply_sync_changes.
+    """
+    changes = {"inserts": [], "updates": [], "skipped": 0}
+    domo_by_id = {ann.get("id"): ann for ann in domo_annotations}
+
+    # Only Snowflake rows with an ID can match a Domo annotation
+    sf_by_id = {ann["ID"]: ann for ann in sf_annotations if ann.get("ID") is not None}
+
+    # Domo → Snowflake: Add missing, update changed
+    for ann_id, ann in domo_by_id.items():
+        entry_date = ann.get("dataPoint", {}).get("point1", "")
+        content = ann.get("content", "")
+        color = ann.get("color", "")
+        user_id = ann.get("userId", 0)
+        user_name = ann.get("userName", "Unknown")
+
+        # Convert Domo createdDate (milliseconds) to timestamp
+        created_ts = ann.get("createdDate", 0)
+        created_date = datetime.fromtimestamp(created_ts / 1000) if created_ts else None
+
+        if ann_id in sf_by_id:
+            # Check if update needed (content, color, or missing created_date)
+            sf_ann = sf_by_id[ann_id]
+            needs_update = (
+                sf_ann["CONTENT"] != content or
+                sf_ann["COLOR"] != color or
+                sf_ann.get("CREATED_DATE") is None
+            )
+
+            if needs_update:
+                changes["updates"].append((
+                    content, color, entry_date, user_id, user_name, created_date, instance,
+                    ann_id, default_instance, instance
+                ))
+            else:
+                changes["skipped"] += 1
+        else:
+            changes["inserts"].append((int(card_id), ann_id, user_id, user_name, color, content, entry_date, created_date, instance))
+
+    return changes
+
+
+def resolve_created_annotations(
+    before_ids: set,
+    new_annotations: List[Dict[str, Any]],
+    save_response: Optional[Dict[str, Any]],
+    load_card_annotations
+) -> List[Optional[Dict[str, Any]]]:
+    """
+    Match annotations just saved to a card with the created Domo annotations.
+    Uses the save response when it carries the card's annotations, otherwise
+    calls `load_card_annotations()` once for the card's current annotations.
+    Only annotations whose IDs were not on the card before the save
+    (`before_ids`) are candidates, so an older annotation with the same text and
+    date is never picked.
+    Returns one created annotation (or None) per entry of `new_annotations`.
+    """
+    def created_from(annotations) -> List[Dict[str, Any]]:
+        created = [ann for ann in annotations if ann.get("id") not in before_ids]
+        return sorted(created, key=lambda ann: ann.get("id") or 0)
+
+    def match(created: List[Dict[str, Any]], resolved: List[Optional[Dict[str, Any]]]) -> None:
+        taken = {ann.get("id") for ann in resolved if ann}
+        for i, new_ann in enumerate(new_annotations):
+            if resolved[i] is not None:
+                continue
+            for ann in created:
+                if (
+                    ann.get("id") not in taken
+                    and ann.get("content") == new_ann.get("content")
+                    and ann.get("dataPoint", {}).get("point1") == new_ann.get("dataPoint", {}).get("point1")
+                    and ann.get("color", new_ann.get("color")) == new_ann.get("color")
+                ):
+                    resolved[i] = ann
+                    taken.add(ann.get("id"))
+                    break
+
+    resolved = [None] * len(new_annotations)
+
+    # The save response may already list the card's annotations
+    response_annotations = None
+    if isinstance(save_response, dict):
+        for candidate in (save_response.get("annotations"), (save_response.get("definition") or {}).get("annotations")):
+            if isinstance(candidate, list):
+                response_annotations = candidate
+                break
+    if response_annotations is not None:
+        match(created_from(response_annotations), resolved)
+
+    # Fall back to one targeted refetch for anything still unresolved
+    if any(ann is None for ann in resolved):
+        match(created_from(load_card_annotations()), resolved)
+
+    return resolved
+
+
+def stream_sync_chunks(
+    domo_annotations: List[Dict[str, Any]], chunk_size: int
+) -> Iterator[Tuple[List[Dict[str, Any]], Optional[Tuple[Optional[str], str]], Optional[Tuple[int, int]]]]:
+    """
+    Split a card's Domo annotations into stream_card_sync chunks of `chunk_size`,
+    in (ENTRY_DATE, ID) order. Yields (chunk, date_range, id_range): the Snowflake
+    rows that can match a chunk lie within its (first, last) ENTRY_DATE and its
+    (min, max) ID. The ID bounds keep a date shared with the neighbouring chunks
+    from being read in full. A chunk of undated annotations has no date_range;
+    those are matched by ID alone (add_moved_annotations).
+    """
+    def entry_date(ann: Dict[str, Any]) -> str:
+        return ann.get("dataPoint", {}).get("point1", "") or ""
+
+    ordered = sorted(domo_annotations, key=lambda ann: (entry_date(ann), ann.get("id") or 0))
+    for i in range(0, len(ordered), chunk_size):
+        chunk = ordered[i:i + chunk_size]
+        first, last = entry_date(chunk[0]), entry_date(chunk[-1])
+        ids = [ann["id"] for ann in chunk if ann.get("id") is not None]
+        yield chunk, (first or None, last) if last else None, (min(ids), max(ids)) if ids else None
+
+
 # ==========================
 # PAGE CONFIG & STYLING
 # ==========================
@@ -321,6 +1300,63 @@ def main():
     # ==========================
     DOMO_INSTANCE = st.secrets["domo"]["instance"]
     DOMO_DEVELOPER_TOKEN = st.secrets["domo"]["developer_token"]
+    # Max in-flight requests when fanning out across many cards
+    DOMO_MAX_CONCURRENCY = int(st.secrets["domo"].get("max_concurrency", 16))
+    # Requests per second to an instance (0 = unlimited)
+    DOMO_REQUESTS_PER_SECOND = float(st.secrets["domo"].get("requests_per_second", 0))
+    # Definition reads slower than this percentile of the endpoint's recent reads get a
+    # second, hedged request (0 = never hedge)
+    DOMO_HEDGE_PERCENTILE = float(st.secrets["domo"].get("hedge_percentile", 95))
+    # Circuit breaker: once breaker_error_rate of at least breaker_min_requests calls to an
+    # instance within breaker_window_seconds failed, its calls fail fast for breaker_cooldown_seconds
+    DOMO_BREAKER_ERROR_RATE = float(st.secrets["domo"].get("breaker_error_rate", 0.5))
+    DOMO_BREAKER_MIN_REQUESTS = int(st.secrets["domo"].get("breaker_min_requests", 10))
+    DOMO_BREAKER_WINDOW = float(st.secrets["domo"].get("breaker_window_seconds", 30))
+    DOMO_BREAKER_COOLDOWN = float(st.secrets["domo"].get("breaker_cooldown_seconds", 30))
+    # Local card catalog behind the card pickers' search, and how often it is reloaded
+    CARD_CATALOG_PATH = st.secrets["domo"].get(
+        "card_catalog_path", os.path.join(tempfile.gettempdir(), f"card_catalog_{DOMO_INSTANCE}.db")
+    )
+    CARD_CATALOG_REFRESH = int(st.secrets["domo"].get("card_catalog_refresh_seconds", 3600))
+    # Every Domo instance sharing the annotation table: [domo] is the default one, more go
+    # in [domo.instances.<instance>] with developer_token and optional max_concurrency /
+    # requests_per_second. Cards on them are referenced as "<instance>:<card ID>".
+    DOMO_INSTANCES = {
+        DOMO_INSTANCE: {
+            "token": DOMO_DEVELOPER_TOKEN,
+            "max_concurrency": DOMO_MAX_CONCURRENCY,
+            "requests_per_second": DOMO_REQUESTS_PER_SECOND,
+        },
+    }
+    for instance_name, instance_secrets in st.secrets["domo"].get("instances", {}).items():
+        DOMO_INSTANCES[instance_name] = {
+            "token": instance_secrets["developer_token"],
+            "max_concurrency": int(instance_secrets.get("max_concurrency", DOMO_MAX_CONCURRENCY)),
+            "requests_per_second": float(instance_secrets.get("requests_per_second", DOMO_REQUESTS_PER_SECOND)),
+        }
+    # Opt-in: annotation saves send only these definition fields instead of the whole card.
+    # The full definition is the only save body checked against Domo; a trimmed one may be
+    # accepted with the left-out settings dropped, which no status code would show
+    DOMO_MINIMAL_SAVES = bool(st.secrets["domo"].get("minimal_saves", False))
+    DOMO_SAVE_FIELDS = list(st.secrets["domo"].get("save_fields", [
+        "title", "dynamicTitle", "dynamicDescription", "description", "controls",
+        "annotations", "formulas", "conditionalFormats", "segments",
+    ]))
+    # gzip save bodies of at least GZIP_MIN_BYTES (only if the instance accepts Content-Encoding: gzip)
+    DOMO_GZIP_SAVES = bool(st.secrets["domo"].get("gzip_saves", False))
+    GZIP_MIN_BYTES = 4096
+    # Writes to the same card within this window are merged into one save
+    DOMO_WRITE_WINDOW = float(st.secrets["domo"].get("write_window_seconds", 0.2))
+    # Seconds before a single Domo request is abandoned
+    DOMO_REQUEST_TIMEOUT = 60
+    # A session stops waiting on a queued card write after the merge window plus a fetch,
+    # a save, one retried save and a refetch, each at the request timeout
+    DOMO_WRITE_TIMEOUT = DOMO_WRITE_WINDOW + 4 * DOMO_REQUEST_TIMEOUT
+    # Background auto-sync of registered cards (enable on one instance only)
+    AUTO_SYNC_ENABLED = bool(st.secrets["domo"].get("auto_sync", False))
+    AUTO_SYNC_BUDGET = int(st.secrets["domo"].get("auto_sync_requests_per_minute", 30))
+    AUTO_SYNC_MIN_INTERVAL = int(st.secrets["domo"].get("auto_sync_min_interval_seconds", 300))
+    AUTO_SYNC_MAX_INTERVAL = int(st.secrets["domo"].get("auto_sync_max_interval_seconds", 86400))
     
     # Snowflake configuration
     SNOWFLAKE_CONFIG = {
@@ -333,6 +1369,29 @@ def main():
         "role": st.secrets["snowflake"]["role"],
     }
     SNOWFLAKE_TABLE = st.secrets["snowflake"]["table"]
+    # How long the shared annotation store and per-session views stay cached
+    ANNOTATION_STORE_TTL = int(st.secrets["snowflake"].get("store_ttl_seconds", 1800))
+    # (Snowflake row, target card) -> Domo annotation ID, keeps pushes idempotent
+    SNOWFLAKE_MAPPING_TABLE = st.secrets["snowflake"].get("mapping_table", f"{SNOWFLAKE_TABLE}_DOMO_MAP")
+    # Deleted rows, so cached copies can drop them on a delta refresh
+    SNOWFLAKE_TOMBSTONE_TABLE = st.secrets["snowflake"].get("tombstone_table", f"{SNOWFLAKE_TABLE}_TOMBSTONES")
+    # Per-card progress of long-running sync jobs
+    SNOWFLAKE_CHECKPOINT_TABLE = st.secrets["snowflake"].get("checkpoint_table", f"{SNOWFLAKE_TABLE}_JOB_CHECKPOINTS")
+    # A job only resumes from checkpoints this recent; older ones are ignored and deleted,
+    # since the cards they mark as done may have changed in Domo since
+    CHECKPOINT_TTL_HOURS = int(st.secrets["snowflake"].get("checkpoint_ttl_hours", 12))
+    # Cards registered for background auto-sync
+    SNOWFLAKE_AUTO_SYNC_TABLE = st.secrets["snowflake"].get("auto_sync_table", f"{SNOWFLAKE_TABLE}_AUTO_SYNC")
+    # Cards with more annotations than this (Domo or Snowflake side) sync in streamed chunks
+    SYNC_STREAM_THRESHOLD = int(st.secrets["snowflake"].get("stream_sync_threshold", 20000))
+    # Domo annotations per streamed chunk - bounds sync memory per card
+    SYNC_STREAM_CHUNK = int(st.secrets["snowflake"].get("stream_sync_chunk", 5000))
+    
+    # Profiling mode, an admin setting (never a URL parameter): app_auth.profiling = "on" times
+    # each section, "full" adds cProfile and a profile download
+    PROFILING_MODE = str(st.secrets["app_auth"].get("profiling", "")).lower()
+    PROFILING_ENABLED = PROFILING_MODE in ("1", "true", "on", "full")
+    PROFILING_DEEP = PROFILING_MODE == "full"
     
     # Available colors for annotations
     ANNOTATION_COLORS = {
@@ -354,12 +1413,223 @@ def main():
         "Purple": "🟣 Purple",
     }
     
+    # Cards processed per rerun by multi-card Sync / Push (definitions fetched concurrently)
+    CARD_BATCH_SIZE = 10
+    # Cards buffered between pipelined sync stages
+    PIPELINE_QUEUE_SIZE = 2 * CARD_BATCH_SIZE
+    # Cards whose Snowflake rows a sync reads in one query
+    SYNC_PREFETCH_CARDS = 200
+    # Delta refreshes re-read this much before the watermark to catch late commits
+    CHANGE_OVERLAP_SECONDS = 60
+    # Tombstones outlive any cached copy (which fully reloads every ANNOTATION_STORE_TTL)
+    TOMBSTONE_RETENTION_DAYS = 7
+    
+    # Catalog matches offered by a card picker search
+    CARD_SEARCH_RESULTS = 50
+    # Rows per executemany in batched Snowflake inserts (bulk import, replication)
+    INSERT_CHUNK_ROWS = 1000
+    
+    # Bulk import: accepted header names per field, and date formats
+    IMPORT_COLUMNS = {
+        "content": ("content", "text", "annotation"),
+        "date": ("date", "entry_date"),
+        "color": ("color", "colour"),
+        "cards": ("card", "cards", "card_id", "card_ids"),
+    }
+    IMPORT_DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y"]
+    
     # Preset card IDs (add more as needed)
     PRESET_CARD_IDS = [
         "954563232",
     ]
     
     
+    # ==========================
+    # DOMO INSTANCES
+    # ==========================
+    def parse_card_ref(card_ref) -> Tuple[str, str]:
+        """(instance, card ID) of a card reference: "123" on the default instance, or "instance:123"."""
+        text = str(card_ref).strip()
+        if ":" in text:
+            instance, card_id = text.split(":", 1)
+            return instance.strip(), card_id.strip()
+        return DOMO_INSTANCE, text
+    
+    
+    def format_card_ref(instance: Optional[str], card_id) -> str:
+        """Card reference for a card; cards on the default instance stay plain IDs."""
+        card_id = str(int(card_id)) if isinstance(card_id, float) else str(card_id)
+        if not isinstance(instance, str) or not instance or instance == DOMO_INSTANCE:
+            return card_id
+        return f"{instance}:{card_id}"
+    
+    
+    def instance_filter(instance: Optional[str]) -> Tuple[str, List[str]]:
+        """
+        SQL condition and params matching rows of a Domo instance. Rows written
+        before the DOMO_INSTANCE column existed (NULL) belong to the default instance.
+        """
+        instance = instance or DOMO_INSTANCE
+        if instance == DOMO_INSTANCE:
+            return "(DOMO_INSTANCE = %s OR DOMO_INSTANCE IS NULL)", [instance]
+        return "DOMO_INSTANCE = %s", [instance]
+    
+    
+    def card_refs_filter(card_refs: List[str]) -> Tuple[str, List[Any]]:
+        """SQL condition and params matching rows of any of the cards, per instance."""
+        by_instance = {}
+        for ref in card_refs:
+            instance, card_id = parse_card_ref(ref)
+            by_instance.setdefault(instance, []).append(int(card_id))
+        conditions, params = [], []
+        for instance, card_ids in by_instance.items():
+            condition, instance_params = instance_filter(instance)
+            conditions.append(f"(CARD_ID IN ({', '.join(['%s'] * len(card_ids))}) AND {condition})")
+            params.extend(card_ids + instance_params)
+        return "(" + " OR ".join(conditions) + ")", params
+    
+    
+    def row_card_ref(row: Dict[str, Any]) -> str:
+        """Card reference of a Snowflake annotation row."""
+        return format_card_ref(row.get("DOMO_INSTANCE"), row["CARD_ID"])
+    
+    
+    def card_ref_from_input(card_input) -> Optional[str]:
+        """
+        Card reference from a card picker value - a preset "Name (ID)", "ID" or
+        "instance:ID". None if the ID is not numeric or the instance is not registered.
+        """
+        text = str(card_input).strip()
+        if "(" in text and ")" in text:
+            text = text.split("(")[-1].rstrip(")")
+        instance, card_id = parse_card_ref(text)
+        if instance not in DOMO_INSTANCES or not card_id.isdigit():
+            return None
+        return format_card_ref(instance, card_id)
+    
+    
+    @st.cache_resource
+    def domo_instance_pool(instance: str) -> Dict[str, Any]:
+        """
+        Process-wide HTTP connection pools, rate limiter, latency tracker and circuit
+        breaker of one registered instance, plus the slots that cap its hedged reads.
+        Concurrent calls run on the instance's own event loop thread, through one
+        aiohttp session that loop opens on first use (pool_client_session).
+        """
+        if instance not in DOMO_INSTANCES:
+            raise ValueError(f"Unknown Domo instance: {instance}")
+        config = DOMO_INSTANCES[instance]
+        session = requests.Session()
+        session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=config["max_concurrency"]))
+        return {
+            "instance": instance,
+            "token": config["token"],
+            "max_concurrency": config["max_concurrency"],
+            "session": session,
+            "limiter": RateLimiter(config["requests_per_second"]),
+            "latency": LatencyTracker(),
+            "breaker": CircuitBreaker(
+                DOMO_BREAKER_ERROR_RATE, DOMO_BREAKER_MIN_REQUESTS, DOMO_BREAKER_WINDOW, DOMO_BREAKER_COOLDOWN
+            ),
+            # At most a quarter of the in-flight reads hedge at once
+            "max_hedges": max(1, config["max_concurrency"] // 4),
+            "hedge_slots": threading.Semaphore(max(1, config["max_concurrency"] // 4)),
+            "loop": start_event_loop(f"domo-{instance}"),
+            "aio_session": None,
+        }
+    
+    
+    def start_event_loop(name: str) -> asyncio.AbstractEventLoop:
+        """A new event loop running forever on a daemon thread."""
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, name=name, daemon=True).start()
+        return loop
+    
+    
+    def domo_pool(instance: str) -> Dict[str, Any]:
+        """This process's pool for a Domo instance. Raises for an unregistered instance."""
+        return domo_instance_pool(instance)
+    
+    
+    def check_circuit(pool: Dict[str, Any]) -> None:
+        """Raise CircuitOpenError, without calling Domo, while the instance's breaker is open."""
+        if not pool["breaker"].allow():
+            raise CircuitOpenError(
+                f"Domo instance {pool['instance']} is failing - calls are paused for "
+                f"{pool['breaker'].retry_in() or 0:.0f}s"
+            )
+    
+    
+    def domo_outcome_ok(status: int) -> bool:
+        """Whether a response counts as healthy for the circuit breaker (client errors do)."""
+        return status < 500 and status != 429
+    
+    
+    async def hedged_call_async(make_call, delay: float, pool: Dict[str, Any]):
+        """
+        Run an idempotent read `make_call(sent)` as a task on the running event loop;
+        the call sets the `sent` event once its request is actually on the wire (after
+        the rate limiter). If it has then been in flight for `delay` seconds and a hedge
+        slot is free, start a second copy, `make_call(None)`. Returns the first success
+        and cancels the slower copy, or raises the last error if both fail.
+        """
+        sent = asyncio.Event()
+        first = asyncio.ensure_future(make_call(sent))
+        
+        async def in_flight():
+            await sent.wait()
+            await asyncio.sleep(delay)
+        
+        timer = asyncio.ensure_future(in_flight())
+        try:
+            await asyncio.wait({first, timer}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            timer.cancel()
+        if first.done() or not pool["hedge_slots"].acquire(blocking=False):
+            return await first
+        try:
+            pending = {first, asyncio.ensure_future(make_call(None))}
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        for other in pending:
+                            other.cancel()
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            pool["hedge_slots"].release()
+    
+    
+    def hedge_delay(pool: Dict[str, Any], endpoint: str) -> Optional[float]:
+        """How long a read of `endpoint` may take before it is hedged; None = don't hedge."""
+        if not DOMO_HEDGE_PERCENTILE:
+            return None
+        return pool["latency"].percentile(endpoint, DOMO_HEDGE_PERCENTILE)
+    
+    
+    def send_domo_request(pool: Dict[str, Any], method: str, url: str, endpoint: str, **kwargs) -> requests.Response:
+        """
+        One request to a Domo instance through its circuit breaker and rate limiter,
+        timed per `endpoint`. Raises CircuitOpenError while the breaker is open;
+        responses are returned as-is.
+        """
+        check_circuit(pool)
+        time.sleep(pool["limiter"].reserve())
+        started = time.monotonic()
+        try:
+            r = getattr(pool["session"], method)(url, timeout=DOMO_REQUEST_TIMEOUT, **kwargs)
+        except Exception:
+            pool["breaker"].record(False)
+            raise
+        pool["breaker"].record(domo_outcome_ok(r.status_code))
+        if r.status_code < 400:
+            pool["latency"].record(endpoint, time.monotonic() - started)
+        return r
+    
+    
     # ==========================
     # DOMO API FUNCTIONS
     # ==========================
@@ -372,37 +1642,76 @@ def main():
     
     
     @st.cache_data(ttl=3600)  # Cache for 1 hour
-    def get_card_name(card_id: str) -> str:
-        """Fetch card name from Domo API."""
-        try:
-            card_def = fetch_kpi_definition(DOMO_INSTANCE, DOMO_DEVELOPER_TOKEN, card_id)
-            title = card_def.get("definition", {}).get("title", f"Card {card_id}")
-            return title
-        except:
-            return f"Card {card_id}"
+    def get_card_names(card_ids: Tuple[str, ...]) -> Dict[str, str]:
+        """Fetch card names from Domo API concurrently. Returns {id: name}"""
+        card_defs = fetch_kpi_definitions(list(card_ids))
+        names = {}
+        for card_id in card_ids:
+            card_def = card_defs.get(card_id)
+            if isinstance(card_def, dict):
+                names[card_id] = card_def.get("definition", {}).get("title", f"Card {card_id}")
+            else:
+                names[card_id] = f"Card {card_id}"
+        return names
     
     
     def get_preset_cards() -> Dict[str, str]:
-        """Get preset cards with their names. Returns {id: name}"""
-        preset_cards = {}
-        for card_id in PRESET_CARD_IDS:
-            name = get_card_name(card_id)
-            preset_cards[card_id] = name
-        return preset_cards
+        """Get preset cards with their names, from the card catalog where it has them. Returns {id: name}"""
+        names = card_catalog().titles(PRESET_CARD_IDS)
+        missing = tuple(card_id for card_id in PRESET_CARD_IDS if card_id not in names)
+        if missing:
+            names.update(get_card_names(missing))
+        return {card_id: names[card_id] for card_id in PRESET_CARD_IDS}
     
     
-    def fetch_kpi_definition(instance: str, token: str, card_id: str) -> Dict[str, Any]:
-        """Fetch the full card definition including annotations."""
-        url = f"https://{instance}.domo.com/api/content/v3/cards/kpi/definition"
-        payload = {"urn": str(card_id)}
+    def load_card_catalog() -> List[Dict[str, str]]:
+        """Every KPI card on every instance, with its title, pages and datasets. Raises on failure."""
+        cards = []
+        for instance in DOMO_INSTANCES:
+            for card in list_kpi_card_summaries(instance):
+                cards.append({
+                    "card_ref": format_card_ref(instance, card.get("id")),
+                    "instance": instance,
+                    "card_id": str(card.get("id")),
+                    "title": card.get("title") or card.get("cardTitle") or f"Card {card.get('id')}",
+                    "page": ", ".join(page.get("title", "") for page in card.get("pages") or []),
+                    "dataset": ", ".join(source.get("dataSourceName", "") for source in card.get("datasources") or []),
+                })
+        return cards
     
-        r = requests.put(url, headers=product_headers(token), json=payload, timeout=60)
-        if r.status_code != 200:
-            raise RuntimeError(f"HTTP {r.status_code}: {r.text[:500]}")
     
-        r.encoding = "utf-8"
-        fetched = r.json()
-        
+    @st.cache_resource
+    def card_catalog() -> CardCatalog:
+        """The process-wide card catalog, reloaded in the background."""
+        return CardCatalog(load_card_catalog, CARD_CATALOG_PATH, CARD_CATALOG_REFRESH)
+    
+    
+    def card_picker_options(query: str) -> List[str]:
+        """Card picker options, as "Title (card ref)": catalog matches for `query`, or the presets."""
+        if query.strip():
+            with profile_section("Card search"):
+                matches = card_catalog().search(query, limit=CARD_SEARCH_RESULTS)
+            return [f"{card['title']} ({card['card_ref']})" for card in matches]
+        with profile_section("Preset cards"):
+            preset_cards = get_preset_cards()
+        return [f"{name} ({cid})" for cid, name in preset_cards.items()]
+    
+    
+    def fetch_kpi_definition(card_ref: str) -> Dict[str, Any]:
+        """
+        Fetch the full card definition including annotations, from the card's instance.
+        Goes through fetch_kpi_definitions, so it reuses the instance's pooled async
+        session and a slow read is hedged on the instance's event loop; fails fast
+        with CircuitOpenError while the instance is failing.
+        """
+        card_def = fetch_kpi_definitions([card_ref])[card_ref]
+        if isinstance(card_def, Exception):
+            raise card_def
+        return card_def
+    
+    
+    def prepare_kpi_definition(fetched: Dict[str, Any]) -> Dict[str, Any]:
+        """Attach the card's data source ID to the fetched definition and its subscriptions."""
         data_source_id = None
         columns = fetched.get("columns", [])
         if columns and len(columns) > 0:
@@ -420,16 +1729,97 @@ def main():
     
     
     def save_card_definition(
-        instance: str, 
-        token: str, 
-        card_id: str, 
+        card_ref: str,
         card_def: Dict[str, Any], 
         new_annotations: List[Dict[str, Any]] = None,
         deleted_annotation_ids: List[int] = None
     ) -> Dict[str, Any]:
-        """Save the updated card definition back to Domo."""
-        url = f"https://{instance}.domo.com/api/content/v3/cards/kpi/{card_id}"
+        """Save the updated card definition back to the card's Domo instance."""
+        instance, card_id = parse_card_ref(card_ref)
+        pool = domo_pool(instance)
+        while True:
+            url, body, headers = prepare_save_request(instance, pool["token"], card_id, card_def, new_annotations, deleted_annotation_ids)
+            r = send_domo_request(pool, "put", url, "save", headers=headers, data=body)
+            if r.status_code in (200, 201, 204) or not downgrade_save_settings(r.status_code, headers):
+                break
+        
+        if r.status_code not in (200, 201, 204):
+            raise RuntimeError(f"HTTP {r.status_code}: {r.text[:500]}")
         
+        r.encoding = "utf-8"
+        return r.json() if r.text else {"status": "success"}
+    
+    
+    @st.cache_resource
+    def domo_save_settings() -> Dict[str, bool]:
+        """
+        Process-wide save options. Starts from the secrets and is downgraded for the
+        rest of the process if the instance rejects a minimal or compressed body.
+        """
+        return {"minimal": DOMO_MINIMAL_SAVES, "gzip": DOMO_GZIP_SAVES}
+    
+    
+    def prepare_save_request(
+        instance: str,
+        token: str,
+        card_id: str,
+        card_def: Dict[str, Any],
+        new_annotations: List[Dict[str, Any]] = None,
+        deleted_annotation_ids: List[int] = None
+    ) -> Tuple[str, bytes, Dict[str, str]]:
+        """
+        URL, encoded body and headers for a KPI save. The body is compact UTF-8 JSON
+        (Hebrew stays 2 bytes a character instead of a 6-byte \\u escape) and is
+        gzipped when enabled and large enough. Sizes are logged per save.
+        """
+        settings = domo_save_settings()
+        url = f"https://{instance}.domo.com/api/content/v3/cards/kpi/{card_id}"
+        save_payload = build_save_payload(
+            card_def, new_annotations, deleted_annotation_ids, minimal=settings["minimal"]
+        )
+        body = json.dumps(save_payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        json_size = len(body)
+        headers = product_headers(token)
+        if settings["gzip"] and json_size >= GZIP_MIN_BYTES:
+            body = gzip.compress(body, compresslevel=6)
+            headers["Content-Encoding"] = "gzip"
+        logger.info(
+            "Domo save card %s: %s payload, %d bytes JSON, %d bytes sent",
+            card_id, "minimal" if settings["minimal"] else "full", json_size, len(body)
+        )
+        return url, body, headers
+    
+    
+    def downgrade_save_settings(status: int, headers: Dict[str, str]) -> bool:
+        """
+        After a rejected save, turn off compression (if it was used) or else the
+        minimal payload. Returns True if the save should be retried.
+        """
+        settings = domo_save_settings()
+        if status not in (400, 415, 422):
+            return False
+        if headers.get("Content-Encoding") == "gzip":
+            logger.warning("Domo rejected a gzip save body (HTTP %d); sending uncompressed from now on", status)
+            settings["gzip"] = False
+            return True
+        if settings["minimal"]:
+            logger.warning("Domo rejected a minimal save body (HTTP %d); sending full definitions from now on", status)
+            settings["minimal"] = False
+            return True
+        return False
+    
+    
+    def build_save_payload(
+        card_def: Dict[str, Any],
+        new_annotations: List[Dict[str, Any]] = None,
+        deleted_annotation_ids: List[int] = None,
+        minimal: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Build the KPI save body that applies an annotation delta to a card definition.
+        With `minimal`, the definition is cut down to DOMO_SAVE_FIELDS, leaving out
+        subscriptions, charts and formatting the delta does not touch.
+        """
         data_source_id = card_def.get("_dataSourceId")
         if not data_source_id:
             columns = card_def.get("columns", [])
@@ -496,6 +1886,9 @@ def main():
                     "delete": []
                 }
         
+        if minimal:
+            definition = {key: definition[key] for key in DOMO_SAVE_FIELDS if key in definition}
+        
         save_payload = {
             "definition": definition,
             "dataProvider": {
@@ -503,14 +1896,7 @@ def main():
             },
             "variables": True
         }
-        
-        r = requests.put(url, headers=product_headers(token), json=save_payload, timeout=60)
-        
-        if r.status_code not in (200, 201, 204):
-            raise RuntimeError(f"HTTP {r.status_code}: {r.text[:500]}")
-        
-        r.encoding = "utf-8"
-        return r.json() if r.text else {"status": "success"}
+        return save_payload
     
     
     def get_domo_annotations(card_def: Dict[str, Any]) -> List[Dict[str, Any]]:
@@ -521,55 +1907,315 @@ def main():
     def add_annotation_to_domo(card_id: str, content: str, entry_date: str, color: str) -> Optional[Dict[str, Any]]:
         """Add annotation to a Domo card and return the created annotation."""
         try:
-            card_def = fetch_kpi_definition(DOMO_INSTANCE, DOMO_DEVELOPER_TOKEN, card_id)
-            
             new_annotation = {
                 "content": content,
                 "dataPoint": {"point1": entry_date},
                 "color": color,
             }
-            
-            save_card_definition(
-                DOMO_INSTANCE,
-                DOMO_DEVELOPER_TOKEN,
-                card_id,
-                card_def,
-                new_annotations=[new_annotation]
-            )
-            
-            # Refresh to get the new annotation with its ID
-            updated_card_def = fetch_kpi_definition(DOMO_INSTANCE, DOMO_DEVELOPER_TOKEN, card_id)
-            annotations = get_domo_annotations(updated_card_def)
-            
-            # Find the newly created annotation
-            for ann in sorted(annotations, key=lambda x: x.get("createdDate", 0), reverse=True):
-                if ann.get("content") == content and ann.get("dataPoint", {}).get("point1") == entry_date:
-                    return ann
-            
-            return None
+            return wait_for_write(card_write_queue().add(card_id, new_annotation))
         except Exception as e:
             st.error(f"Error adding to Domo card {card_id}: {str(e)}")
             return None
     
     
+    def add_annotation_to_cards(card_ids: List[str], content: str, entry_date: str, color: str) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Add one annotation to many cards, on any instances. Every write is queued
+        before waiting on any, so the cards are saved concurrently.
+        Returns {card_id: created annotation or None}.
+        """
+        futures = {}
+        for card_id in card_ids:
+            new_annotation = {
+                "content": content,
+                "dataPoint": {"point1": entry_date},
+                "color": color,
+            }
+            futures[card_id] = card_write_queue().add(card_id, new_annotation)
+        
+        created = {}
+        for card_id, future in futures.items():
+            try:
+                created[card_id] = wait_for_write(future)
+            except Exception as e:
+                st.error(f"Error adding to Domo card {card_id}: {str(e)}")
+                created[card_id] = None
+        return created
+    
+    
+    def apply_card_writes(
+        card_id: str,
+        new_annotations: List[Dict[str, Any]],
+        deleted_annotation_ids: List[int]
+    ) -> List[Optional[Dict[str, Any]]]:
+        """
+        Fetch a card once and save a merged batch of adds and deletes.
+        Returns the created annotation (or None) per new annotation. Raises on failure.
+        """
+        card_def = fetch_kpi_definition(card_id)
+        before_ids = {ann.get("id") for ann in get_domo_annotations(card_def)}
+        
+        save_response = save_card_definition(
+            card_id,
+            card_def,
+            new_annotations=new_annotations,
+            deleted_annotation_ids=deleted_annotation_ids
+        )
+        
+        if not new_annotations:
+            return []
+        return resolve_created_annotations(
+            before_ids, new_annotations, save_response,
+            lambda: get_domo_annotations(fetch_kpi_definition(card_id))
+        )
+    
+    
+    @st.cache_resource
+    def card_write_queue() -> CardWriteQueue:
+        """The process-wide queue all sessions write annotations to Domo through."""
+        return CardWriteQueue(apply_card_writes, window_seconds=DOMO_WRITE_WINDOW)
+    
+    
+    def wait_for_write(future: Future):
+        """Result of a queued card write; raises if it has not finished within DOMO_WRITE_TIMEOUT."""
+        try:
+            return future.result(timeout=DOMO_WRITE_TIMEOUT)
+        except FutureTimeoutError:
+            raise RuntimeError(
+                f"no answer from Domo after {DOMO_WRITE_TIMEOUT:.0f}s (the write may still complete)"
+            ) from None
+    
+    
     def delete_annotation_from_domo(card_id: str, annotation_id: int) -> bool:
         """Delete annotation from a Domo card."""
         try:
-            card_def = fetch_kpi_definition(DOMO_INSTANCE, DOMO_DEVELOPER_TOKEN, card_id)
-            
-            save_card_definition(
-                DOMO_INSTANCE,
-                DOMO_DEVELOPER_TOKEN,
-                card_id,
-                card_def,
-                deleted_annotation_ids=[annotation_id]
-            )
-            return True
+            return wait_for_write(card_write_queue().delete(card_id, annotation_id))
         except Exception as e:
             st.error(f"Error deleting from Domo card {card_id}: {str(e)}")
             return False
     
     
+    # ==========================
+    # ASYNC DOMO CLIENT
+    # ==========================
+    async def fetch_kpi_definition_async(
+        session: aiohttp.ClientSession, instance: str, token: str, card_id: str,
+        pool: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Async twin of fetch_kpi_definition; with `pool`, reports to its breaker and latency tracker."""
+        url = f"https://{instance}.domo.com/api/content/v3/cards/kpi/definition"
+        payload = {"urn": str(card_id)}
+        
+        started = time.monotonic()
+        try:
+            async with session.put(url, headers=product_headers(token), json=payload) as r:
+                text = await r.text(encoding="utf-8")
+        except Exception:
+            if pool:
+                pool["breaker"].record(False)
+            raise
+        if pool:
+            pool["breaker"].record(domo_outcome_ok(r.status))
+        if r.status != 200:
+            raise RuntimeError(f"HTTP {r.status}: {text[:500]}")
+        if pool:
+            pool["latency"].record("definition", time.monotonic() - started)
+        return prepare_kpi_definition(json.loads(text))
+    
+    
+    async def save_card_definition_async(
+        session: aiohttp.ClientSession,
+        instance: str,
+        token: str,
+        card_id: str,
+        card_def: Dict[str, Any],
+        new_annotations: List[Dict[str, Any]] = None,
+        deleted_annotation_ids: List[int] = None,
+        pool: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Async twin of save_card_definition; with `pool`, reports to its breaker and latency tracker."""
+        while True:
+            url, body, headers = prepare_save_request(instance, token, card_id, card_def, new_annotations, deleted_annotation_ids)
+            started = time.monotonic()
+            try:
+                async with session.put(url, headers=headers, data=body) as r:
+                    status = r.status
+                    text = await r.text(encoding="utf-8")
+            except Exception:
+                if pool:
+                    pool["breaker"].record(False)
+                raise
+            if pool:
+                pool["breaker"].record(domo_outcome_ok(status))
+                if status < 400:
+                    pool["latency"].record("save", time.monotonic() - started)
+            if status in (200, 201, 204) or not downgrade_save_settings(status, headers):
+                break
+        
+        if status not in (200, 201, 204):
+            raise RuntimeError(f"HTTP {status}: {text[:500]}")
+        return json.loads(text) if text else {"status": "success"}
+    
+    
+    def domo_client_session(concurrency: int) -> aiohttp.ClientSession:
+        """aiohttp session sized for `concurrency` parallel requests."""
+        return aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=DOMO_REQUEST_TIMEOUT),
+            connector=aiohttp.TCPConnector(limit=concurrency),
+        )
+    
+    
+    async def pool_client_session(pool: Dict[str, Any]) -> aiohttp.ClientSession:
+        """
+        The instance's long-lived aiohttp session, so its connections are reused
+        across calls. Only coroutines on the pool's loop use it, so no lock is needed.
+        """
+        if pool["aio_session"] is None:
+            # Room for every in-flight call plus the hedges
+            pool["aio_session"] = domo_client_session(pool["max_concurrency"] + pool["max_hedges"])
+        return pool["aio_session"]
+    
+    
+    @contextlib.asynccontextmanager
+    async def instance_client_session(pool: Optional[Dict[str, Any]], concurrency: int):
+        """The pool's shared aiohttp session, or without a pool a throwaway one sized for `concurrency`."""
+        if pool is not None:
+            yield await pool_client_session(pool)
+        else:
+            async with domo_client_session(concurrency) as session:
+                yield session
+    
+    
+    async def gather_kpi_definitions(
+        instance: str, token: str, card_ids: List[str], concurrency: int,
+        limiter: Optional[RateLimiter] = None, pool: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Fetch many card definitions with at most `concurrency` requests in flight.
+        With `pool`, reads go through its circuit breaker and slow ones are hedged.
+        Returns {card_id: definition or Exception}."""
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async with instance_client_session(pool, concurrency) as session:
+            async def attempt(card_id: str, sent: Optional[asyncio.Event] = None):
+                if limiter:
+                    await asyncio.sleep(limiter.reserve())
+                if sent:
+                    sent.set()
+                return await fetch_kpi_definition_async(session, instance, token, card_id, pool)
+            
+            async def fetch_one(card_id: str):
+                async with semaphore:
+                    try:
+                        if pool is None:
+                            return card_id, await attempt(card_id)
+                        check_circuit(pool)
+                        delay = hedge_delay(pool, "definition")
+                        if delay is None:
+                            return card_id, await attempt(card_id)
+                        return card_id, await hedged_call_async(lambda sent: attempt(card_id, sent), delay, pool)
+                    except Exception as e:
+                        return card_id, e
+            
+            pairs = await asyncio.gather(*(fetch_one(card_id) for card_id in card_ids))
+        return dict(pairs)
+    
+    
+    async def gather_card_saves(
+        instance: str, token: str, saves: List[Dict[str, Any]], concurrency: int,
+        limiter: Optional[RateLimiter] = None, pool: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Save many cards concurrently. Each save is a dict with card_id, card_def and
+        optional new_annotations / deleted_annotation_ids. With `pool`, saves go
+        through its circuit breaker.
+        Returns {card_id: save response or Exception}."""
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async with instance_client_session(pool, concurrency) as session:
+            async def save_one(save: Dict[str, Any]):
+                async with semaphore:
+                    try:
+                        if pool:
+                            check_circuit(pool)
+                        if limiter:
+                            await asyncio.sleep(limiter.reserve())
+                        return save["card_id"], await save_card_definition_async(
+                            session, instance, token, save["card_id"], save["card_def"],
+                            new_annotations=save.get("new_annotations"),
+                            deleted_annotation_ids=save.get("deleted_annotation_ids"),
+                            pool=pool,
+                        )
+                    except Exception as e:
+                        return save["card_id"], e
+            
+            pairs = await asyncio.gather(*(save_one(save) for save in saves))
+        return dict(pairs)
+    
+    
+    def group_by_instance(card_refs: List[str]) -> Tuple[Dict[str, Dict[str, str]], Dict[str, Any]]:
+        """
+        Split card references per registered instance: ({instance: {card ID: ref}},
+        {ref: ValueError}) - refs on unknown instances fail without a request.
+        """
+        groups, unknown = {}, {}
+        for ref in card_refs:
+            instance, card_id = parse_card_ref(ref)
+            if instance in DOMO_INSTANCES:
+                groups.setdefault(instance, {})[card_id] = ref
+            else:
+                unknown[ref] = ValueError(f"Unknown Domo instance: {instance}")
+        return groups, unknown
+    
+    
+    def fan_out(groups: Dict[str, Dict[str, str]], gather_one) -> Dict[str, Any]:
+        """
+        Run the coroutine `gather_one(pool, card_ids)` for every instance at once, each
+        on its pool's event loop and within its own concurrency and rate limit, and
+        key the merged results by card reference. Blocks the calling thread until all
+        are done; `gather_one` reports per-card failures in its result, not by raising.
+        """
+        instances = list(groups)
+        futures = []
+        for instance in instances:
+            pool = domo_pool(instance)
+            futures.append(asyncio.run_coroutine_threadsafe(gather_one(pool, list(groups[instance])), pool["loop"]))
+        return {
+            groups[instance][card_id]: value
+            for instance, future in zip(instances, futures)
+            for card_id, value in future.result().items()
+        }
+    
+    
+    def fetch_kpi_definitions(card_ids: List[str]) -> Dict[str, Any]:
+        """Fetch definitions for many cards, across every instance, concurrently.
+        Returns {card_ref: definition or Exception}."""
+        if not card_ids:
+            return {}
+        groups, results = group_by_instance(card_ids)
+        results.update(fan_out(groups, lambda pool, ids: gather_kpi_definitions(
+            pool["instance"], pool["token"], ids, pool["max_concurrency"], pool["limiter"], pool
+        )))
+        return results
+    
+    
+    def save_card_definitions(saves: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Save many cards, across every instance, concurrently. Returns {card_ref: save response or Exception}."""
+        if not saves:
+            return {}
+        groups, results = group_by_instance([save["card_id"] for save in saves])
+        by_ref = {save["card_id"]: save for save in saves}
+        
+        def gather_one(pool, ids):
+            instance_saves = [
+                dict(by_ref[groups[pool["instance"]][card_id]], card_id=card_id) for card_id in ids
+            ]
+            return gather_card_saves(
+                pool["instance"], pool["token"], instance_saves, pool["max_concurrency"], pool["limiter"], pool
+            )
+        
+        results.update(fan_out(groups, gather_one))
+        return results
+    
+    
     # ==========================
     # SNOWFLAKE FUNCTIONS
     # ==========================
@@ -610,12 +2256,149 @@ def main():
         card_id: Optional[str] = None
     ) -> List[Dict[str, Any]]:
         """Get annotations from Snowflake with optional filters."""
+        try:
+            conn = get_snowflake_connection()
+            cursor = conn.cursor()
+            results = query_snowflake_annotations(cursor, start_date, end_date, card_id)
+            cursor.close()
+            conn.close()
+            return results
+        except Exception as e:
+            st.error(f"Snowflake query error: {str(e)}")
+            return []
+    
+    
+    def load_all_annotations() -> List[Dict[str, Any]]:
+        """Read the whole annotations table. Raises on failure."""
+        conn = get_snowflake_connection()
+        cursor = conn.cursor()
+        rows = query_snowflake_annotations(cursor)
+        cursor.close()
+        conn.close()
+        return rows
+    
+    
+    def load_annotation_changes(since) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Rows written and tombstones recorded since the `since` watermark, re-reading a
+        short overlap so rows from transactions that committed late are not missed.
+        Returns (rows, tombstones). Raises on failure.
+        """
+        conn = get_snowflake_connection()
+        cursor = conn.cursor()
+        rows = query_snowflake_annotations(cursor, changed_since=since)
+        
+        tombstone_sql = f"SELECT ID, CARD_ID, CONTENT, ENTRY_DATE, DELETED_AT, ROW_KEY, DOMO_INSTANCE FROM {SNOWFLAKE_TOMBSTONE_TABLE}"
+        params = []
+        if since is not None:
+            tombstone_sql += " WHERE DELETED_AT >= DATEADD(second, %s, %s)"
+            params = [-CHANGE_OVERLAP_SECONDS, since]
+        cursor.execute(tombstone_sql, params)
+        columns = ["ID", "CARD_ID", "CONTENT", "ENTRY_DATE", "DELETED_AT", "ROW_KEY", "DOMO_INSTANCE"]
+        tombstones = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        
+        cursor.close()
+        conn.close()
+        return rows, tombstones
+    
+    
+    @st.cache_resource
+    def annotation_store() -> AnnotationStore:
+        """The process-wide annotation store shared by every session."""
+        return AnnotationStore(
+            load_all_annotations,
+            ttl_seconds=ANNOTATION_STORE_TTL,
+            delta_loader=load_annotation_changes,
+            default_instance=DOMO_INSTANCE
+        )
+    
+    
+    @st.cache_resource
+    def annotation_search_index() -> AnnotationSearchIndex:
+        """Full-text index over the shared annotation store."""
+        return AnnotationSearchIndex(annotation_store())
+    
+    
+    def search_annotations(query: str, limit: int = 200) -> pd.DataFrame:
+        """Full-text search over annotation content."""
+        try:
+            return annotation_search_index().search(query, limit=limit)
+        except Exception as e:
+            st.error(f"Search error: {str(e)}")
+            return annotation_store().to_frame([])
+    
+    
+    def get_annotation_view(view_key: str) -> Optional[pd.DataFrame]:
+        """
+        The session's filtered view into the shared store, or None if the session
+        has not loaded this view (or it expired).
+        """
+        view = st.session_state.get(view_key)
+        if view is None:
+            return None
+        view["touched"] = time.time()
+        try:
+            return annotation_store().view(view.get("start_date"), view.get("end_date"))
+        except Exception as e:
+            st.error(f"Snowflake query error: {str(e)}")
+            return annotation_store().to_frame([])
+    
+    
+    def invalidate_annotation_caches() -> None:
+        """Call after any write to Snowflake so views, search and summaries reload."""
+        annotation_store().invalidate()
+        get_snowflake_annotation_counts.clear()
+    
+    
+    def rerun_panel() -> None:
+        """
+        Rerun only the panel (fragment) that called this. During a full-app run a
+        fragment-scoped rerun is not allowed, so the whole app reruns instead.
+        """
+        ctx = get_script_run_ctx()
+        st.rerun(scope="fragment" if ctx is not None and ctx.fragment_ids_this_run else "app")
+    
+    
+    def refresh_annotation_panels() -> None:
+        """
+        Cross-panel invalidation after a write: drop the cached annotations and rerun
+        the whole app so the Delete, Summary and All Annotations panels redraw from it.
+        """
+        invalidate_annotation_caches()
+        st.rerun()
+    
+    
+    def evict_stale_views() -> None:
+        """Forget session views that have not been read within the TTL."""
+        now = time.time()
+        for view_key in ("all_annotations_view", "delete_annotations_view"):
+            view = st.session_state.get(view_key)
+            if view is not None and now - view["touched"] > ANNOTATION_STORE_TTL:
+                del st.session_state[view_key]
+    
+    
+    @st.cache_data(ttl=300)
+    def get_snowflake_annotation_counts(
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        grain: str = "day",
+        card_id: Optional[str] = None
+    ) -> pd.DataFrame:
+        """
+        Annotation counts grouped by card, period and color, computed in Snowflake.
+        `grain` is one of day / week / month / quarter; `card_id` is a card reference.
+        Returns columns DOMO_INSTANCE, CARD_ID, CARD_REF, PERIOD, COLOR, ANNOTATIONS;
+        CARD_REF is None for global annotations.
+        """
+        columns = ["DOMO_INSTANCE", "CARD_ID", "PERIOD", "COLOR", "ANNOTATIONS"]
+        if grain not in ("day", "week", "month", "quarter"):
+            raise ValueError(f"Unsupported grain: {grain}")
         try:
             conn = get_snowflake_connection()
             cursor = conn.cursor()
             
             select_sql = f"""
-                SELECT ID, CARD_ID, DOMO_USER_ID, DOMO_USER_NAME, COLOR, CONTENT, ENTRY_DATE, CREATED_DATE
+                SELECT DOMO_INSTANCE, CARD_ID, DATE_TRUNC('{grain}', ENTRY_DATE) AS PERIOD, COLOR, COUNT(*) AS ANNOTATIONS
                 FROM {SNOWFLAKE_TABLE}
                 WHERE 1=1
             """
@@ -630,26 +2413,194 @@ def main():
                 params.append(end_date)
             
             if card_id:
-                select_sql += " AND CARD_ID = %s"
-                params.append(int(card_id))
+                card_condition, card_params = card_refs_filter([card_id])
+                select_sql += f" AND {card_condition}"
+                params.extend(card_params)
             
-            select_sql += " ORDER BY ENTRY_DATE DESC"
+            select_sql += " GROUP BY DOMO_INSTANCE, CARD_ID, PERIOD, COLOR ORDER BY PERIOD"
             
             cursor.execute(select_sql, params)
-            
-            rows = cursor.fetchall()
-            columns = ["ID", "CARD_ID", "DOMO_USER_ID", "DOMO_USER_NAME", "COLOR", "CONTENT", "ENTRY_DATE", "CREATED_DATE"]
-            
-            results = []
-            for row in rows:
-                results.append(dict(zip(columns, row)))
+            counts = pd.DataFrame(cursor.fetchall(), columns=columns)
             
             cursor.close()
             conn.close()
-            return results
+            counts["CARD_REF"] = [
+                format_card_ref(instance, card) if pd.notna(card) else None
+                for instance, card in zip(counts["DOMO_INSTANCE"], counts["CARD_ID"])
+            ]
+            counts["PERIOD"] = pd.to_datetime(counts["PERIOD"])
+            counts["ANNOTATIONS"] = counts["ANNOTATIONS"].astype(int)
+            return counts
         except Exception as e:
             st.error(f"Snowflake query error: {str(e)}")
-            return []
+            return pd.DataFrame(columns=columns + ["CARD_REF"])
+    
+    
+    @st.cache_resource
+    def ensure_schema() -> bool:
+        """
+        Bring the annotations table and its side tables up to date once per process
+        (migrations.py). Called from the write paths only, so reads work with a
+        read-only role and never pay for the DDL.
+        """
+        conn = get_snowflake_connection()
+        migrations.migrate(conn, migrations.schema_tables(
+            SNOWFLAKE_TABLE,
+            tombstones=SNOWFLAKE_TOMBSTONE_TABLE,
+            mapping=SNOWFLAKE_MAPPING_TABLE,
+            checkpoints=SNOWFLAKE_CHECKPOINT_TABLE,
+            auto_sync=SNOWFLAKE_AUTO_SYNC_TABLE,
+        ))
+        conn.close()
+        return True
+    
+    
+    def query_snowflake_annotations(
+        cursor,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        card_id: Optional[str] = None,
+        changed_since=None,
+        card_ids: Optional[List[str]] = None,
+        annotation_ids: Optional[List[int]] = None,
+        instance: Optional[str] = None,
+        id_range: Optional[Tuple[int, int]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Run the annotations query on an open cursor. Raises on failure.
+        `changed_since` keeps only rows written after that watermark (minus the overlap).
+        `card_id` / `card_ids` are card references; `card_ids` / `annotation_ids` restrict
+        to those cards / Domo IDs (keep lists to 1000). `instance` scopes `annotation_ids`.
+        `id_range` keeps only rows with a Domo ID between its bounds (inclusive).
+        """
+        select_sql = f"""
+            SELECT ID, CARD_ID, DOMO_USER_ID, DOMO_USER_NAME, COLOR, CONTENT, ENTRY_DATE, CREATED_DATE, UPDATED_AT, DOMO_INSTANCE, ROW_KEY
+            FROM {SNOWFLAKE_TABLE}
+            WHERE 1=1
+        """
+        params = []
+        
+        if changed_since is not None:
+            select_sql += " AND UPDATED_AT >= DATEADD(second, %s, %s)"
+            params.extend([-CHANGE_OVERLAP_SECONDS, changed_since])
+        
+        if start_date:
+            select_sql += " AND ENTRY_DATE >= %s"
+            params.append(start_date)
+        
+        if end_date:
+            select_sql += " AND ENTRY_DATE <= %s"
+            params.append(end_date)
+        
+        if card_id:
+            card_condition, card_params = card_refs_filter([card_id])
+            select_sql += f" AND {card_condition}"
+            params.extend(card_params)
+        
+        if card_ids:
+            card_condition, card_params = card_refs_filter(card_ids)
+            select_sql += f" AND {card_condition}"
+            params.extend(card_params)
+        
+        if id_range:
+            select_sql += " AND ID BETWEEN %s AND %s"
+            params.extend(id_range)
+        
+        if annotation_ids:
+            select_sql += f" AND ID IN ({', '.join(['%s'] * len(annotation_ids))})"
+            params.extend(annotation_ids)
+            if instance:
+                instance_condition, instance_params = instance_filter(instance)
+                select_sql += f" AND {instance_condition}"
+                params.extend(instance_params)
+        
+        select_sql += " ORDER BY ENTRY_DATE DESC"
+        
+        cursor.execute(select_sql, params)
+        
+        rows = cursor.fetchall()
+        columns = ["ID", "CARD_ID", "DOMO_USER_ID", "DOMO_USER_NAME", "COLOR", "CONTENT", "ENTRY_DATE", "CREATED_DATE", "UPDATED_AT", "DOMO_INSTANCE", "ROW_KEY"]
+        
+        results = []
+        for row in rows:
+            results.append(dict(zip(columns, row)))
+        return results
+    
+    
+    def prefetch_snowflake_annotations(
+        cursor,
+        card_ids: List[str],
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        max_rows_per_card: Optional[int] = None
+    ) -> Dict[str, Optional[List[Dict[str, Any]]]]:
+        """
+        Snowflake rows for many cards with one query per 1000 cards, bounded to the
+        ENTRY_DATE range and partitioned by card. Returns {card_id: rows}. Raises on failure.
+        With `max_rows_per_card`, cards over it are counted first and left out as
+        {card_id: None}, to be synced with stream_card_sync.
+        """
+        partitions = {str(card_id): [] for card_id in card_ids}
+        chunk_size = 1000
+        for i in range(0, len(card_ids), chunk_size):
+            chunk = card_ids[i:i + chunk_size]
+            if max_rows_per_card is not None:
+                card_condition, params = card_refs_filter(chunk)
+                count_sql = f"""
+                    SELECT DOMO_INSTANCE, CARD_ID, COUNT(*) FROM {SNOWFLAKE_TABLE}
+                    WHERE {card_condition}
+                """
+                if start_date:
+                    count_sql += " AND ENTRY_DATE >= %s"
+                    params.append(start_date)
+                if end_date:
+                    count_sql += " AND ENTRY_DATE <= %s"
+                    params.append(end_date)
+                cursor.execute(count_sql + " GROUP BY DOMO_INSTANCE, CARD_ID", params)
+                counts = {}
+                for instance, card_id, count in cursor.fetchall():
+                    ref = format_card_ref(instance, card_id)
+                    counts[ref] = counts.get(ref, 0) + count
+                for ref, count in counts.items():
+                    if count > max_rows_per_card:
+                        partitions[ref] = None
+                chunk = [card_id for card_id in chunk if partitions[str(card_id)] is not None]
+                if not chunk:
+                    continue
+            rows = query_snowflake_annotations(cursor, start_date, end_date, card_ids=chunk)
+            for row in rows:
+                partitions.setdefault(row_card_ref(row), []).append(row)
+        return partitions
+    
+    
+    def add_moved_annotations(
+        cursor,
+        domo_by_card: Dict[str, List[Dict[str, Any]]],
+        partitions: Dict[str, List[Dict[str, Any]]]
+    ) -> None:
+        """
+        A Domo annotation in the sync range whose ID is missing from the date-bounded
+        prefetch may still be in Snowflake under its old date. Look all such IDs up
+        in one query and add the rows to `partitions`, so they are updated rather
+        than inserted a second time. Raises on failure.
+        """
+        misses = {}
+        for card_id, domo_annotations in domo_by_card.items():
+            known = {row["ID"] for row in partitions.get(card_id, [])}
+            instance_misses = misses.setdefault(parse_card_ref(card_id)[0], {})
+            for ann in domo_annotations:
+                if ann.get("id") is not None and ann.get("id") not in known:
+                    instance_misses[ann.get("id")] = card_id
+        
+        chunk_size = 1000
+        for instance, instance_misses in misses.items():
+            missing_ids = list(instance_misses)
+            for i in range(0, len(missing_ids), chunk_size):
+                rows = query_snowflake_annotations(
+                    cursor, annotation_ids=missing_ids[i:i + chunk_size], instance=instance
+                )
+                for row in rows:
+                    partitions.setdefault(instance_misses[row["ID"]], []).append(row)
     
     
     def insert_annotation_to_snowflake(
@@ -659,17 +2610,19 @@ def main():
         card_id: Optional[int] = None,
         annotation_id: Optional[int] = None,
         user_id: Optional[int] = None,
-        user_name: Optional[str] = None
+        user_name: Optional[str] = None,
+        instance: Optional[str] = None
     ) -> bool:
-        """Insert a new annotation record into Snowflake."""
+        """Insert a new annotation record into Snowflake (`instance` of its card, default if None)."""
         try:
+            ensure_schema()
             conn = get_snowflake_connection()
             cursor = conn.cursor()
             
             insert_sql = f"""
                 INSERT INTO {SNOWFLAKE_TABLE} 
-                (CARD_ID, ID, DOMO_USER_ID, DOMO_USER_NAME, COLOR, CONTENT, ENTRY_DATE, CREATED_DATE)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP())
+                (CARD_ID, ID, DOMO_USER_ID, DOMO_USER_NAME, COLOR, CONTENT, ENTRY_DATE, CREATED_DATE, UPDATED_AT, DOMO_INSTANCE, ROW_KEY)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP(), CURRENT_TIMESTAMP(), %s, UUID_STRING())
             """
             
             cursor.execute(insert_sql, (
@@ -679,7 +2632,8 @@ def main():
                 user_name,
                 color,
                 content,
-                entry_date
+                entry_date,
+                instance or DOMO_INSTANCE
             ))
             
             conn.commit()
@@ -691,20 +2645,74 @@ def main():
             return False
     
     
-    def delete_annotation_from_snowflake(annotation_id: Optional[int] = None, card_id: Optional[int] = None, content: Optional[str] = None, entry_date: Optional[str] = None) -> bool:
-        """Delete an annotation record from Snowflake."""
+    def insert_card_annotations(rows: List[Tuple], mappings: List[Tuple]) -> None:
+        """
+        Batched insert of annotations just written to Domo cards - rows of (CARD_ID, ID,
+        DOMO_USER_ID, DOMO_USER_NAME, COLOR, CONTENT, ENTRY_DATE, DOMO_INSTANCE) - and
+        their mapping index entries (SOURCE_KEY, CARD_ID, DOMO_ANNOTATION_ID,
+        DOMO_INSTANCE), committed together. Raises on failure.
+        """
+        ensure_schema()
+        conn = get_snowflake_connection()
+        cursor = conn.cursor()
+        insert_sql = f"""
+            INSERT INTO {SNOWFLAKE_TABLE} 
+            (CARD_ID, ID, DOMO_USER_ID, DOMO_USER_NAME, COLOR, CONTENT, ENTRY_DATE, CREATED_DATE, UPDATED_AT, DOMO_INSTANCE, ROW_KEY)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP(), CURRENT_TIMESTAMP(), %s, UUID_STRING())
+        """
+        for i in range(0, len(rows), INSERT_CHUNK_ROWS):
+            cursor.executemany(insert_sql, rows[i:i + INSERT_CHUNK_ROWS])
+        mapping_sql = f"""
+            INSERT INTO {SNOWFLAKE_MAPPING_TABLE} (SOURCE_KEY, CARD_ID, DOMO_ANNOTATION_ID, CREATED_DATE, DOMO_INSTANCE)
+            VALUES (%s, %s, %s, CURRENT_TIMESTAMP(), %s)
+        """
+        for i in range(0, len(mappings), INSERT_CHUNK_ROWS):
+            cursor.executemany(mapping_sql, mappings[i:i + INSERT_CHUNK_ROWS])
+        conn.commit()
+        cursor.close()
+        conn.close()
+    
+    
+    def delete_annotation_from_snowflake(annotation_id: Optional[int] = None, card_id: Optional[int] = None, content: Optional[str] = None, entry_date: Optional[str] = None, instance: Optional[str] = None, row_key: Optional[str] = None) -> bool:
+        """
+        Delete an annotation record from Snowflake, leaving a tombstone for delta refreshes.
+        Rows are deleted by `row_key` when given; rows written without one fall back to
+        the Domo ID, or CONTENT + ENTRY_DATE for global annotations.
+        """
         try:
+            ensure_schema()
             conn = get_snowflake_connection()
             cursor = conn.cursor()
+            tombstone_sql = f"""
+                INSERT INTO {SNOWFLAKE_TOMBSTONE_TABLE} (ID, CARD_ID, CONTENT, ENTRY_DATE, DELETED_AT, ROW_KEY, DOMO_INSTANCE)
+                VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP(), %s, %s)
+            """
             
-            if annotation_id:
-                delete_sql = f"DELETE FROM {SNOWFLAKE_TABLE} WHERE ID = %s"
-                cursor.execute(delete_sql, (annotation_id,))
+            if row_key:
+                # Point delete; the ENTRY_DATE lets Snowflake prune to the row's clustered partitions
+                delete_sql = f"DELETE FROM {SNOWFLAKE_TABLE} WHERE ROW_KEY = %s"
+                params = [row_key]
+                if entry_date:
+                    delete_sql += " AND ENTRY_DATE = %s"
+                    params.append(entry_date)
+                cursor.execute(delete_sql, params)
+                cursor.execute(tombstone_sql, (annotation_id, card_id, None, None, row_key, instance or DOMO_INSTANCE))
+            elif annotation_id:
+                instance_condition, instance_params = instance_filter(instance)
+                delete_sql = f"DELETE FROM {SNOWFLAKE_TABLE} WHERE ID = %s AND {instance_condition}"
+                cursor.execute(delete_sql, [annotation_id] + instance_params)
+                cursor.execute(tombstone_sql, (annotation_id, card_id, None, None, None, instance or DOMO_INSTANCE))
             elif content and entry_date:
                 # For global annotations (no ID), delete by content and date
                 delete_sql = f"DELETE FROM {SNOWFLAKE_TABLE} WHERE CONTENT = %s AND ENTRY_DATE = %s AND ID IS NULL"
                 cursor.execute(delete_sql, (content, entry_date))
+                cursor.execute(tombstone_sql, (None, card_id, content, entry_date, None, None))
             
+            # Prune tombstones no cached copy can still need
+            cursor.execute(
+                f"DELETE FROM {SNOWFLAKE_TOMBSTONE_TABLE} WHERE DELETED_AT < DATEADD(day, %s, CURRENT_TIMESTAMP())",
+                (-TOMBSTONE_RETENTION_DAYS,)
+            )
             conn.commit()
             cursor.close()
             conn.close()
@@ -714,131 +2722,1331 @@ def main():
             return False
     
     
-    def sync_card_annotations(card_id: str, start_date: Optional[str] = None, end_date: Optional[str] = None) -> Dict[str, int]:
+    # ==========================
+    # DOMO MAPPING INDEX
+    # ==========================
+    def annotation_row_key(ann: Dict[str, Any]) -> str:
+        """
+        Stable key for a Snowflake annotation row: its Domo ID, or a content hash for
+        global rows. Domo IDs are per instance, so rows of other instances than the
+        default one are keyed by instance and ID.
+        """
+        if ann.get("ID") is not None:
+            instance = ann.get("DOMO_INSTANCE")
+            if isinstance(instance, str) and instance and instance != DOMO_INSTANCE:
+                return f"id:{instance}:{ann['ID']}"
+            return f"id:{ann['ID']}"
+        raw = f"{ann.get('CONTENT', '')}|{ann.get('ENTRY_DATE', '')}|{ann.get('COLOR', '')}"
+        return "g:" + hashlib.sha1(raw.encode("utf-8")).hexdigest()
+    
+    
+    def get_domo_mappings(card_id: str, source_keys: List[str]) -> Dict[str, int]:
+        """
+        Look up which Snowflake rows were already written to a card.
+        Returns {source_key: domo_annotation_id}. Raises on failure so callers
+        never write blindly when the index is unavailable.
+        """
+        ensure_schema()
+        mappings = {}
+        if not source_keys:
+            return mappings
+        
+        card_condition, card_params = card_refs_filter([card_id])
+        conn = get_snowflake_connection()
+        cursor = conn.cursor()
+        chunk_size = 1000
+        for i in range(0, len(source_keys), chunk_size):
+            chunk = source_keys[i:i + chunk_size]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cursor.execute(
+                f"""
+                SELECT SOURCE_KEY, DOMO_ANNOTATION_ID
+                FROM {SNOWFLAKE_MAPPING_TABLE}
+                WHERE {card_condition} AND SOURCE_KEY IN ({placeholders})
+                """,
+                card_params + chunk
+            )
+            for source_key, domo_id in cursor.fetchall():
+                mappings[source_key] = domo_id
+        cursor.close()
+        conn.close()
+        return mappings
+    
+    
+    def record_domo_mappings(card_id: str, pairs: List[Tuple[str, int]]) -> bool:
+        """Record (source_key, domo_annotation_id) pairs written to a card."""
+        if not pairs:
+            return True
+        try:
+            ensure_schema()
+            instance, plain_id = parse_card_ref(card_id)
+            conn = get_snowflake_connection()
+            cursor = conn.cursor()
+            cursor.executemany(
+                f"""
+                INSERT INTO {SNOWFLAKE_MAPPING_TABLE} (SOURCE_KEY, CARD_ID, DOMO_ANNOTATION_ID, CREATED_DATE, DOMO_INSTANCE)
+                VALUES (%s, %s, %s, CURRENT_TIMESTAMP(), %s)
+                """,
+                [(source_key, int(plain_id), domo_id, instance) for source_key, domo_id in pairs]
+            )
+            conn.commit()
+            cursor.close()
+            conn.close()
+            return True
+        except Exception as e:
+            st.error(f"Snowflake mapping error: {str(e)}")
+            return False
+    
+    
+    def delete_domo_mappings(card_id: str, annotation_id: int) -> bool:
+        """Forget a Domo annotation that was removed from a card."""
+        try:
+            ensure_schema()
+            card_condition, card_params = card_refs_filter([card_id])
+            conn = get_snowflake_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                f"DELETE FROM {SNOWFLAKE_MAPPING_TABLE} WHERE {card_condition} AND DOMO_ANNOTATION_ID = %s",
+                card_params + [annotation_id]
+            )
+            conn.commit()
+            cursor.close()
+            conn.close()
+            return True
+        except Exception as e:
+            st.error(f"Snowflake mapping error: {str(e)}")
+            return False
+    
+    
+    def sync_card_annotations(
+        card_id: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        card_def: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
         """
         Sync annotations from Domo to Snowflake for a specific card.
         Only adds missing annotations, never deletes.
         Also backfills CREATED_DATE from Domo.
         Optionally filter by annotation date range (ENTRY_DATE).
+        Pass a prefetched `card_def` to skip the Domo fetch.
+        Cards over SYNC_STREAM_THRESHOLD are synced in committed chunks (stream_card_sync).
+        If the card could not be synced, `failed` is 1 and `error` says why. Nothing
+        is shown here: the auto-sync daemon calls this without a script context.
         """
-        results = {"inserted": 0, "updated": 0, "skipped": 0}
+        results = {"inserted": 0, "updated": 0, "skipped": 0, "failed": 0}
         
         try:
             # Get Domo annotations
-            card_def = fetch_kpi_definition(DOMO_INSTANCE, DOMO_DEVELOPER_TOKEN, card_id)
-            domo_annotations = get_domo_annotations(card_def)
-            
-            # Filter by date range if provided
-            if start_date or end_date:
-                filtered_annotations = []
-                for ann in domo_annotations:
-                    entry_date = ann.get("dataPoint", {}).get("point1", "")
-                    if entry_date:
-                        if start_date and entry_date < start_date:
-                            continue
-                        if end_date and entry_date > end_date:
-                            continue
-                        filtered_annotations.append(ann)
-                domo_annotations = filtered_annotations
-            
-            domo_by_id = {ann.get("id"): ann for ann in domo_annotations}
-            
-            # Get Snowflake annotations for this card (only those with ID)
-            sf_annotations = get_snowflake_annotations(card_id=card_id)
-            sf_with_id = [ann for ann in sf_annotations if ann.get("ID") is not None]
-            sf_by_id = {ann["ID"]: ann for ann in sf_with_id}
+            if card_def is None:
+                card_def = fetch_kpi_definition(card_id)
+            domo_annotations = filter_by_entry_date(get_domo_annotations(card_def), start_date, end_date)
             
             conn = get_snowflake_connection()
             cursor = conn.cursor()
             
-            # Domo → Snowflake: Add missing, update changed
-            for ann_id, ann in domo_by_id.items():
-                entry_date = ann.get("dataPoint", {}).get("point1", "")
-                content = ann.get("content", "")
-                color = ann.get("color", "")
-                user_id = ann.get("userId", 0)
-                user_name = ann.get("userName", "Unknown")
-                
-                # Convert Domo createdDate (milliseconds) to timestamp
-                created_ts = ann.get("createdDate", 0)
-                created_date = datetime.fromtimestamp(created_ts / 1000) if created_ts else None
-                
-                if ann_id in sf_by_id:
-                    # Check if update needed (content, color, or missing created_date)
-                    sf_ann = sf_by_id[ann_id]
-                    needs_update = (
-                        sf_ann["CONTENT"] != content or 
-                        sf_ann["COLOR"] != color or
-                        sf_ann.get("CREATED_DATE") is None
-                    )
-                    
-                    if needs_update:
-                        update_sql = f"""
-                            UPDATE {SNOWFLAKE_TABLE}
-                            SET CONTENT = %s, COLOR = %s, ENTRY_DATE = %s,
-                                DOMO_USER_ID = %s, DOMO_USER_NAME = %s, CREATED_DATE = %s
-                            WHERE ID = %s
-                        """
-                        cursor.execute(update_sql, (content, color, entry_date, user_id, user_name, created_date, ann_id))
-                        results["updated"] += 1
-                    else:
-                        results["skipped"] += 1
-                else:
-                    # Insert to Snowflake
-                    insert_sql = f"""
-                        INSERT INTO {SNOWFLAKE_TABLE} 
-                        (CARD_ID, ID, DOMO_USER_ID, DOMO_USER_NAME, COLOR, CONTENT, ENTRY_DATE, CREATED_DATE)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    """
-                    cursor.execute(insert_sql, (int(card_id), ann_id, user_id, user_name, color, content, entry_date, created_date))
-                    results["inserted"] += 1
+            # Get this card's Snowflake rows in the same date range and diff
+            partitions = prefetch_snowflake_annotations(
+                cursor, [card_id], start_date, end_date, max_rows_per_card=SYNC_STREAM_THRESHOLD
+            )
+            if partitions[card_id] is None or len(domo_annotations) > SYNC_STREAM_THRESHOLD:
+                stream_card_sync(conn, cursor, card_id, domo_annotations, results)
+            else:
+                add_moved_annotations(cursor, {card_id: domo_annotations}, partitions)
+                changes = diff_card_annotations(*parse_card_ref(card_id), domo_annotations, partitions[card_id], DOMO_INSTANCE)
+                apply_sync_changes(cursor, changes)
+                conn.commit()
+                results["inserted"] = len(changes["inserts"])
+                results["updated"] = len(changes["updates"])
+                results["skipped"] = changes["skipped"]
             
-            conn.commit()
             cursor.close()
             conn.close()
-            
             return results
         except Exception as e:
-            st.error(f"Sync error: {str(e)}")
+            results["failed"] = 1
+            results["error"] = str(e)
             return results
     
     
-    def push_to_domo(card_id: str, start_date: str, end_date: str, colors: List[str]) -> Dict[str, int]:
+    def stream_card_sync(
+        conn,
+        cursor,
+        card_id: str,
+        domo_annotations: List[Dict[str, Any]],
+        results: Dict[str, int]
+    ) -> None:
         """
-        Push annotations from Snowflake to a Domo card.
-        Filters by date range and colors.
+        Sync a very large card in (ENTRY_DATE, ID) order, SYNC_STREAM_CHUNK Domo
+        annotations at a time: each chunk reads only the Snowflake rows in its own
+        date and ID window, is diffed and committed before the next one, so memory
+        stays bounded by the chunk - even when one date has more annotations than a
+        chunk - and a failure keeps every chunk before it. `results` is updated per
+        committed chunk. Raises on failure.
         """
-        results = {"pushed": 0, "failed": 0}
+        for chunk, date_range, id_range in stream_sync_chunks(domo_annotations, SYNC_STREAM_CHUNK):
+            rows = query_snowflake_annotations(
+                cursor, *date_range, card_id=card_id, id_range=id_range
+            ) if date_range else []
+            partitions = {card_id: rows}
+            add_moved_annotations(cursor, {card_id: chunk}, partitions)
+            changes = diff_card_annotations(*parse_card_ref(card_id), chunk, partitions[card_id], DOMO_INSTANCE)
+            apply_sync_changes(cursor, changes)
+            conn.commit()
+            results["inserted"] += len(changes["inserts"])
+            results["updated"] += len(changes["updates"])
+            results["skipped"] += changes["skipped"]
+    
+    
+    def filter_by_entry_date(
+        domo_annotations: List[Dict[str, Any]],
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Keep Domo annotations whose date (point1) falls in the range."""
+        if not (start_date or end_date):
+            return domo_annotations
+        filtered_annotations = []
+        for ann in domo_annotations:
+            entry_date = ann.get("dataPoint", {}).get("point1", "")
+            if entry_date:
+                if start_date and entry_date < start_date:
+                    continue
+                if end_date and entry_date > end_date:
+                    continue
+                filtered_annotations.append(ann)
+        return filtered_annotations
+    
+    
+    def apply_sync_changes(cursor, changes: Dict[str, Any]) -> None:
+        """Write a diff from diff_card_annotations as batched DML."""
+        ensure_schema()
+        if changes["updates"]:
+            update_sql = f"""
+                UPDATE {SNOWFLAKE_TABLE}
+                SET CONTENT = %s, COLOR = %s, ENTRY_DATE = %s,
+                    DOMO_USER_ID = %s, DOMO_USER_NAME = %s, CREATED_DATE = %s,
+                    DOMO_INSTANCE = %s, UPDATED_AT = CURRENT_TIMESTAMP()
+                WHERE ID = %s AND COALESCE(DOMO_INSTANCE, %s) = %s
+            """
+            cursor.executemany(update_sql, changes["updates"])
         
-        try:
-            # Get Snowflake annotations with filters
-            sf_annotations = get_snowflake_annotations(start_date=start_date, end_date=end_date)
-            
-            # Filter by colors
-            if colors:
-                sf_annotations = [ann for ann in sf_annotations if ann.get("COLOR") in colors]
-            
-            # Push each annotation to Domo
-            for ann in sf_annotations:
-                content = ann.get("CONTENT", "")
-                entry_date = str(ann.get("ENTRY_DATE", ""))
-                color = ann.get("COLOR", "#72B0D7")
-                
-                domo_ann = add_annotation_to_domo(card_id, content, entry_date, color)
+        if changes["inserts"]:
+            insert_sql = f"""
+                INSERT INTO {SNOWFLAKE_TABLE} 
+                (CARD_ID, ID, DOMO_USER_ID, DOMO_USER_NAME, COLOR, CONTENT, ENTRY_DATE, CREATED_DATE, DOMO_INSTANCE, UPDATED_AT, ROW_KEY)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP(), UUID_STRING())
+            """
+            cursor.executemany(insert_sql, changes["inserts"])
+    
+    
+    def sync_cards_pipelined(
+        card_ids: List[str],
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        on_card_done=None
+    ) -> Dict[str, int]:
+        """
+        Sync many cards as a three-stage pipeline so Domo and Snowflake time overlap:
+        a fetcher pulls card definitions concurrently into a bounded queue, a diff
+        stage compares each card with Snowflake, and the calling thread applies the
+        changes over a single Snowflake connection. The diff stage reads Snowflake
+        for SYNC_PREFETCH_CARDS cards at a time in one date-bounded query; cards over
+        SYNC_STREAM_THRESHOLD skip it and are streamed by the apply stage.
+        `on_card_done(card_id, results)` runs on the calling thread after each card;
+        a failed card's results say why in `error`. Nothing is shown from here, so
+        org-wide sync shards can run it off the script thread.
+        """
+        totals = {"inserted": 0, "updated": 0, "skipped": 0, "failed": 0}
+        stop = threading.Event()
+        fetched = queue.Queue(maxsize=max(1, PIPELINE_QUEUE_SIZE // CARD_BATCH_SIZE))
+        diffed = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        
+        def put(q, item):
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.5)
+                    return
+                except queue.Full:
+                    continue
+        
+        def take(q):
+            while not stop.is_set():
+                try:
+                    return q.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+            return None
+        
+        def fetch_stage():
+            sent = 0
+            try:
+                for i in range(0, len(card_ids), CARD_BATCH_SIZE):
+                    batch = card_ids[i:i + CARD_BATCH_SIZE]
+                    card_defs = fetch_kpi_definitions(batch)
+                    put(fetched, [(card_id, card_defs.get(card_id)) for card_id in batch])
+                    sent += len(batch)
+            except Exception as e:
+                # Unfetched cards still flow through so they are reported as failed
+                put(fetched, [(card_id, e) for card_id in card_ids[sent:]])
+            finally:
+                put(fetched, None)
+        
+        def diff_stage():
+            conn = None
+            partitions = {}
+            prefetched = 0
+            try:
+                while True:
+                    batch = take(fetched)
+                    if batch is None:
+                        break
+                    domo_by_card = {}
+                    for card_id, card_def in batch:
+                        if isinstance(card_def, Exception):
+                            put(diffed, (card_id, None, card_def))
+                        elif card_def is None:
+                            put(diffed, (card_id, None, RuntimeError("Card definition was not fetched")))
+                        else:
+                            domo_by_card[card_id] = filter_by_entry_date(get_domo_annotations(card_def), start_date, end_date)
+                    if not domo_by_card:
+                        continue
+                    try:
+                        if conn is None:
+                            conn = get_snowflake_connection()
+                        cursor = conn.cursor()
+                        # Cards arrive in order, so prefetch the next chunk when this batch runs past it
+                        while prefetched < len(card_ids) and any(card_id not in partitions for card_id in domo_by_card):
+                            chunk = card_ids[prefetched:prefetched + SYNC_PREFETCH_CARDS]
+                            partitions.update(prefetch_snowflake_annotations(
+                                cursor, chunk, start_date, end_date, max_rows_per_card=SYNC_STREAM_THRESHOLD
+                            ))
+                            prefetched += len(chunk)
+                        # Very large cards skip the in-memory diff; the apply stage streams them
+                        for card_id, domo_annotations in list(domo_by_card.items()):
+                            if partitions.get(card_id, []) is None or len(domo_annotations) > SYNC_STREAM_THRESHOLD:
+                                partitions.pop(card_id, None)
+                                put(diffed, (card_id, {"stream": domo_by_card.pop(card_id)}, None))
+                        add_moved_annotations(cursor, domo_by_card, partitions)
+                        cursor.close()
+                    except Exception as e:
+                        for card_id in domo_by_card:
+                            put(diffed, (card_id, None, e))
+                        continue
+                    for card_id, domo_annotations in domo_by_card.items():
+                        try:
+                            sf_annotations = partitions.pop(card_id, [])
+                            put(diffed, (card_id, diff_card_annotations(*parse_card_ref(card_id), domo_annotations, sf_annotations, DOMO_INSTANCE), None))
+                        except Exception as e:
+                            put(diffed, (card_id, None, e))
+            finally:
+                if conn is not None:
+                    conn.close()
+                put(diffed, None)
+        
+        stages = [threading.Thread(target=fetch_stage, daemon=True), threading.Thread(target=diff_stage, daemon=True)]
+        for stage in stages:
+            stage.start()
+        
+        conn = None
+        try:
+            while True:
+                item = take(diffed)
+                if item is None:
+                    break
+                card_id, changes, error = item
+                results = {"inserted": 0, "updated": 0, "skipped": 0, "failed": 0}
+                try:
+                    if error is not None:
+                        raise error
+                    if conn is None:
+                        conn = get_snowflake_connection()
+                    cursor = conn.cursor()
+                    if "stream" in changes:
+                        stream_card_sync(conn, cursor, card_id, changes["stream"], results)
+                    else:
+                        apply_sync_changes(cursor, changes)
+                        conn.commit()
+                        results["inserted"] = len(changes["inserts"])
+                        results["updated"] = len(changes["updates"])
+                        results["skipped"] = changes["skipped"]
+                    cursor.close()
+                except Exception as e:
+                    results["failed"] = 1
+                    results["error"] = str(e)
+                for key in totals:
+                    totals[key] += results[key]
+                if on_card_done:
+                    on_card_done(card_id, results)
+        finally:
+            # Also reached when a rerun interrupts the script - releases the stages
+            stop.set()
+            if conn is not None:
+                conn.close()
+        return totals
+    
+    
+    def push_to_domo(
+        card_id: str,
+        start_date: str,
+        end_date: str,
+        colors: List[str],
+        card_def: Optional[Dict[str, Any]] = None,
+        sf_annotations: Optional[List[Dict[str, Any]]] = None
+    ) -> Dict[str, int]:
+        """
+        Push annotations from Snowflake to a Domo card.
+        Filters by date range and colors.
+        Skips rows the mapping index says are already on the card.
+        Pass a prefetched `card_def` to skip the Domo fetch, and the date range's
+        Snowflake rows as `sf_annotations` to skip the Snowflake query.
+        `failed` is non-zero if any annotation (or the whole card) failed.
+        """
+        results = {"pushed": 0, "skipped": 0, "failed": 0}
+        
+        try:
+            # Get Snowflake annotations with filters
+            if sf_annotations is None:
+                sf_annotations = get_snowflake_annotations(start_date=start_date, end_date=end_date)
+            
+            # Filter by colors
+            if colors:
+                sf_annotations = [ann for ann in sf_annotations if ann.get("COLOR") in colors]
+            
+            if not sf_annotations:
+                return results
+            
+            # Consult the mapping index in bulk
+            by_key = {annotation_row_key(ann): ann for ann in sf_annotations}
+            already_pushed = get_domo_mappings(card_id, list(by_key.keys()))
+            missing, adopted = plan_push(
+                by_key,
+                already_pushed,
+                lambda: get_domo_annotations(card_def if card_def is not None else fetch_kpi_definition(card_id))
+            )
+            results["skipped"] += len(sf_annotations) - len(missing)
+            record_domo_mappings(card_id, adopted)
+            
+            # Queue every missing annotation at once so they go out in one save
+            queued = []
+            for key, ann in missing.items():
+                new_annotation = {
+                    "content": ann.get("CONTENT", ""),
+                    "dataPoint": {"point1": str(ann.get("ENTRY_DATE", ""))},
+                    "color": ann.get("COLOR", "#72B0D7"),
+                }
+                queued.append((key, card_write_queue().add(card_id, new_annotation)))
+            
+            pushed = []
+            for key, future in queued:
+                try:
+                    domo_ann = wait_for_write(future)
+                except Exception as e:
+                    st.error(f"Error adding to Domo card {card_id}: {str(e)}")
+                    domo_ann = None
                 if domo_ann:
+                    pushed.append((key, domo_ann.get("id")))
                     results["pushed"] += 1
                 else:
                     results["failed"] += 1
+            record_domo_mappings(card_id, pushed)
             
             return results
         except Exception as e:
             st.error(f"Push to Domo error: {str(e)}")
+            results["failed"] += 1
             return results
+    
+    
+    def replicate_annotations(source_card_id: str, target_card_ids: List[str]) -> Dict[str, Any]:
+        """
+        Copy every annotation on one Domo card to other cards, on any instances.
+        The source and all targets are read in one concurrent fetch, then each
+        target's missing annotations are queued together, so every target is saved
+        once and the targets are saved in parallel. Annotations the mapping index
+        lists for a target, or already on it with the same text, date and color,
+        are skipped. Copies are recorded in Snowflake and the mapping index.
+        Returns {"replicated", "skipped", "failed", "success_cards"}; counts are annotations.
+        Raises if the source card cannot be read.
+        """
+        results = {"replicated": 0, "skipped": 0, "failed": 0, "success_cards": []}
+        target_card_ids = [card_id for card_id in dict.fromkeys(target_card_ids) if card_id != source_card_id]
+        
+        card_defs = fetch_kpi_definitions([source_card_id] + target_card_ids)
+        source_def = card_defs.get(source_card_id)
+        if not isinstance(source_def, dict):
+            raise RuntimeError(f"Could not read source card {source_card_id}: {str(source_def)}")
+        # Keyed like the Snowflake rows a sync of the source card would write
+        source_instance = parse_card_ref(source_card_id)[0]
+        source_annotations = {
+            annotation_row_key({"ID": ann.get("id"), "DOMO_INSTANCE": source_instance}): ann
+            for ann in get_domo_annotations(source_def)
+        }
+        if not source_annotations:
+            return results
+        
+        queued = {}
+        for card_id in target_card_ids:
+            target_def = card_defs.get(card_id)
+            try:
+                if not isinstance(target_def, dict):
+                    raise RuntimeError(str(target_def))
+                already_copied = get_domo_mappings(card_id, list(source_annotations))
+            except Exception as e:
+                st.error(f"Error replicating to Domo card {card_id}: {str(e)}")
+                results["failed"] += len(source_annotations)
+                continue
+            
+            on_card = {
+                (ann.get("content"), ann.get("dataPoint", {}).get("point1"), ann.get("color")): ann.get("id")
+                for ann in get_domo_annotations(target_def)
+            }
+            adopted = []
+            for key, ann in source_annotations.items():
+                domo_id = on_card.get((ann.get("content"), ann.get("dataPoint", {}).get("point1"), ann.get("color")))
+                if key in already_copied:
+                    results["skipped"] += 1
+                elif domo_id is not None:
+                    adopted.append((key, domo_id))
+                    results["skipped"] += 1
+                else:
+                    new_annotation = {
+                        "content": ann.get("content", ""),
+                        "dataPoint": {"point1": ann.get("dataPoint", {}).get("point1", "")},
+                        "color": ann.get("color", "#72B0D7"),
+                    }
+                    queued.setdefault(card_id, []).append((key, new_annotation, card_write_queue().add(card_id, new_annotation)))
+            record_domo_mappings(card_id, adopted)
+        
+        rows, mappings = [], []
+        for card_id, writes in queued.items():
+            instance, plain_id = parse_card_ref(card_id)
+            for key, new_annotation, future in writes:
+                try:
+                    domo_ann = wait_for_write(future)
+                except Exception as e:
+                    st.error(f"Error adding to Domo card {card_id}: {str(e)}")
+                    domo_ann = None
+                if not domo_ann:
+                    results["failed"] += 1
+                    continue
+                rows.append((
+                    int(plain_id), domo_ann.get("id"), domo_ann.get("userId"), domo_ann.get("userName"),
+                    new_annotation["color"], new_annotation["content"], new_annotation["dataPoint"]["point1"], instance
+                ))
+                mappings.append((key, int(plain_id), domo_ann.get("id"), instance))
+                results["replicated"] += 1
+                if card_id not in results["success_cards"]:
+                    results["success_cards"].append(card_id)
+        
+        if rows:
+            try:
+                insert_card_annotations(rows, mappings)
+            except Exception as e:
+                st.error(
+                    f"Snowflake insert error: {str(e)}. "
+                    "The copies are on the target cards; the next sync of those cards will record them."
+                )
+        return results
+    
+    
+    # ==========================
+    # BULK IMPORT
+    # ==========================
+    def import_column(name) -> Optional[str]:
+        """The IMPORT_COLUMNS field a header names, or None for a column the import ignores."""
+        key = str(name or "").strip().lower().replace(" ", "_")
+        return next((field for field, aliases in IMPORT_COLUMNS.items() if key in aliases), None)
+    
+    
+    def read_import_rows(uploaded_file) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Stream (row number, {field: value}) from an uploaded CSV or Excel (.xlsx) file.
+        Row numbers are the spreadsheet's own, header included. Blank rows are skipped.
+        Raises ValueError if the header has no Content or Date column.
+        """
+        def fields(header) -> List[Optional[str]]:
+            names = [import_column(name) for name in header]
+            if "content" not in names or "date" not in names:
+                raise ValueError("The first row must name a Content and a Date column")
+            return names
+        
+        uploaded_file.seek(0)
+        if uploaded_file.name.lower().endswith(".xlsx"):
+            # Only Excel uploads need openpyxl
+            import openpyxl
+            workbook = openpyxl.load_workbook(uploaded_file, read_only=True, data_only=True)
+            try:
+                rows = workbook.active.iter_rows(values_only=True)
+                names = fields(next(rows, ()))
+                for row_number, values in enumerate(rows, start=2):
+                    if any(value not in (None, "") for value in values):
+                        yield row_number, dict(zip(names, values))
+            finally:
+                workbook.close()
+        else:
+            text = io.TextIOWrapper(uploaded_file, encoding="utf-8-sig", newline="")
+            try:
+                reader = csv.reader(text)
+                names = fields(next(reader, []))
+                for values in reader:
+                    if any(value.strip() for value in values):
+                        yield reader.line_num, dict(zip(names, values))
+            finally:
+                # Leave the upload open for the next rerun
+                text.detach()
+    
+    
+    def validate_import(uploaded_file) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Check every row of an upload as it streams in.
+        Returns (valid rows with their "row" number, [{"Row": n, "Error": message}]).
+        """
+        valid, errors = [], []
+        for row_number, row in read_import_rows(uploaded_file):
+            try:
+                valid.append(dict(parse_import_row(row, ANNOTATION_COLORS, IMPORT_DATE_FORMATS, card_ref_from_input), row=row_number))
+            except ValueError as e:
+                errors.append({"Row": row_number, "Error": str(e)})
+        return valid, errors
+    
+    
+    def import_row_key(row: Dict[str, Any]) -> str:
+        """Mapping index key of an import row - the content key of a global annotation row."""
+        return annotation_row_key({"CONTENT": row["content"], "ENTRY_DATE": row["entry_date"], "COLOR": row["color"]})
+    
+    
+    def get_global_row_keys(start_date: str, end_date: str) -> set:
+        """Content keys of the global annotations between two dates. Raises on failure."""
+        conn = get_snowflake_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            f"""
+            SELECT CONTENT, ENTRY_DATE, COLOR FROM {SNOWFLAKE_TABLE}
+            WHERE CARD_ID IS NULL AND ENTRY_DATE >= %s AND ENTRY_DATE <= %s
+            """,
+            (start_date, end_date)
+        )
+        keys = {
+            annotation_row_key({"CONTENT": content, "ENTRY_DATE": entry_date, "COLOR": color})
+            for content, entry_date, color in cursor.fetchall()
+        }
+        cursor.close()
+        conn.close()
+        return keys
+    
+    
+    def import_annotations(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Write validated import rows. Every Domo add is queued before waiting on any,
+        so the write queue saves each card once with all of its rows, and the cards
+        concurrently. The Snowflake rows and Domo mappings then go out in one batched
+        insert. Rows without cards are saved as global annotations.
+        Importing is idempotent, like replicate_annotations: rows the mapping index
+        lists for a card, or already on it with the same text, date and color, are
+        skipped, and so are global rows Snowflake already has.
+        Returns {"imported": annotations written, "skipped": annotations already there,
+        "saved": False if the Snowflake insert failed, "errors": [{"Row": n, "Error": message}]}.
+        """
+        results = {"imported": 0, "skipped": 0, "saved": True, "errors": []}
+        
+        by_card = {}
+        for row in rows:
+            for card_ref in row["card_refs"]:
+                by_card.setdefault(card_ref, []).append(row)
+        card_defs = fetch_kpi_definitions(list(by_card))
+        
+        queued = []
+        for card_ref, card_rows in by_card.items():
+            card_def = card_defs.get(card_ref)
+            try:
+                if not isinstance(card_def, dict):
+                    raise RuntimeError(str(card_def))
+                already_imported = get_domo_mappings(card_ref, list({import_row_key(row) for row in card_rows}))
+            except Exception as e:
+                results["errors"].extend({"Row": row["row"], "Error": f"Card {card_ref}: {str(e)}"} for row in card_rows)
+                continue
+            
+            on_card = {
+                (ann.get("content"), ann.get("dataPoint", {}).get("point1"), ann.get("color")): ann.get("id")
+                for ann in get_domo_annotations(card_def)
+            }
+            adopted, seen = [], set()
+            for row in card_rows:
+                key = import_row_key(row)
+                domo_id = on_card.get((row["content"], row["entry_date"], row["color"]))
+                if key in already_imported or key in seen:
+                    results["skipped"] += 1
+                elif domo_id is not None:
+                    adopted.append((key, domo_id))
+                    results["skipped"] += 1
+                else:
+                    new_annotation = {
+                        "content": row["content"],
+                        "dataPoint": {"point1": row["entry_date"]},
+                        "color": row["color"],
+                    }
+                    queued.append((row, card_ref, card_write_queue().add(card_ref, new_annotation)))
+                seen.add(key)
+            record_domo_mappings(card_ref, adopted)
+        
+        inserts = []
+        global_rows = [row for row in rows if not row["card_refs"]]
+        if global_rows:
+            try:
+                existing = get_global_row_keys(
+                    min(row["entry_date"] for row in global_rows), max(row["entry_date"] for row in global_rows)
+                )
+            except Exception as e:
+                results["errors"].extend({"Row": row["row"], "Error": f"Snowflake: {str(e)}"} for row in global_rows)
+                global_rows, existing = [], set()
+            for row in global_rows:
+                key = import_row_key(row)
+                if key in existing:
+                    results["skipped"] += 1
+                    continue
+                existing.add(key)
+                inserts.append((None, None, None, None, row["color"], row["content"], row["entry_date"], DOMO_INSTANCE))
+        
+        mappings = []
+        for row, card_ref, future in queued:
+            try:
+                domo_ann = wait_for_write(future)
+            except Exception as e:
+                results["errors"].append({"Row": row["row"], "Error": f"Card {card_ref}: {str(e)}"})
+                continue
+            if not domo_ann:
+                results["errors"].append({"Row": row["row"], "Error": f"Card {card_ref}: the saved annotation was not found"})
+                continue
+            instance, plain_id = parse_card_ref(card_ref)
+            inserts.append((
+                int(plain_id), domo_ann.get("id"), domo_ann.get("userId"), domo_ann.get("userName"),
+                row["color"], row["content"], row["entry_date"], instance
+            ))
+            for key in (annotation_row_key({"ID": domo_ann.get("id"), "DOMO_INSTANCE": instance}), import_row_key(row)):
+                mappings.append((key, int(plain_id), domo_ann.get("id"), instance))
+        
+        if not inserts:
+            return results
+        try:
+            insert_card_annotations(inserts, mappings)
+            results["imported"] = len(inserts)
+        except Exception as e:
+            results["saved"] = False
+            st.error(
+                f"Snowflake insert error: {str(e)}. "
+                "Annotations already added to Domo cards will be recorded by the next sync of those cards."
+            )
+        return results
+    
+    
+    # ==========================
+    # JOB CHECKPOINTS
+    # ==========================
+    def get_completed_cards(job_id: str) -> Dict[str, Dict[str, Any]]:
+        """Cards finished by a job within the last CHECKPOINT_TTL_HOURS. Returns {card_id: results}"""
+        try:
+            ensure_schema()
+            conn = get_snowflake_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                f"""
+                SELECT DOMO_INSTANCE, CARD_ID, RESULTS FROM {SNOWFLAKE_CHECKPOINT_TABLE}
+                WHERE JOB_ID = %s AND STATUS = 'done' AND UPDATED_AT >= DATEADD(hour, %s, CURRENT_TIMESTAMP())
+                """,
+                (job_id, -CHECKPOINT_TTL_HOURS)
+            )
+            completed = {
+                format_card_ref(instance, card_id): json.loads(raw) if raw else {}
+                for instance, card_id, raw in cursor.fetchall()
+            }
+            cursor.close()
+            conn.close()
+            return completed
+        except Exception as e:
+            st.error(f"Checkpoint read error: {str(e)}")
+            return {}
+    
+    
+    def write_card_checkpoint(job_id: str, shard: int, card_id: str, results: Dict[str, Any]) -> None:
+        """Mark a card as finished for a job. Raises on failure."""
+        ensure_schema()
+        conn = get_snowflake_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            f"""
+            INSERT INTO {SNOWFLAKE_CHECKPOINT_TABLE} (JOB_ID, SHARD, CARD_ID, STATUS, RESULTS, UPDATED_AT, DOMO_INSTANCE)
+            VALUES (%s, %s, %s, 'done', %s, CURRENT_TIMESTAMP(), %s)
+            """,
+            (job_id, shard, int(parse_card_ref(card_id)[1]), json.dumps(results), parse_card_ref(card_id)[0])
+        )
+        conn.commit()
+        cursor.close()
+        conn.close()
+    
+    
+    def record_card_checkpoint(job_id: str, shard: int, card_id: str, results: Dict[str, Any]) -> bool:
+        """Mark a card as finished for a job."""
+        try:
+            write_card_checkpoint(job_id, shard, card_id, results)
+            return True
+        except Exception as e:
+            st.error(f"Checkpoint write error: {str(e)}")
+            return False
+    
+    
+    def card_job_id(kind: str, card_ids: List[str], *params) -> str:
+        """Stable ID for a multi-card job, so running the same job again within CHECKPOINT_TTL_HOURS resumes it."""
+        digest = hashlib.sha1(",".join(sorted(card_ids)).encode("utf-8")).hexdigest()[:12]
+        return ":".join([kind] + [str(param or "") for param in params] + [digest])
+    
+    
+    def resume_card_job(job_id: str, card_ids: List[str], totals: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Session progress for a multi-card Sync / Push job, seeded from its checkpoints:
+        cards an earlier, interrupted run finished are marked done and their counts
+        carried over, so only the remainder is processed. Cancelled runs leave no
+        checkpoints, and ones older than CHECKPOINT_TTL_HOURS are deleted first.
+        """
+        expire_job_checkpoints()
+        completed = get_completed_cards(job_id)
+        progress = dict(totals, job_id=job_id, done=[], processed=0, resumed=0)
+        for card_id in card_ids:
+            if card_id not in completed:
+                continue
+            for key, value in completed[card_id].items():
+                if key in progress and isinstance(progress[key], int):
+                    progress[key] += value
+            if completed[card_id].get("pushed") and "success_cards" in progress:
+                progress["success_cards"].append(card_id)
+            progress["done"].append(card_id)
+        progress["processed"] = progress["resumed"] = len(progress["done"])
+        return progress
+    
+    
+    def clear_job_checkpoints(job_id: str) -> bool:
+        """Drop a finished job's checkpoints so the next run starts fresh."""
+        try:
+            ensure_schema()
+            conn = get_snowflake_connection()
+            cursor = conn.cursor()
+            cursor.execute(f"DELETE FROM {SNOWFLAKE_CHECKPOINT_TABLE} WHERE JOB_ID = %s", (job_id,))
+            conn.commit()
+            cursor.close()
+            conn.close()
+            return True
+        except Exception as e:
+            st.error(f"Checkpoint delete error: {str(e)}")
+            return False
+    
+    
+    def expire_job_checkpoints() -> bool:
+        """Delete every job's checkpoints older than CHECKPOINT_TTL_HOURS (runs when a job starts)."""
+        try:
+            ensure_schema()
+            conn = get_snowflake_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                f"DELETE FROM {SNOWFLAKE_CHECKPOINT_TABLE} WHERE UPDATED_AT < DATEADD(hour, %s, CURRENT_TIMESTAMP())",
+                (-CHECKPOINT_TTL_HOURS,)
+            )
+            conn.commit()
+            cursor.close()
+            conn.close()
+            return True
+        except Exception as e:
+            st.error(f"Checkpoint delete error: {str(e)}")
+            return False
+    
+    
+    # ==========================
+    # ORG-WIDE SYNC
+    # ==========================
+    def list_kpi_card_summaries(instance: Optional[str] = None, page_size: int = 100) -> List[Dict[str, Any]]:
+        """Admin summaries of every KPI card on an instance (paged)."""
+        instance = instance or DOMO_INSTANCE
+        pool = domo_pool(instance)
+        url = f"https://{instance}.domo.com/api/content/v2/cards/adminsummary"
+        cards = []
+        skip = 0
+        while True:
+            r = send_domo_request(
+                pool, "post", url, "adminsummary",
+                headers=product_headers(pool["token"]),
+                params={"skip": skip, "limit": page_size},
+                json={"ascending": True, "orderBy": "cardTitle"}
+            )
+            if r.status_code != 200:
+                raise RuntimeError(f"HTTP {r.status_code}: {r.text[:500]}")
+            r.encoding = "utf-8"
+            page = r.json().get("cardAdminSummaries", [])
+            cards.extend(card for card in page if str(card.get("type", "")).lower() == "kpi")
+            if len(page) < page_size:
+                return cards
+            skip += page_size
+    
+    
+    def list_kpi_cards(instance: Optional[str] = None) -> List[str]:
+        """List every KPI card on an instance as card references."""
+        instance = instance or DOMO_INSTANCE
+        return [format_card_ref(instance, card.get("id")) for card in list_kpi_card_summaries(instance)]
+    
+    
+    def discover_annotated_cards(chunk_size: int = 200) -> List[str]:
+        """KPI cards on every instance that currently have annotations.
+        Definitions are fetched concurrently in chunks and dropped right away."""
+        annotated = []
+        card_ids = [card_id for instance in DOMO_INSTANCES for card_id in list_kpi_cards(instance)]
+        for i in range(0, len(card_ids), chunk_size):
+            card_defs = fetch_kpi_definitions(card_ids[i:i + chunk_size])
+            for card_id, card_def in card_defs.items():
+                if isinstance(card_def, dict) and get_domo_annotations(card_def):
+                    annotated.append(card_id)
+        return annotated
+    
+    
+    def shard_cards(card_ids: List[str], shard_count: int) -> List[List[str]]:
+        """Split cards deterministically across shards (stable hash of the card ID)."""
+        shards = [[] for _ in range(shard_count)]
+        for card_id in sorted(card_ids):
+            shards[zlib.crc32(str(card_id).encode("utf-8")) % shard_count].append(card_id)
+        return shards
+    
+    
+    def run_sync_shard(
+        job_id: str,
+        shard: int,
+        card_ids: List[str],
+        start_date: Optional[str],
+        end_date: Optional[str],
+        result_queue
+    ) -> None:
+        """
+        Worker thread body: sync one shard, checkpointing every finished card.
+        Runs without a script context, so errors go back on `result_queue` in the
+        card's results for the calling thread to report.
+        """
+        def on_card_done(card_id: str, results: Dict[str, Any]):
+            if not results["failed"]:
+                try:
+                    write_card_checkpoint(job_id, shard, card_id, results)
+                except Exception as e:
+                    results = dict(results, error=f"Checkpoint write error: {str(e)}")
+            result_queue.put((shard, card_id, results))
+        
+        try:
+            sync_cards_pipelined(card_ids, start_date, end_date, on_card_done=on_card_done)
+        finally:
+            result_queue.put((shard, None, None))
+    
+    
+    def sync_all_cards(
+        start_date: Optional[str],
+        end_date: Optional[str],
+        workers: int,
+        on_progress=None
+    ) -> Dict[str, int]:
+        """
+        Discover every annotated KPI card and sync them across `workers` threads.
+        Progress is checkpointed per card, so rerunning the same date range within
+        CHECKPOINT_TTL_HOURS resumes where a failed run stopped.
+        `on_progress(done, total)` is called from this thread as cards finish.
+        Per-card errors are returned in `errors`; `failed_shards` counts workers
+        that stopped early, whose unfinished cards count as failed.
+        """
+        results = {"inserted": 0, "updated": 0, "skipped": 0, "failed": 0, "cards": 0, "failed_shards": 0, "errors": []}
+        job_id = f"org-sync:{start_date or ''}:{end_date or ''}"
+        
+        ensure_schema()
+        expire_job_checkpoints()
+        card_ids = discover_annotated_cards()
+        results["cards"] = len(card_ids)
+        if not card_ids:
+            return results
+        
+        # Cards an earlier run finished are counted here and not handed to the shards
+        completed = get_completed_cards(job_id)
+        done = 0
+        for card_id in card_ids:
+            if card_id in completed:
+                for key in ("inserted", "updated", "skipped"):
+                    results[key] += completed[card_id].get(key, 0)
+                done += 1
+        if done and on_progress:
+            on_progress(done, len(card_ids))
+        
+        # Shards are I/O-bound, so they run on threads of this process. They have no
+        # script context: everything they report comes back through result_queue
+        result_queue = queue.Queue()
+        shards = [shard for shard in shard_cards([card_id for card_id in card_ids if card_id not in completed], max(1, workers)) if shard]
+        futures = []
+        finished_shards = 0
+        with ThreadPoolExecutor(max_workers=max(1, len(shards)), thread_name_prefix="org-sync") as executor:
+            futures = [
+                executor.submit(run_sync_shard, job_id, shard_no, shard, start_date, end_date, result_queue)
+                for shard_no, shard in enumerate(shards)
+            ]
+            while finished_shards < len(futures):
+                try:
+                    shard_no, card_id, card_results = result_queue.get(timeout=1)
+                except queue.Empty:
+                    if all(future.done() for future in futures):
+                        break
+                    continue
+                if card_id is None:
+                    finished_shards += 1
+                    continue
+                for key in ("inserted", "updated", "skipped", "failed"):
+                    results[key] += card_results.get(key, 0)
+                if card_results.get("error"):
+                    results["errors"].append(f"Card {card_id}: {card_results['error']}")
+                done += 1
+                if on_progress:
+                    on_progress(done, len(card_ids))
+        
+        for shard_no, future in enumerate(futures):
+            try:
+                future.result()
+            except Exception as e:
+                results["failed_shards"] += 1
+                results["errors"].append(f"Worker {shard_no + 1}: {str(e)}")
+        
+        # Only a clean, complete run forgets its checkpoints
+        if done == len(card_ids) and not results["failed"]:
+            clear_job_checkpoints(job_id)
+        else:
+            results["failed"] += len(card_ids) - done
+        return results
+    
+    
+    # ==========================
+    # AUTO-SYNC
+    # ==========================
+    def load_auto_sync_cards() -> List[str]:
+        """Card IDs registered for auto-sync. Raises on failure."""
+        ensure_schema()
+        conn = get_snowflake_connection()
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT DISTINCT DOMO_INSTANCE, CARD_ID FROM {SNOWFLAKE_AUTO_SYNC_TABLE}")
+        card_ids = sorted({format_card_ref(instance, card_id) for instance, card_id in cursor.fetchall()})
+        cursor.close()
+        conn.close()
+        return card_ids
+    
+    
+    def set_auto_sync_cards(card_ids: List[str], registered: bool) -> bool:
+        """Register (or unregister) cards for auto-sync, here and in the running scheduler."""
+        try:
+            ensure_schema()
+            conn = get_snowflake_connection()
+            cursor = conn.cursor()
+            for card_id in card_ids:
+                card_condition, card_params = card_refs_filter([card_id])
+                cursor.execute(f"DELETE FROM {SNOWFLAKE_AUTO_SYNC_TABLE} WHERE {card_condition}", card_params)
+            if registered:
+                cursor.executemany(
+                    f"INSERT INTO {SNOWFLAKE_AUTO_SYNC_TABLE} (CARD_ID, DOMO_INSTANCE, REGISTERED_AT) VALUES (%s, %s, CURRENT_TIMESTAMP())",
+                    [(int(card_id), instance) for instance, card_id in map(parse_card_ref, card_ids)]
+                )
+            conn.commit()
+            cursor.close()
+            conn.close()
+        except Exception as e:
+            st.error(f"Auto-sync registration error: {str(e)}")
+            return False
+        
+        if AUTO_SYNC_ENABLED:
+            scheduler = auto_sync_scheduler()
+            for card_id in card_ids:
+                if registered:
+                    scheduler.register(card_id)
+                else:
+                    scheduler.unregister(card_id)
+        return True
+    
+    
+    @st.cache_resource
+    def auto_sync_scheduler() -> AutoSyncScheduler:
+        """The process-wide auto-sync daemon (started on first use)."""
+        return AutoSyncScheduler(
+            sync_card=sync_card_annotations,
+            load_cards=load_auto_sync_cards,
+            budget_per_minute=AUTO_SYNC_BUDGET,
+            min_interval=AUTO_SYNC_MIN_INTERVAL,
+            max_interval=AUTO_SYNC_MAX_INTERVAL,
+            on_change=invalidate_annotation_caches,
+        )
+    
+    
+    def format_duration(seconds: Optional[float]) -> str:
+        """Compact duration like 45s, 12m, 3h 20m or 2d."""
+        if seconds is None:
+            return "—"
+        seconds = int(seconds)
+        if seconds < 60:
+            return f"{seconds}s"
+        if seconds < 3600:
+            return f"{seconds // 60}m"
+        if seconds < 86400:
+            return f"{seconds // 3600}h {seconds % 3600 // 60}m"
+        return f"{seconds // 86400}d"
+    
+    
+    # ==========================
+    # BACKFILL
+    # ==========================
+    BACKFILL_COLUMNS = ["CARD_ID", "ID", "DOMO_USER_ID", "DOMO_USER_NAME", "COLOR", "CONTENT", "ENTRY_DATE", "CREATED_DATE", "DOMO_INSTANCE"]
+    
+    
+    def write_backfill_chunks(card_ids: List[str], directory: str, chunk_rows: int, on_progress=None) -> Dict[str, int]:
+        """
+        Stream every card's Domo annotations into gzipped CSV chunks of at most
+        `chunk_rows` rows. Only one batch of definitions and one chunk of rows
+        are held in memory at a time.
+        """
+        stats = {"cards": 0, "rows": 0, "chunks": 0, "failed": 0}
+        buffer = []
+        
+        def flush():
+            if not buffer:
+                return
+            path = os.path.join(directory, f"annotations_{stats['chunks']:05d}.csv.gz")
+            with gzip.open(path, "wt", encoding="utf-8", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerows(buffer)
+            stats["chunks"] += 1
+            buffer.clear()
+        
+        for i in range(0, len(card_ids), CARD_BATCH_SIZE):
+            batch = card_ids[i:i + CARD_BATCH_SIZE]
+            card_defs = fetch_kpi_definitions(batch)
+            for card_id in batch:
+                card_def = card_defs.pop(card_id, None)
+                if not isinstance(card_def, dict):
+                    stats["failed"] += 1
+                    continue
+                instance, plain_id = parse_card_ref(card_id)
+                for ann in get_domo_annotations(card_def):
+                    created_ts = ann.get("createdDate", 0)
+                    created_date = datetime.fromtimestamp(created_ts / 1000).strftime("%Y-%m-%d %H:%M:%S") if created_ts else "\\N"
+                    buffer.append([
+                        int(plain_id),
+                        ann.get("id"),
+                        ann.get("userId", 0),
+                        ann.get("userName", "Unknown"),
+                        ann.get("color", ""),
+                        ann.get("content", ""),
+                        ann.get("dataPoint", {}).get("point1") or "\\N",
+                        created_date,
+                        instance,
+                    ])
+                    stats["rows"] += 1
+                    if len(buffer) >= chunk_rows:
+                        flush()
+                stats["cards"] += 1
+            if on_progress:
+                on_progress(min(i + CARD_BATCH_SIZE, len(card_ids)), len(card_ids))
+        flush()
+        return stats
+    
+    
+    def backfill_annotations(card_ids: List[str], chunk_rows: int = 50000, on_progress=None) -> Dict[str, int]:
+        """
+        Full-history load for a first run or a rebuild. Annotations are written to
+        local CSV chunks, bulk loaded with PUT + COPY INTO into a temporary staging
+        table, and merged into SNOWFLAKE_TABLE with a single MERGE.
+        """
+        results = {"cards": 0, "rows": 0, "inserted": 0, "updated": 0, "failed": 0}
+        directory = tempfile.mkdtemp(prefix="annotations_backfill_")
+        stage_table = f"{SNOWFLAKE_TABLE}_BACKFILL_STAGE"
+        
+        try:
+            stats = write_backfill_chunks(card_ids, directory, chunk_rows, on_progress=on_progress)
+            results["cards"] = stats["cards"]
+            results["rows"] = stats["rows"]
+            results["failed"] = stats["failed"]
+            if not stats["rows"]:
+                return results
+            
+            ensure_schema()
+            conn = get_snowflake_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute(f"""
+                CREATE OR REPLACE TEMPORARY TABLE {stage_table} (
+                    CARD_ID NUMBER, ID NUMBER, DOMO_USER_ID NUMBER, DOMO_USER_NAME VARCHAR,
+                    COLOR VARCHAR, CONTENT VARCHAR, ENTRY_DATE DATE, CREATED_DATE TIMESTAMP_NTZ,
+                    DOMO_INSTANCE VARCHAR
+                )
+            """)
+            cursor.execute(f"PUT 'file://{directory}/*.csv.gz' @%{stage_table} AUTO_COMPRESS = FALSE PARALLEL = 8")
+            cursor.execute(f"""
+                COPY INTO {stage_table}
+                FROM @%{stage_table}
+                FILE_FORMAT = (
+                    TYPE = CSV
+                    COMPRESSION = GZIP
+                    FIELD_OPTIONALLY_ENCLOSED_BY = '"'
+                    ESCAPE_UNENCLOSED_FIELD = NONE
+                    NULL_IF = ('\\\\N')
+                )
+                PURGE = TRUE
+            """)
+            
+            # One statement applies the whole history; the latest copy of an ID wins
+            cursor.execute(f"""
+                MERGE INTO {SNOWFLAKE_TABLE} t
+                USING (
+                    SELECT * FROM {stage_table}
+                    QUALIFY ROW_NUMBER() OVER (PARTITION BY DOMO_INSTANCE, ID ORDER BY CREATED_DATE DESC) = 1
+                ) s
+                ON t.ID = s.ID AND COALESCE(t.DOMO_INSTANCE, %s) = s.DOMO_INSTANCE
+                WHEN MATCHED AND (
+                    t.CONTENT IS DISTINCT FROM s.CONTENT
+                    OR t.COLOR IS DISTINCT FROM s.COLOR
+                    OR t.ENTRY_DATE IS DISTINCT FROM s.ENTRY_DATE
+                    OR t.CREATED_DATE IS NULL
+                ) THEN UPDATE SET
+                    CONTENT = s.CONTENT, COLOR = s.COLOR, ENTRY_DATE = s.ENTRY_DATE,
+                    DOMO_USER_ID = s.DOMO_USER_ID, DOMO_USER_NAME = s.DOMO_USER_NAME, CREATED_DATE = s.CREATED_DATE,
+                    DOMO_INSTANCE = s.DOMO_INSTANCE, UPDATED_AT = CURRENT_TIMESTAMP()
+                WHEN NOT MATCHED THEN INSERT
+                    ({", ".join(BACKFILL_COLUMNS)}, UPDATED_AT, ROW_KEY)
+                    VALUES ({", ".join("s." + column for column in BACKFILL_COLUMNS)}, CURRENT_TIMESTAMP(), UUID_STRING())
+            """, (DOMO_INSTANCE,))
+            merged = cursor.fetchone()
+            if merged:
+                results["inserted"] = merged[0]
+                results["updated"] = merged[1] if len(merged) > 1 else 0
+            
+            conn.commit()
+            cursor.close()
+            conn.close()
+            return results
+        except Exception as e:
+            st.error(f"Backfill error: {str(e)}")
+            results["failed"] += 1
+            return results
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+    
+    
+    # ==========================
+    # PROFILING
+    # ==========================
+    def rerun_profiler() -> Optional[RerunProfiler]:
+        """This session's profiler, or None when profiling mode is off."""
+        if not PROFILING_ENABLED:
+            return None
+        if "rerun_profiler" not in st.session_state:
+            st.session_state.rerun_profiler = RerunProfiler(deep=PROFILING_DEEP)
+        return st.session_state.rerun_profiler
+    
+    
+    def profile_section(name: str, profiler: Optional[RerunProfiler] = None):
+        """
+        Time a block in profiling mode (a no-op otherwise). Pass `profiler` when the
+        block runs outside the script thread, e.g. a deferred download.
+        """
+        profiler = profiler or rerun_profiler()
+        return profiler.section(name) if profiler else contextlib.nullcontext()
+    
+    
+    def profiled(name: str):
+        """Decorator timing a panel, so its fragment reruns are recorded too."""
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with profile_section(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+    
+    
+    def profiling_panel() -> None:
+        """Close this rerun's timings and show them with the recent reruns and hot functions."""
+        profiler = rerun_profiler()
+        record = profiler.end()
+        with st.expander("⏱ Profiling", expanded=False):
+            if record:
+                st.markdown(
+                    f"<div class='tiny'>This rerun: {record['seconds'] * 1000:,.0f} ms. "
+                    f"Fragment reruns appear under Recent reruns on the next full rerun.</div>",
+                    unsafe_allow_html=True,
+                )
+                st.dataframe(
+                    pd.DataFrame([
+                        {
+                            "Section": "  " * entry["depth"] + entry["section"],
+                            "ms": round((entry["seconds"] or 0) * 1000, 1),
+                            "% of rerun": round(100 * (entry["seconds"] or 0) / max(record["seconds"], 1e-9), 1),
+                        }
+                        for entry in record["sections"]
+                    ]),
+                    use_container_width=True,
+                    hide_index=True,
+                )
+            
+            st.markdown("<div class='tiny'>Recent reruns</div>", unsafe_allow_html=True)
+            st.dataframe(
+                pd.DataFrame([
+                    {
+                        "Rerun": past["scope"],
+                        "ms": round(past["seconds"] * 1000, 1),
+                        "Slowest section": max(past["sections"], key=lambda e: e["seconds"] or 0)["section"] if past["sections"] else "—",
+                    }
+                    for past in reversed(profiler.history)
+                ]),
+                use_container_width=True,
+                hide_index=True,
+            )
+            
+            # Per-endpoint Domo latencies this process has seen; p95 drives read hedging
+            domo_latencies = [
+                {"Instance": instance, **row}
+                for instance in DOMO_INSTANCES
+                for row in domo_pool(instance)["latency"].summary()
+            ]
+            if domo_latencies:
+                st.markdown(
+                    f"<div class='tiny'>Domo latency (reads slower than p{DOMO_HEDGE_PERCENTILE:g} are hedged)</div>",
+                    unsafe_allow_html=True,
+                )
+                st.dataframe(pd.DataFrame(domo_latencies), use_container_width=True, hide_index=True)
+            
+            if profiler.deep:
+                if record and not record["cprofile"]:
+                    st.markdown(
+                        "<div class='tiny'>cProfile was busy in another session, so this rerun was only timed.</div>",
+                        unsafe_allow_html=True,
+                    )
+                st.markdown("<div class='tiny'>Hot functions (last profiled rerun, cumulative)</div>", unsafe_allow_html=True)
+                st.dataframe(profiler.hot_functions(), use_container_width=True, hide_index=True)
+                st.download_button(
+                    label="🡻 Download profile",
+                    data=profiler.profile_bytes,
+                    on_click="ignore",
+                    file_name=f"annotations_{datetime.now().strftime('%Y%m%d_%H%M%S')}.prof",
+                    mime="application/octet-stream",
+                    type="secondary"
+                )
+            else:
+                st.markdown(
+                    "<div class='tiny'>Set app_auth.profiling = \"full\" for hot functions and a downloadable cProfile file.</div>",
+                    unsafe_allow_html=True,
+                )
+    
+    
     # ==========================
     # SESSION STATE INIT
     # ==========================
+    if PROFILING_ENABLED:
+        rerun_profiler().begin("Page")
     if "card_ids" not in st.session_state:
         st.session_state.card_ids = []
+    evict_stale_views()
+    if AUTO_SYNC_ENABLED:
+        auto_sync_scheduler()
     
     
     # ==========================
@@ -856,15 +4064,24 @@ def main():
         unsafe_allow_html=True,
     )
     
-    st.write("")
+    # Instances whose circuit breaker is open fail fast - say so instead of a wall of errors
+    for instance in DOMO_INSTANCES:
+        retry_in = domo_pool(instance)["breaker"].retry_in()
+        if retry_in is not None:
+            st.warning(
+                f"Domo instance {instance} is failing. Its calls fail immediately for the next "
+                f"{retry_in:.0f}s, then one is retried. Snowflake-only actions still work."
+            )
     
-    # Two column layout for Add and Delete
-    col_add, col_delete = st.columns(2, gap="medium")
+    st.write("")
     
     # ==========================
     # ADD ANNOTATION
     # ==========================
-    with col_add:
+    @st.fragment
+    @profiled("Add")
+    def add_annotation_panel():
+        """Add form; reruns on its own while the user fills it in."""
         with st.container(border=True):
             st.markdown("""<div class='label'>Add Annotation 
                 <span class="info-tooltip">ⓘ
@@ -900,9 +4117,14 @@ def main():
             # Card IDs section
             st.markdown("<div class='tiny'>Card IDs (optional)</div>", unsafe_allow_html=True)
             
-            # Get preset cards with names
-            preset_cards = get_preset_cards()
-            preset_options = [f"{name} ({cid})" for cid, name in preset_cards.items()]
+            # Search the card catalog (preset cards while the search is empty)
+            add_card_search = st.text_input(
+                "Search cards",
+                placeholder="🔍 Search cards by title, page, dataset or ID...",
+                label_visibility="collapsed",
+                key="add_card_search"
+            )
+            preset_options = card_picker_options(add_card_search)
             
             # Initialize session state
             if "card_ids" not in st.session_state:
@@ -915,7 +4137,7 @@ def main():
                     "Card",
                     options=preset_options,
                     index=None,
-                    placeholder="Select preset or type card ID...",
+                    placeholder="Select a card or type its ID (instance:ID for other instances)...",
                     label_visibility="collapsed",
                     accept_new_options=True,
                     key="add_card_input"
@@ -923,15 +4145,12 @@ def main():
             with col_btn:
                 if st.button("+ Add", type="secondary", use_container_width=True, key="add_card_btn"):
                     if card_input:
-                        # Extract ID if it's a preset format "Name (ID)", otherwise use as-is
-                        if "(" in str(card_input) and ")" in str(card_input):
-                            card_to_add = str(card_input).split("(")[-1].rstrip(")")
-                        else:
-                            card_to_add = str(card_input).strip()
-                        
-                        if card_to_add and card_to_add not in st.session_state.card_ids:
+                        card_to_add = card_ref_from_input(card_input)
+                        if card_to_add is None:
+                            st.error(f"Unknown card or Domo instance: {card_input}")
+                        elif card_to_add not in st.session_state.card_ids:
                             st.session_state.card_ids.append(card_to_add)
-                            st.rerun()
+                            rerun_panel()
             
             # Display selected card IDs using multiselect (allows removal by clicking X)
             if st.session_state.card_ids:
@@ -945,7 +4164,7 @@ def main():
                 # Update session state if user removed any
                 if set(selected) != set(st.session_state.card_ids):
                     st.session_state.card_ids = selected
-                    st.rerun()
+                    rerun_panel()
             
             st.write("")
             
@@ -964,34 +4183,40 @@ def main():
                         "date": annotation_date,
                         "color": color_name
                     }
-                    st.rerun()
+                    rerun_panel()
                 else:
                     with st.spinner("Adding annotation..."):
                         entry_date_str = annotation_date.strftime("%Y-%m-%d")
                         color_hex = ANNOTATION_COLORS[color_name]
                         
-                        # Add to Domo cards + Snowflake
+                        # Add to every Domo card at once, then to Snowflake
                         success_cards = []
-                        for cid in st.session_state.card_ids:
-                            domo_ann = add_annotation_to_domo(cid, annotation_text, entry_date_str, color_hex)
+                        created = add_annotation_to_cards(st.session_state.card_ids, annotation_text, entry_date_str, color_hex)
+                        for cid, domo_ann in created.items():
                             if domo_ann:
                                 # Insert to Snowflake with card ID and annotation ID
+                                instance, plain_id = parse_card_ref(cid)
                                 sf_success = insert_annotation_to_snowflake(
                                     content=annotation_text,
                                     entry_date=entry_date_str,
                                     color=color_hex,
-                                    card_id=int(cid),
+                                    card_id=int(plain_id),
                                     annotation_id=domo_ann.get("id"),
                                     user_id=domo_ann.get("userId"),
-                                    user_name=domo_ann.get("userName")
+                                    user_name=domo_ann.get("userName"),
+                                    instance=instance
                                 )
                                 if sf_success:
+                                    record_domo_mappings(
+                                        cid,
+                                        [(annotation_row_key({"ID": domo_ann.get("id"), "DOMO_INSTANCE": instance}), domo_ann.get("id"))]
+                                    )
                                     success_cards.append(cid)
                         
                         if success_cards:
                             st.success(f"Annotation added to cards: {', '.join(success_cards)}")
                             st.session_state.card_ids = []
-                            st.rerun()
+                            refresh_annotation_panels()
             
             # Warning dialog when no card is selected
             if st.session_state.show_no_card_warning:
@@ -1013,17 +4238,21 @@ def main():
                                 st.session_state.show_no_card_warning = False
                                 st.session_state.pop("pending_annotation", None)
                                 st.success("Global annotation added to Snowflake!")
-                                st.rerun()
+                                refresh_annotation_panels()
                 with col_cancel:
                     if st.button("✗ Cancel", type="secondary", use_container_width=True, key="cancel_no_card"):
                         st.session_state.show_no_card_warning = False
                         st.session_state.pop("pending_annotation", None)
-                        st.rerun()
+                        rerun_panel()
+    
     
     # ==========================
     # DELETE ANNOTATION
     # ==========================
-    with col_delete:
+    @st.fragment
+    @profiled("Delete")
+    def delete_annotation_panel():
+        """Delete picker over a store view or search results."""
         with st.container(border=True):
             st.markdown("""<div class='label'>Delete Annotation 
                 <span class="info-tooltip">ⓘ
@@ -1034,499 +4263,1070 @@ def main():
                 "<div class='desc'>Filter by date range and select annotation to delete.</div>",
                 unsafe_allow_html=True,
             )
-            
-            # Date range filter
-            col_start, col_end = st.columns(2)
-            with col_start:
+            
+            # Date range filter
+            col_start, col_end = st.columns(2)
+            with col_start:
+                st.markdown("<div class='tiny'>From Date</div>", unsafe_allow_html=True)
+                start_date = st.date_input("Start", value=date.today() - timedelta(days=30), label_visibility="collapsed", key="del_start")
+            with col_end:
+                st.markdown("<div class='tiny'>To Date</div>", unsafe_allow_html=True)
+                end_date = st.date_input("End", value=date.today(), label_visibility="collapsed", key="del_end")
+            
+            # Load annotations button
+            delete_query = st.text_input(
+                "Search", placeholder="🔍 Search annotation text...", label_visibility="collapsed", key="del_search"
+            )
+            
+            if st.button("Load Annotations", type="secondary", use_container_width=True):
+                st.session_state.delete_annotations_view = {
+                    "start_date": start_date.strftime("%Y-%m-%d"),
+                    "end_date": end_date.strftime("%Y-%m-%d"),
+                    "touched": time.time(),
+                }
+            
+            # Show annotations dropdown
+            if delete_query.strip():
+                with profile_section("Search"):
+                    delete_view = search_annotations(delete_query)
+            else:
+                with profile_section("Snowflake load"):
+                    delete_view = get_annotation_view("delete_annotations_view")
+            if delete_view is not None and not delete_view.empty:
+                annotations = frame_records(delete_view)
+                
+                annotation_options = {}
+                sorted_annotations = sorted(annotations, key=lambda x: str(x.get("ENTRY_DATE", "")), reverse=True)
+                for ann in sorted_annotations:
+                    content_preview = str(ann['CONTENT'])[:30] + ('...' if len(str(ann['CONTENT'])) > 30 else '')
+                    date_str = str(ann.get('ENTRY_DATE', 'N/A'))
+                    card_str = f"Card {row_card_ref(ann)}" if ann.get('CARD_ID') else "Global"
+                    label = f"{content_preview} • {date_str} • {card_str}"
+                    annotation_options[label] = ann
+                
+                selected_label = st.selectbox(
+                    "Select annotation",
+                    options=list(annotation_options.keys()),
+                    label_visibility="collapsed"
+                )
+                
+                st.write("")
+                
+                if st.button("Delete Selected", type="secondary", use_container_width=True):
+                    selected_ann = annotation_options[selected_label]
+                    with st.spinner("Deleting..."):
+                        # Delete from Snowflake by its row key (ID / content for rows written without one)
+                        sf_success = delete_annotation_from_snowflake(
+                            annotation_id=selected_ann.get("ID"),
+                            card_id=selected_ann.get("CARD_ID"),
+                            content=selected_ann["CONTENT"],
+                            entry_date=selected_ann.get("ENTRY_DATE"),
+                            instance=selected_ann.get("DOMO_INSTANCE"),
+                            row_key=selected_ann.get("ROW_KEY")
+                        )
+                        
+                        # If has card ID, also delete from Domo
+                        if selected_ann.get("ID") and selected_ann.get("CARD_ID") and sf_success:
+                            card_ref = row_card_ref(selected_ann)
+                            if delete_annotation_from_domo(card_ref, selected_ann["ID"]):
+                                delete_domo_mappings(card_ref, selected_ann["ID"])
+                        
+                        if sf_success:
+                            st.success("Annotation deleted!")
+                            # Refresh the list
+                            refresh_annotation_panels()
+            elif delete_view is not None:
+                empty_message = "No matching annotations" if delete_query.strip() else "No annotations in this date range"
+                st.markdown(f"""
+                    <div class="empty-state">
+                        <div class="empty-state-icon">📝</div>
+                        <p>{empty_message}</p>
+                    </div>
+                """, unsafe_allow_html=True)
+    
+    
+    # Two column layout for Add and Delete
+    col_add, col_delete = st.columns(2, gap="medium")
+    with col_add:
+        add_annotation_panel()
+    with col_delete:
+        delete_annotation_panel()
+    
+    st.write("")
+    
+    # ==========================
+    # BULK IMPORT SECTION
+    # ==========================
+    @st.fragment
+    @profiled("Import")
+    def import_panel():
+        """Upload a CSV or Excel file of annotations, check every row, then import the valid ones."""
+        with st.container(border=True):
+            st.markdown("""<div class='label'>Bulk Import 
+                <span class="info-tooltip">ⓘ
+                    <span class="tooltiptext">ייבוא הערות רבות בבת אחת מקובץ CSV או Excel. עמודות: Content, Date, Color, Card IDs. אפשר כמה קארדים בשורה, מופרדים בפסיק. שורה בלי קארד תישמר רק בסנואופלייק.</span>
+                </span>
+            </div>""", unsafe_allow_html=True)
+            st.markdown(
+                "<div class='desc'>Import annotations from a CSV or Excel file. Rows are checked before anything is written.</div>",
+                unsafe_allow_html=True,
+            )
+            
+            st.download_button(
+                label="🡻 Template",
+                data="Content,Date,Color,Card IDs\nCampaign launch,2024-01-01,Blue,954563232\n".encode("utf-8-sig"),
+                file_name="annotations_import_template.csv",
+                mime="text/csv",
+                type="secondary",
+                key="import_template"
+            )
+            uploaded = st.file_uploader(
+                "Annotations file",
+                type=["csv", "xlsx"],
+                label_visibility="collapsed",
+                key="import_file"
+            )
+            if uploaded is None:
+                return
+            
+            try:
+                with profile_section("Import validation"):
+                    valid_rows, errors = validate_import(uploaded)
+            except Exception as e:
+                st.error(f"Could not read {uploaded.name}: {str(e)}")
+                return
+            
+            st.markdown(
+                f"<div class='tiny'>{len(valid_rows)} rows ready, {len(errors)} with errors</div>",
+                unsafe_allow_html=True,
+            )
+            if errors:
+                st.dataframe(pd.DataFrame(errors), use_container_width=True, hide_index=True)
+            
+            # An upload stays on the widget after importing - don't import it twice
+            imported_files = st.session_state.setdefault("imported_files", set())
+            already_imported = uploaded.file_id in imported_files
+            if already_imported:
+                st.info("This file was already imported. Upload another file to import more.")
+            
+            if st.button(
+                f"Import {len(valid_rows)} rows",
+                type="primary",
+                use_container_width=True,
+                disabled=already_imported or not valid_rows,
+                key="import_btn"
+            ):
+                with st.spinner(f"Importing {len(valid_rows)} rows..."):
+                    results = import_annotations(valid_rows)
+                # Only a fully written file is final - otherwise importing it again fills the gaps
+                if results["saved"] and not results["errors"]:
+                    imported_files.add(uploaded.file_id)
+                # Shown after the app-wide refresh below
+                st.session_state.import_results = results
+                if results["imported"]:
+                    refresh_annotation_panels()
+            
+            results = st.session_state.pop("import_results", None)
+            if results:
+                if results["errors"]:
+                    st.warning(f"{len(results['errors'])} card writes failed:")
+                    st.dataframe(pd.DataFrame(results["errors"]), use_container_width=True, hide_index=True)
+                if results["skipped"]:
+                    st.info(f"Skipped {results['skipped']} annotations that were already there")
+                if results["imported"]:
+                    st.success(f"Imported {results['imported']} annotations")
+    
+    import_panel()
+    
+    st.write("")
+    
+    # ==========================
+    # SYNC SECTION
+    # ==========================
+    @st.fragment
+    @profiled("Sync")
+    def sync_panel():
+        """Domo → Snowflake sync for selected cards, org-wide sync and backfill."""
+        with st.container(border=True):
+            st.markdown("""<div class='label'>Sync Card 
+                <span class="info-tooltip">ⓘ
+                    <span class="tooltiptext">סנכרון מדומו לסנואופלייק. הוסיפו מזהי קארדים, בחרו טווח תאריכים ולחצו Sync. הערות חדשות יתווספו, הערות שהשתנו יעודכנו. לא מתבצעת מחיקה.</span>
+                </span>
+            </div>""", unsafe_allow_html=True)
+            st.markdown(
+                "<div class='desc'>Sync annotations from Domo to Snowflake for specific cards.</div>",
+                unsafe_allow_html=True,
+            )
+        
+            # Card IDs section
+            st.markdown("<div class='tiny'>Card IDs</div>", unsafe_allow_html=True)
+        
+            # Search the card catalog (preset cards while the search is empty)
+            sync_card_search = st.text_input(
+                "Search cards",
+                placeholder="🔍 Search cards by title, page, dataset or ID...",
+                label_visibility="collapsed",
+                key="sync_card_search"
+            )
+            preset_options_sync = card_picker_options(sync_card_search)
+        
+            # Initialize session state
+            if "sync_card_ids" not in st.session_state:
+                st.session_state.sync_card_ids = []
+        
+            col_sync_input, col_sync_btn = st.columns([3, 1])
+            with col_sync_input:
+                sync_card_input = st.selectbox(
+                    "Card",
+                    options=preset_options_sync,
+                    index=None,
+                    placeholder="Select a card or type its ID...",
+                    label_visibility="collapsed",
+                    accept_new_options=True,
+                    key="sync_card_input"
+                )
+            with col_sync_btn:
+                if st.button("+ Add", type="secondary", use_container_width=True, key="sync_add_btn"):
+                    if sync_card_input:
+                        card_to_add = card_ref_from_input(sync_card_input)
+                        if card_to_add is None:
+                            st.error(f"Unknown card or Domo instance: {sync_card_input}")
+                        elif card_to_add not in st.session_state.sync_card_ids:
+                            st.session_state.sync_card_ids.append(card_to_add)
+                            rerun_panel()
+        
+            # Display selected card IDs
+            if st.session_state.sync_card_ids:
+                selected_sync = st.multiselect(
+                    "Selected cards",
+                    options=st.session_state.sync_card_ids,
+                    default=st.session_state.sync_card_ids,
+                    label_visibility="collapsed",
+                    key="sync_card_ids_display"
+                )
+                if set(selected_sync) != set(st.session_state.sync_card_ids):
+                    st.session_state.sync_card_ids = selected_sync
+                    rerun_panel()
+        
+            # Date range for sync
+            col_sync_start, col_sync_end, col_sync_action = st.columns([2, 2, 1])
+            with col_sync_start:
                 st.markdown("<div class='tiny'>From Date</div>", unsafe_allow_html=True)
-                start_date = st.date_input("Start", value=date.today() - timedelta(days=30), label_visibility="collapsed", key="del_start")
-            with col_end:
+                sync_start_date = st.date_input("Sync From", value=date.today() - timedelta(days=1), label_visibility="collapsed", key="sync_start")
+            with col_sync_end:
                 st.markdown("<div class='tiny'>To Date</div>", unsafe_allow_html=True)
-                end_date = st.date_input("End", value=date.today(), label_visibility="collapsed", key="del_end")
-            
-            # Load annotations button
-            if st.button("Load Annotations", type="secondary", use_container_width=True):
-                st.session_state.delete_annotations = get_snowflake_annotations(
-                    start_date=start_date.strftime("%Y-%m-%d"),
-                    end_date=end_date.strftime("%Y-%m-%d")
-                )
+                sync_end_date = st.date_input("Sync To", value=date.today(), label_visibility="collapsed", key="sync_end")
+            with col_sync_action:
+                st.markdown("<div class='tiny'>&nbsp;</div>", unsafe_allow_html=True)
+                if st.button("⇄ Sync", type="primary", use_container_width=True, disabled=st.session_state.get("sync_in_progress", False)):
+                    if st.session_state.sync_card_ids:
+                        st.session_state.sync_in_progress = True
+                        st.session_state.sync_cancelled = False
+                        st.session_state.sync_results = resume_card_job(
+                            card_job_id(
+                                "sync", st.session_state.sync_card_ids,
+                                sync_start_date.strftime("%Y-%m-%d"), sync_end_date.strftime("%Y-%m-%d")
+                            ),
+                            st.session_state.sync_card_ids,
+                            {"inserted": 0, "updated": 0, "skipped": 0, "failed": 0}
+                        )
+                        rerun_panel()
+                    else:
+                        st.error("Please add at least one card ID")
+        
+            # Initialize sync state
+            if "sync_in_progress" not in st.session_state:
+                st.session_state.sync_in_progress = False
+            if "sync_cancelled" not in st.session_state:
+                st.session_state.sync_cancelled = False
+        
+            # Sync in progress UI
+            if st.session_state.sync_in_progress:
+                total_cards = len(st.session_state.sync_card_ids)
+                processed = st.session_state.sync_results.get("processed", 0)
             
-            # Show annotations dropdown
-            if "delete_annotations" in st.session_state and st.session_state.delete_annotations:
-                annotations = st.session_state.delete_annotations
+                # Check if completed
+                if processed >= total_cards:
+                    # Completed - show success and reset
+                    st.session_state.sync_in_progress = False
+                    r = st.session_state.sync_results
+                    st.success(f"Sync complete! Inserted: {r['inserted']}, Updated: {r['updated']}, Skipped: {r['skipped']}")
+                    if r["resumed"] > 0:
+                        st.info(f"Resumed an earlier run: {r['resumed']} cards were already synced")
+                    if r["failed"] > 0:
+                        st.warning(f"Failed to sync {r['failed']} cards - sync again to retry only those")
+                    else:
+                        clear_job_checkpoints(r["job_id"])
+                    st.session_state.sync_results = {"inserted": 0, "updated": 0, "skipped": 0, "failed": 0, "processed": 0}
+                else:
+                    # Still processing - show progress
+                    sync_progress = st.progress(processed / total_cards, text=f"Syncing card {processed + 1} of {total_cards}...")
                 
-                annotation_options = {}
-                sorted_annotations = sorted(annotations, key=lambda x: str(x.get("ENTRY_DATE", "")), reverse=True)
-                for ann in sorted_annotations:
-                    content_preview = str(ann['CONTENT'])[:30] + ('...' if len(str(ann['CONTENT'])) > 30 else '')
-                    date_str = str(ann.get('ENTRY_DATE', 'N/A'))
-                    card_str = f"Card {ann['CARD_ID']}" if ann.get('CARD_ID') else "Global"
-                    label = f"{content_preview} • {date_str} • {card_str}"
-                    annotation_options[label] = ann
+                    if st.button("✗ Cancel Sync", type="secondary", use_container_width=True, key="cancel_sync_progress"):
+                        st.session_state.sync_cancelled = True
+                        st.session_state.sync_in_progress = False
+                        # A cancelled job is not resumed: the next run starts over
+                        clear_job_checkpoints(st.session_state.sync_results["job_id"])
+                        st.warning(f"Sync cancelled. Processed {processed} of {total_cards} cards.")
+                        rerun_panel()
                 
-                selected_label = st.selectbox(
-                    "Select annotation",
-                    options=list(annotation_options.keys()),
-                    label_visibility="collapsed"
+                    # Process the remaining cards through the sync pipeline
+                    if not st.session_state.sync_cancelled:
+                        job_id = st.session_state.sync_results["job_id"]
+                        
+                        def on_sync_card_done(card_id: str, results: Dict[str, int]):
+                            if results.get("error"):
+                                st.error(f"Sync error on card {card_id}: {results['error']}")
+                            if not results["failed"]:
+                                record_card_checkpoint(job_id, 0, card_id, results)
+                            st.session_state.sync_results["done"].append(card_id)
+                            st.session_state.sync_results["inserted"] += results["inserted"]
+                            st.session_state.sync_results["updated"] += results["updated"]
+                            st.session_state.sync_results["skipped"] += results["skipped"]
+                            st.session_state.sync_results["failed"] += results["failed"]
+                            st.session_state.sync_results["processed"] += 1
+                            done = st.session_state.sync_results["processed"]
+                            sync_progress.progress(done / total_cards, text=f"Synced {done} of {total_cards} cards...")
+                    
+                        done_cards = set(st.session_state.sync_results["done"])
+                        sync_cards_pipelined(
+                            [card_id for card_id in st.session_state.sync_card_ids if card_id not in done_cards],
+                            start_date=sync_start_date.strftime("%Y-%m-%d"),
+                            end_date=sync_end_date.strftime("%Y-%m-%d"),
+                            on_card_done=on_sync_card_done
+                        )
+                        refresh_annotation_panels()
+        
+            # Org-wide sync across worker threads
+            with st.expander("Org-wide sync"):
+                st.markdown(
+                    "<div class='tiny'>Find every KPI card with annotations and sync it for the date range above. "
+                    f"Rerunning the same range within {CHECKPOINT_TTL_HOURS} hours resumes an interrupted run.</div>",
+                    unsafe_allow_html=True,
                 )
+                col_workers, col_org_action = st.columns([2, 1])
+                with col_workers:
+                    sync_workers = st.number_input(
+                        "Workers", min_value=1, max_value=32, value=4, step=1, key="sync_workers"
+                    )
+                with col_org_action:
+                    st.markdown("<div class='tiny'>&nbsp;</div>", unsafe_allow_html=True)
+                    run_org_sync = st.button(
+                        "⇄ Sync all", type="secondary", use_container_width=True, key="org_sync_btn",
+                        disabled=st.session_state.get("sync_in_progress", False)
+                    )
+                if run_org_sync:
+                    org_progress = st.progress(0.0, text="Discovering annotated cards...")
+                    r = sync_all_cards(
+                        sync_start_date.strftime("%Y-%m-%d"),
+                        sync_end_date.strftime("%Y-%m-%d"),
+                        workers=int(sync_workers),
+                        on_progress=lambda done, total: org_progress.progress(
+                            done / total, text=f"Synced {done} of {total} cards..."
+                        )
+                    )
+                    org_progress.empty()
+                    # Shown after the app-wide refresh below
+                    st.session_state.org_sync_results = r
+                    refresh_annotation_panels()
                 
-                st.write("")
+                r = st.session_state.pop("org_sync_results", None)
+                if r:
+                    st.success(
+                        f"Org-wide sync of {r['cards']} cards complete! "
+                        f"Inserted: {r['inserted']}, Updated: {r['updated']}, Skipped: {r['skipped']}"
+                    )
+                    if r["failed"] > 0:
+                        st.warning(f"Failed to sync {r['failed']} cards - run again to retry them")
+                    if r["failed_shards"] > 0:
+                        st.error(f"{r['failed_shards']} of the sync workers stopped early")
+                    if r["errors"]:
+                        # Long runs can fail on many cards; the first few usually share a cause
+                        more = len(r["errors"]) - 20
+                        st.error("Sync errors:\n\n" + "\n\n".join(r["errors"][:20]) + (f"\n\n...and {more} more" if more > 0 else ""))
+        
+            # Full-history backfill via staged bulk load
+            with st.expander("Backfill full history"):
+                st.markdown(
+                    "<div class='tiny'>Load every annotation of the selected cards (or every annotated card) "
+                    "with a bulk load and a single merge. Ignores the date range. Use for a first load or a rebuild.</div>",
+                    unsafe_allow_html=True,
+                )
+                col_scope, col_backfill_action = st.columns([2, 1])
+                with col_scope:
+                    backfill_scope = st.radio(
+                        "Cards", ["Selected cards", "All annotated cards"], horizontal=True, key="backfill_scope"
+                    )
+                with col_backfill_action:
+                    run_backfill = st.button(
+                        "⇊ Backfill", type="secondary", use_container_width=True, key="backfill_btn",
+                        disabled=st.session_state.get("sync_in_progress", False)
+                    )
+                if run_backfill:
+                    if backfill_scope == "Selected cards" and not st.session_state.sync_card_ids:
+                        st.error("Please add at least one card ID")
+                    else:
+                        backfill_progress = st.progress(0.0, text="Preparing backfill...")
+                        with st.spinner("Backfilling..."):
+                            backfill_cards = (
+                                st.session_state.sync_card_ids if backfill_scope == "Selected cards"
+                                else discover_annotated_cards()
+                            )
+                            r = backfill_annotations(
+                                backfill_cards,
+                                on_progress=lambda done, total: backfill_progress.progress(
+                                    done / total, text=f"Exported {done} of {total} cards..."
+                                )
+                            )
+                        backfill_progress.empty()
+                        st.session_state.backfill_results = r
+                        refresh_annotation_panels()
                 
-                if st.button("Delete Selected", type="secondary", use_container_width=True):
-                    selected_ann = annotation_options[selected_label]
-                    with st.spinner("Deleting..."):
-                        # Delete from Snowflake
-                        if selected_ann.get("ID"):
-                            sf_success = delete_annotation_from_snowflake(annotation_id=selected_ann["ID"])
-                            
-                            # If has card ID, also delete from Domo
-                            if selected_ann.get("CARD_ID") and sf_success:
-                                delete_annotation_from_domo(str(selected_ann["CARD_ID"]), selected_ann["ID"])
+                r = st.session_state.pop("backfill_results", None)
+                if r:
+                    st.success(
+                        f"Backfill of {r['cards']} cards complete! "
+                        f"Rows loaded: {r['rows']}, Inserted: {r['inserted']}, Updated: {r['updated']}"
+                    )
+                    if r["failed"] > 0:
+                        st.warning(f"{r['failed']} cards or steps failed")
+            
+            # Background auto-sync with adaptive per-card polling
+            with st.expander("Auto-sync"):
+                st.markdown(
+                    "<div class='tiny'>Registered cards are synced in the background. Cards that change often "
+                    "are polled every few minutes, quiet ones down to once a day.</div>",
+                    unsafe_allow_html=True,
+                )
+                if not AUTO_SYNC_ENABLED:
+                    st.info("Auto-sync is turned off on this instance (domo.auto_sync). Registrations are kept for when it runs.")
+                
+                col_register, col_unregister = st.columns(2)
+                with col_register:
+                    if st.button("+ Register selected cards", type="secondary", use_container_width=True, key="auto_sync_register"):
+                        if st.session_state.sync_card_ids:
+                            set_auto_sync_cards(st.session_state.sync_card_ids, registered=True)
                         else:
-                            # Global annotation - delete by content and date
-                            sf_success = delete_annotation_from_snowflake(
-                                content=selected_ann["CONTENT"],
-                                entry_date=str(selected_ann["ENTRY_DATE"])
-                            )
-                        
-                        if sf_success:
-                            st.success("Annotation deleted!")
-                            # Refresh the list
-                            st.session_state.delete_annotations = get_snowflake_annotations(
-                                start_date=start_date.strftime("%Y-%m-%d"),
-                                end_date=end_date.strftime("%Y-%m-%d")
+                            st.error("Please add at least one card ID")
+                with col_unregister:
+                    if st.button("✗ Unregister selected cards", type="secondary", use_container_width=True, key="auto_sync_unregister"):
+                        if st.session_state.sync_card_ids:
+                            set_auto_sync_cards(st.session_state.sync_card_ids, registered=False)
+                        else:
+                            st.error("Please add at least one card ID")
+                
+                if AUTO_SYNC_ENABLED:
+                    schedule = auto_sync_scheduler().status()
+                    if schedule:
+                        now = time.time()
+                        failing = [entry for entry in schedule if entry["last_error"]]
+                        if failing:
+                            st.warning(
+                                f"The last poll failed for {len(failing)} cards, e.g. card "
+                                f"{failing[0]['card_id']}: {failing[0]['last_error']}"
                             )
-                            st.rerun()
-            elif "delete_annotations" in st.session_state:
-                st.markdown("""
-                    <div class="empty-state">
-                        <div class="empty-state-icon">📝</div>
-                        <p>No annotations in this date range</p>
-                    </div>
-                """, unsafe_allow_html=True)
+                        st.dataframe(
+                            pd.DataFrame([
+                                {
+                                    "Card ID": entry["card_id"],
+                                    "Lag": format_duration(entry["lag"]),
+                                    "Poll every": format_duration(entry["interval"]),
+                                    "Next poll": format_duration(entry["next_run_in"]),
+                                    "Last change": format_duration(now - entry["last_change"]) + " ago" if entry["last_change"] else "—",
+                                    "Polls": entry["polls"],
+                                    "Error": entry["last_error"] or "",
+                                }
+                                for entry in schedule
+                            ]),
+                            use_container_width=True,
+                            hide_index=True,
+                        )
+                    else:
+                        st.markdown("<div class='tiny'>No cards registered yet.</div>", unsafe_allow_html=True)
+    
+    sync_panel()
     
     st.write("")
     
     # ==========================
-    # SYNC SECTION
+    # PUSH TO DOMO SECTION
     # ==========================
-    with st.container(border=True):
-        st.markdown("""<div class='label'>Sync Card 
-            <span class="info-tooltip">ⓘ
-                <span class="tooltiptext">סנכרון מדומו לסנואופלייק. הוסיפו מזהי קארדים, בחרו טווח תאריכים ולחצו Sync. הערות חדשות יתווספו, הערות שהשתנו יעודכנו. לא מתבצעת מחיקה.</span>
-            </span>
-        </div>""", unsafe_allow_html=True)
-        st.markdown(
-            "<div class='desc'>Sync annotations from Domo to Snowflake for specific cards.</div>",
-            unsafe_allow_html=True,
-        )
-        
-        # Card IDs section
-        st.markdown("<div class='tiny'>Card IDs</div>", unsafe_allow_html=True)
-        
-        # Get preset cards with names
-        preset_cards = get_preset_cards()
-        preset_options_sync = [f"{name} ({cid})" for cid, name in preset_cards.items()]
+    @st.fragment
+    @profiled("Push")
+    def push_panel():
+        """Snowflake → Domo push, one batch of cards per panel rerun."""
+        with st.container(border=True):
+            st.markdown("""<div class='label'>Push to Domo 
+                <span class="info-tooltip">ⓘ
+                    <span class="tooltiptext">דחיפת הערות מסנואופלייק לדומו. הוסיפו מזהי קארד יעד, בחרו טווח תאריכים וצבעים (ריק = הכל), ולחצו Push. ההערות יתווספו לכל הקארדים שנבחרו.</span>
+                </span>
+            </div>""", unsafe_allow_html=True)
+            st.markdown(
+                "<div class='desc'>Insert Snowflake annotations into Domo cards.</div>",
+                unsafe_allow_html=True,
+            )
         
-        # Initialize session state
-        if "sync_card_ids" not in st.session_state:
-            st.session_state.sync_card_ids = []
+            # Card IDs section
+            st.markdown("<div class='tiny'>Target Card IDs</div>", unsafe_allow_html=True)
         
-        col_sync_input, col_sync_btn = st.columns([3, 1])
-        with col_sync_input:
-            sync_card_input = st.selectbox(
-                "Card",
-                options=preset_options_sync,
-                index=None,
-                placeholder="Select preset or type card ID...",
+            # Search the card catalog (preset cards while the search is empty)
+            push_card_search = st.text_input(
+                "Search cards",
+                placeholder="🔍 Search cards by title, page, dataset or ID...",
                 label_visibility="collapsed",
-                accept_new_options=True,
-                key="sync_card_input"
+                key="push_card_search"
             )
-        with col_sync_btn:
-            if st.button("+ Add", type="secondary", use_container_width=True, key="sync_add_btn"):
-                if sync_card_input:
-                    if "(" in str(sync_card_input) and ")" in str(sync_card_input):
-                        card_to_add = str(sync_card_input).split("(")[-1].rstrip(")")
-                    else:
-                        card_to_add = str(sync_card_input).strip()
-                    
-                    if card_to_add and card_to_add not in st.session_state.sync_card_ids:
-                        st.session_state.sync_card_ids.append(card_to_add)
-                        st.rerun()
-        
-        # Display selected card IDs
-        if st.session_state.sync_card_ids:
-            selected_sync = st.multiselect(
-                "Selected cards",
-                options=st.session_state.sync_card_ids,
-                default=st.session_state.sync_card_ids,
+            preset_options_push = card_picker_options(push_card_search)
+        
+            # Initialize session state
+            if "push_card_ids" not in st.session_state:
+                st.session_state.push_card_ids = []
+        
+            col_push_input, col_push_btn = st.columns([3, 1])
+            with col_push_input:
+                push_card_input = st.selectbox(
+                    "Card",
+                    options=preset_options_push,
+                    index=None,
+                    placeholder="Select a card or type its ID...",
+                    label_visibility="collapsed",
+                    accept_new_options=True,
+                    key="push_card_input"
+                )
+            with col_push_btn:
+                if st.button("+ Add", type="secondary", use_container_width=True, key="push_add_btn"):
+                    if push_card_input:
+                        card_to_add = card_ref_from_input(push_card_input)
+                        if card_to_add is None:
+                            st.error(f"Unknown card or Domo instance: {push_card_input}")
+                        elif card_to_add not in st.session_state.push_card_ids:
+                            st.session_state.push_card_ids.append(card_to_add)
+                            rerun_panel()
+        
+            # Display selected card IDs
+            if st.session_state.push_card_ids:
+                selected_push = st.multiselect(
+                    "Selected cards",
+                    options=st.session_state.push_card_ids,
+                    default=st.session_state.push_card_ids,
+                    label_visibility="collapsed",
+                    key="push_card_ids_display"
+                )
+                if set(selected_push) != set(st.session_state.push_card_ids):
+                    st.session_state.push_card_ids = selected_push
+                    rerun_panel()
+        
+            # Date range for push
+            col_push_start, col_push_end = st.columns(2)
+            with col_push_start:
+                st.markdown("<div class='tiny'>From Date</div>", unsafe_allow_html=True)
+                push_start_date = st.date_input("Push From", value=date.today() - timedelta(days=1), label_visibility="collapsed", key="push_start")
+            with col_push_end:
+                st.markdown("<div class='tiny'>To Date</div>", unsafe_allow_html=True)
+                push_end_date = st.date_input("Push To", value=date.today(), label_visibility="collapsed", key="push_end")
+        
+            # Color filter (multiselect)
+            st.markdown("<div class='tiny'>Colors (leave empty for all)</div>", unsafe_allow_html=True)
+            selected_colors = st.multiselect(
+                "Colors",
+                options=list(ANNOTATION_COLORS.keys()),
+                default=[],
+                format_func=lambda x: COLOR_DISPLAY.get(x, x),
                 label_visibility="collapsed",
-                key="sync_card_ids_display"
+                key="push_colors"
             )
-            if set(selected_sync) != set(st.session_state.sync_card_ids):
-                st.session_state.sync_card_ids = selected_sync
-                st.rerun()
-        
-        # Date range for sync
-        col_sync_start, col_sync_end, col_sync_action = st.columns([2, 2, 1])
-        with col_sync_start:
-            st.markdown("<div class='tiny'>From Date</div>", unsafe_allow_html=True)
-            sync_start_date = st.date_input("Sync From", value=date.today() - timedelta(days=1), label_visibility="collapsed", key="sync_start")
-        with col_sync_end:
-            st.markdown("<div class='tiny'>To Date</div>", unsafe_allow_html=True)
-            sync_end_date = st.date_input("Sync To", value=date.today(), label_visibility="collapsed", key="sync_end")
-        with col_sync_action:
-            st.markdown("<div class='tiny'>&nbsp;</div>", unsafe_allow_html=True)
-            if st.button("⇄ Sync", type="primary", use_container_width=True, disabled=st.session_state.get("sync_in_progress", False)):
-                if st.session_state.sync_card_ids:
-                    st.session_state.sync_in_progress = True
-                    st.session_state.sync_cancelled = False
-                    st.session_state.sync_results = {"inserted": 0, "updated": 0, "skipped": 0, "processed": 0}
-                    st.rerun()
+        
+            # Convert color names to hex values
+            color_hex_values = [ANNOTATION_COLORS[c] for c in selected_colors]
+        
+            if st.button("→ Push to Domo", type="primary", use_container_width=True, disabled=st.session_state.get("push_in_progress", False)):
+                if st.session_state.push_card_ids:
+                    st.session_state.push_in_progress = True
+                    st.session_state.push_cancelled = False
+                    st.session_state.push_results = resume_card_job(
+                        card_job_id(
+                            "push", st.session_state.push_card_ids,
+                            push_start_date.strftime("%Y-%m-%d"), push_end_date.strftime("%Y-%m-%d"),
+                            ",".join(sorted(color_hex_values))
+                        ),
+                        st.session_state.push_card_ids,
+                        {"pushed": 0, "skipped": 0, "failed": 0, "success_cards": []}
+                    )
+                    st.session_state.push_color_hex_values = color_hex_values
+                    rerun_panel()
                 else:
                     st.error("Please add at least one card ID")
         
-        # Initialize sync state
-        if "sync_in_progress" not in st.session_state:
-            st.session_state.sync_in_progress = False
-        if "sync_cancelled" not in st.session_state:
-            st.session_state.sync_cancelled = False
+            # Initialize push state
+            if "push_in_progress" not in st.session_state:
+                st.session_state.push_in_progress = False
+            if "push_cancelled" not in st.session_state:
+                st.session_state.push_cancelled = False
         
-        # Sync in progress UI
-        if st.session_state.sync_in_progress:
-            total_cards = len(st.session_state.sync_card_ids)
-            processed = st.session_state.sync_results.get("processed", 0)
+            # Push in progress UI
+            if st.session_state.push_in_progress:
+                total_cards = len(st.session_state.push_card_ids)
+                processed = st.session_state.push_results.get("processed", 0)
             
-            # Check if completed
-            if processed >= total_cards:
-                # Completed - show success and reset
-                st.session_state.sync_in_progress = False
-                r = st.session_state.sync_results
-                st.success(f"Sync complete! Inserted: {r['inserted']}, Updated: {r['updated']}, Skipped: {r['skipped']}")
-                st.session_state.sync_results = {"inserted": 0, "updated": 0, "skipped": 0, "processed": 0}
-            else:
-                # Still processing - show progress
-                st.progress((processed + 1) / total_cards, text=f"Syncing card {processed + 1} of {total_cards}...")
+                # Check if completed
+                if processed >= total_cards:
+                    # Completed - show success and reset
+                    st.session_state.push_in_progress = False
+                    r = st.session_state.push_results
+                    if r["pushed"] > 0:
+                        st.success(f"Pushed {r['pushed']} annotations to cards: {', '.join(r['success_cards'])}")
+                    if r["skipped"] > 0:
+                        st.info(f"Skipped {r['skipped']} annotations already on the target cards")
+                    if r["resumed"] > 0:
+                        st.info(f"Resumed an earlier run: {r['resumed']} cards were already pushed")
+                    if r["failed"] > 0:
+                        st.warning(f"Failed to push {r['failed']} annotations - push again to retry only the failed cards")
+                    else:
+                        clear_job_checkpoints(r["job_id"])
+                    if r["pushed"] == 0 and r["skipped"] == 0 and r["failed"] == 0:
+                        st.info("No annotations found matching the filters")
+                    st.session_state.push_results = {"pushed": 0, "skipped": 0, "failed": 0, "processed": 0, "success_cards": []}
+                else:
+                    # Still processing - show progress
+                    done_cards = set(st.session_state.push_results["done"])
+                    batch = [card_id for card_id in st.session_state.push_card_ids if card_id not in done_cards][:CARD_BATCH_SIZE]
+                    st.progress(
+                        (processed + len(batch)) / total_cards,
+                        text=f"Pushing to cards {processed + 1}-{processed + len(batch)} of {total_cards}..."
+                    )
                 
-                if st.button("✗ Cancel Sync", type="secondary", use_container_width=True, key="cancel_sync_progress"):
-                    st.session_state.sync_cancelled = True
-                    st.session_state.sync_in_progress = False
-                    st.warning(f"Sync cancelled. Processed {processed} of {total_cards} cards.")
-                    st.rerun()
+                    if st.button("✗ Cancel Push", type="secondary", use_container_width=True, key="cancel_push_progress"):
+                        st.session_state.push_cancelled = True
+                        st.session_state.push_in_progress = False
+                        # A cancelled job is not resumed: the next run starts over
+                        clear_job_checkpoints(st.session_state.push_results["job_id"])
+                        r = st.session_state.push_results
+                        st.warning(f"Push cancelled. Pushed {r['pushed']} annotations to {processed} of {total_cards} cards.")
+                        rerun_panel()
                 
-                # Process current card
-                if not st.session_state.sync_cancelled:
-                    card_id = st.session_state.sync_card_ids[processed]
-                    results = sync_card_annotations(
-                        card_id,
-                        start_date=sync_start_date.strftime("%Y-%m-%d"),
-                        end_date=sync_end_date.strftime("%Y-%m-%d")
-                    )
-                    st.session_state.sync_results["inserted"] += results["inserted"]
-                    st.session_state.sync_results["updated"] += results["updated"]
-                    st.session_state.sync_results["skipped"] += results["skipped"]
-                    st.session_state.sync_results["processed"] += 1
-                    st.rerun()
+                    # Process current batch: definitions are fetched concurrently across
+                    # instances, and cards are pushed in parallel on threads of this session
+                    if not st.session_state.push_cancelled:
+                        card_defs = fetch_kpi_definitions(batch)
+                        ctx = get_script_run_ctx()
+                        push_start_str = push_start_date.strftime("%Y-%m-%d")
+                        push_end_str = push_end_date.strftime("%Y-%m-%d")
+                        push_colors = st.session_state.push_color_hex_values
+                        # Every card gets the same rows - read them once for the batch
+                        push_rows = get_snowflake_annotations(start_date=push_start_str, end_date=push_end_str)
+                        
+                        def push_card(card_id: str) -> Dict[str, int]:
+                            add_script_run_ctx(threading.current_thread(), ctx)
+                            card_def = card_defs.get(card_id)
+                            return push_to_domo(
+                                card_id,
+                                start_date=push_start_str,
+                                end_date=push_end_str,
+                                colors=push_colors,
+                                card_def=card_def if isinstance(card_def, dict) else None,
+                                sf_annotations=push_rows
+                            )
+                        
+                        with ThreadPoolExecutor(max_workers=DOMO_MAX_CONCURRENCY) as pool:
+                            batch_results = list(pool.map(push_card, batch))
+                        for card_id, results in zip(batch, batch_results):
+                            # Partly pushed cards are safe to retry: the mapping index skips what landed
+                            if not results["failed"]:
+                                record_card_checkpoint(st.session_state.push_results["job_id"], 0, card_id, results)
+                            st.session_state.push_results["done"].append(card_id)
+                            st.session_state.push_results["pushed"] += results["pushed"]
+                            st.session_state.push_results["skipped"] += results["skipped"]
+                            st.session_state.push_results["failed"] += results["failed"]
+                            if results["pushed"] > 0:
+                                st.session_state.push_results["success_cards"].append(card_id)
+                            st.session_state.push_results["processed"] += 1
+                        rerun_panel()
+    
+    push_panel()
     
     st.write("")
     
     # ==========================
-    # PUSH TO DOMO SECTION
+    # REPLICATE SECTION
     # ==========================
-    with st.container(border=True):
-        st.markdown("""<div class='label'>Push to Domo 
-            <span class="info-tooltip">ⓘ
-                <span class="tooltiptext">דחיפת הערות מסנואופלייק לדומו. הוסיפו מזהי קארד יעד, בחרו טווח תאריכים וצבעים (ריק = הכל), ולחצו Push. ההערות יתווספו לכל הקארדים שנבחרו.</span>
-            </span>
-        </div>""", unsafe_allow_html=True)
-        st.markdown(
-            "<div class='desc'>Insert Snowflake annotations into Domo cards.</div>",
-            unsafe_allow_html=True,
-        )
-        
-        # Card IDs section
-        st.markdown("<div class='tiny'>Target Card IDs</div>", unsafe_allow_html=True)
-        
-        # Get preset cards with names
-        preset_cards = get_preset_cards()
-        preset_options_push = [f"{name} ({cid})" for cid, name in preset_cards.items()]
-        
-        # Initialize session state
-        if "push_card_ids" not in st.session_state:
-            st.session_state.push_card_ids = []
-        
-        col_push_input, col_push_btn = st.columns([3, 1])
-        with col_push_input:
-            push_card_input = st.selectbox(
-                "Card",
-                options=preset_options_push,
+    @st.fragment
+    @profiled("Replicate")
+    def replicate_panel():
+        """Domo → Domo copy of one card's annotations to other cards."""
+        with st.container(border=True):
+            st.markdown("""<div class='label'>Replicate Annotations 
+                <span class="info-tooltip">ⓘ
+                    <span class="tooltiptext">העתקת כל ההערות מקארד מקור לקארדים אחרים, למשל לגרסה חדשה של דשבורד. הערות שכבר קיימות בקארד היעד לא יועתקו שוב.</span>
+                </span>
+            </div>""", unsafe_allow_html=True)
+            st.markdown(
+                "<div class='desc'>Copy a card's annotations to other Domo cards.</div>",
+                unsafe_allow_html=True,
+            )
+            
+            # Source card
+            st.markdown("<div class='tiny'>Source Card</div>", unsafe_allow_html=True)
+            replicate_source_search = st.text_input(
+                "Search cards",
+                placeholder="🔍 Search cards by title, page, dataset or ID...",
+                label_visibility="collapsed",
+                key="replicate_source_search"
+            )
+            replicate_source_input = st.selectbox(
+                "Source card",
+                options=card_picker_options(replicate_source_search),
                 index=None,
-                placeholder="Select preset or type card ID...",
+                placeholder="Select a card or type its ID...",
                 label_visibility="collapsed",
                 accept_new_options=True,
-                key="push_card_input"
+                key="replicate_source_input"
             )
-        with col_push_btn:
-            if st.button("+ Add", type="secondary", use_container_width=True, key="push_add_btn"):
-                if push_card_input:
-                    if "(" in str(push_card_input) and ")" in str(push_card_input):
-                        card_to_add = str(push_card_input).split("(")[-1].rstrip(")")
-                    else:
-                        card_to_add = str(push_card_input).strip()
-                    
-                    if card_to_add and card_to_add not in st.session_state.push_card_ids:
-                        st.session_state.push_card_ids.append(card_to_add)
-                        st.rerun()
-        
-        # Display selected card IDs
-        if st.session_state.push_card_ids:
-            selected_push = st.multiselect(
-                "Selected cards",
-                options=st.session_state.push_card_ids,
-                default=st.session_state.push_card_ids,
+            
+            # Target cards
+            st.markdown("<div class='tiny'>Target Card IDs</div>", unsafe_allow_html=True)
+            replicate_card_search = st.text_input(
+                "Search cards",
+                placeholder="🔍 Search cards by title, page, dataset or ID...",
                 label_visibility="collapsed",
-                key="push_card_ids_display"
+                key="replicate_card_search"
             )
-            if set(selected_push) != set(st.session_state.push_card_ids):
-                st.session_state.push_card_ids = selected_push
-                st.rerun()
-        
-        # Date range for push
-        col_push_start, col_push_end = st.columns(2)
-        with col_push_start:
-            st.markdown("<div class='tiny'>From Date</div>", unsafe_allow_html=True)
-            push_start_date = st.date_input("Push From", value=date.today() - timedelta(days=1), label_visibility="collapsed", key="push_start")
-        with col_push_end:
-            st.markdown("<div class='tiny'>To Date</div>", unsafe_allow_html=True)
-            push_end_date = st.date_input("Push To", value=date.today(), label_visibility="collapsed", key="push_end")
-        
-        # Color filter (multiselect)
-        st.markdown("<div class='tiny'>Colors (leave empty for all)</div>", unsafe_allow_html=True)
-        selected_colors = st.multiselect(
-            "Colors",
-            options=list(ANNOTATION_COLORS.keys()),
-            default=[],
-            format_func=lambda x: COLOR_DISPLAY.get(x, x),
-            label_visibility="collapsed",
-            key="push_colors"
-        )
-        
-        # Convert color names to hex values
-        color_hex_values = [ANNOTATION_COLORS[c] for c in selected_colors]
-        
-        if st.button("→ Push to Domo", type="primary", use_container_width=True, disabled=st.session_state.get("push_in_progress", False)):
-            if st.session_state.push_card_ids:
-                st.session_state.push_in_progress = True
-                st.session_state.push_cancelled = False
-                st.session_state.push_results = {"pushed": 0, "failed": 0, "processed": 0, "success_cards": []}
-                st.session_state.push_color_hex_values = color_hex_values
-                st.rerun()
-            else:
-                st.error("Please add at least one card ID")
-        
-        # Initialize push state
-        if "push_in_progress" not in st.session_state:
-            st.session_state.push_in_progress = False
-        if "push_cancelled" not in st.session_state:
-            st.session_state.push_cancelled = False
-        
-        # Push in progress UI
-        if st.session_state.push_in_progress:
-            total_cards = len(st.session_state.push_card_ids)
-            processed = st.session_state.push_results.get("processed", 0)
-            
-            # Check if completed
-            if processed >= total_cards:
-                # Completed - show success and reset
-                st.session_state.push_in_progress = False
-                r = st.session_state.push_results
-                if r["pushed"] > 0:
-                    st.success(f"Pushed {r['pushed']} annotations to cards: {', '.join(r['success_cards'])}")
-                if r["failed"] > 0:
-                    st.warning(f"Failed to push {r['failed']} annotations")
-                if r["pushed"] == 0 and r["failed"] == 0:
-                    st.info("No annotations found matching the filters")
-                st.session_state.push_results = {"pushed": 0, "failed": 0, "processed": 0, "success_cards": []}
-            else:
-                # Still processing - show progress
-                st.progress((processed + 1) / total_cards, text=f"Pushing to card {processed + 1} of {total_cards}...")
-                
-                if st.button("✗ Cancel Push", type="secondary", use_container_width=True, key="cancel_push_progress"):
-                    st.session_state.push_cancelled = True
-                    st.session_state.push_in_progress = False
-                    r = st.session_state.push_results
-                    st.warning(f"Push cancelled. Pushed {r['pushed']} annotations to {processed} of {total_cards} cards.")
-                    st.rerun()
-                
-                # Process current card
-                if not st.session_state.push_cancelled:
-                    card_id = st.session_state.push_card_ids[processed]
-                    results = push_to_domo(
-                        card_id,
-                        start_date=push_start_date.strftime("%Y-%m-%d"),
-                        end_date=push_end_date.strftime("%Y-%m-%d"),
-                        colors=st.session_state.push_color_hex_values
-                    )
-                    st.session_state.push_results["pushed"] += results["pushed"]
-                    st.session_state.push_results["failed"] += results["failed"]
-                    if results["pushed"] > 0:
-                        st.session_state.push_results["success_cards"].append(card_id)
-                    st.session_state.push_results["processed"] += 1
-                    st.rerun()
+            
+            if "replicate_card_ids" not in st.session_state:
+                st.session_state.replicate_card_ids = []
+            
+            col_replicate_input, col_replicate_btn = st.columns([3, 1])
+            with col_replicate_input:
+                replicate_card_input = st.selectbox(
+                    "Card",
+                    options=card_picker_options(replicate_card_search),
+                    index=None,
+                    placeholder="Select a card or type its ID...",
+                    label_visibility="collapsed",
+                    accept_new_options=True,
+                    key="replicate_card_input"
+                )
+            with col_replicate_btn:
+                if st.button("+ Add", type="secondary", use_container_width=True, key="replicate_add_btn"):
+                    if replicate_card_input:
+                        card_to_add = card_ref_from_input(replicate_card_input)
+                        if card_to_add is None:
+                            st.error(f"Unknown card or Domo instance: {replicate_card_input}")
+                        elif card_to_add not in st.session_state.replicate_card_ids:
+                            st.session_state.replicate_card_ids.append(card_to_add)
+                            rerun_panel()
+            
+            if st.session_state.replicate_card_ids:
+                selected_replicate = st.multiselect(
+                    "Selected cards",
+                    options=st.session_state.replicate_card_ids,
+                    default=st.session_state.replicate_card_ids,
+                    label_visibility="collapsed",
+                    key="replicate_card_ids_display"
+                )
+                if set(selected_replicate) != set(st.session_state.replicate_card_ids):
+                    st.session_state.replicate_card_ids = selected_replicate
+                    rerun_panel()
+            
+            if st.button("⧉ Replicate", type="primary", use_container_width=True, key="replicate_btn"):
+                source_card_id = card_ref_from_input(replicate_source_input) if replicate_source_input else None
+                if source_card_id is None:
+                    st.error(f"Unknown card or Domo instance: {replicate_source_input}" if replicate_source_input else "Please select a source card")
+                elif not [card_id for card_id in st.session_state.replicate_card_ids if card_id != source_card_id]:
+                    st.error("Please add at least one target card other than the source")
+                else:
+                    try:
+                        with st.spinner(f"Replicating to {len(st.session_state.replicate_card_ids)} cards..."):
+                            r = replicate_annotations(source_card_id, st.session_state.replicate_card_ids)
+                    except Exception as e:
+                        st.error(f"Replicate error: {str(e)}")
+                        return
+                    if r["replicated"] > 0:
+                        st.success(f"Replicated {r['replicated']} annotations to cards: {', '.join(r['success_cards'])}")
+                        invalidate_annotation_caches()
+                    if r["skipped"] > 0:
+                        st.info(f"Skipped {r['skipped']} annotations already on the target cards")
+                    if r["failed"] > 0:
+                        st.warning(f"Failed to replicate {r['failed']} annotations - replicate again to retry only those")
+                    if r["replicated"] == 0 and r["skipped"] == 0 and r["failed"] == 0:
+                        st.info(f"Card {source_card_id} has no annotations")
+    
+    replicate_panel()
     
     st.write("")
     
     # ==========================
-    # VIEW ALL ANNOTATIONS
+    # SUMMARY
     # ==========================
-    with st.container(border=True):
-        col_header, col_toggle, col_refresh = st.columns([3, 1.5, 1])
-        with col_header:
-            st.markdown("""<div class='label'>All Annotations 
+    @st.fragment
+    @profiled("Summary")
+    def summary_panel():
+        """Aggregate counts computed in Snowflake."""
+        with st.container(border=True):
+            st.markdown("""<div class='label'>Summary 
                 <span class="info-tooltip">ⓘ
-                    <span class="tooltiptext">צפייה בכל ההערות מסנואופלייק. סננו לפי תאריכים ולחצו Apply. ניתן לעבור בין תצוגת טבלה לציר זמן, לייצא ל-CSV ולרענן.</span>
+                    <span class="tooltiptext">סיכום כמויות הערות לפי קארד, תקופה וצבע. החישוב מתבצע בסנואופלייק בלי לטעון את ההערות עצמן.</span>
                 </span>
             </div>""", unsafe_allow_html=True)
             st.markdown(
-                "<div class='desc'>View all annotations from Snowflake.</div>",
+                "<div class='desc'>Annotation counts per card, period and color.</div>",
                 unsafe_allow_html=True,
             )
-        with col_toggle:
-            view_mode = st.toggle("Timeline View", value=False)
-        with col_refresh:
-            if st.button("↻ Refresh", type="secondary", use_container_width=True, key="refresh_all"):
-                st.session_state.all_annotations = get_snowflake_annotations()
-                st.rerun()
-        
-        # Date filter
-        col_filter_start, col_filter_end, col_filter_btn = st.columns([2, 2, 1])
-        with col_filter_start:
-            st.markdown("<div class='tiny'>From Date</div>", unsafe_allow_html=True)
-            filter_start = st.date_input("From", value=date.today() - timedelta(days=1), label_visibility="collapsed", key="filter_start")
-        with col_filter_end:
-            st.markdown("<div class='tiny'>To Date</div>", unsafe_allow_html=True)
-            filter_end = st.date_input("To", value=date.today(), label_visibility="collapsed", key="filter_end")
-        with col_filter_btn:
-            st.markdown("<div class='tiny'>&nbsp;</div>", unsafe_allow_html=True)
-            if st.button("Apply", type="secondary", use_container_width=True, key="apply_filter"):
-                st.session_state.all_annotations = get_snowflake_annotations(
-                    start_date=filter_start.strftime("%Y-%m-%d"),
-                    end_date=filter_end.strftime("%Y-%m-%d")
-                )
-                st.rerun()
         
-        # Load annotations if not loaded
-        if "all_annotations" not in st.session_state:
-            st.session_state.all_annotations = get_snowflake_annotations()
+            col_summary_start, col_summary_end, col_summary_grain = st.columns([2, 2, 1])
+            with col_summary_start:
+                st.markdown("<div class='tiny'>From Date</div>", unsafe_allow_html=True)
+                quarter_start = date(date.today().year, 3 * ((date.today().month - 1) // 3) + 1, 1)
+                summary_start = st.date_input("Summary From", value=quarter_start, label_visibility="collapsed", key="summary_start")
+            with col_summary_end:
+                st.markdown("<div class='tiny'>To Date</div>", unsafe_allow_html=True)
+                summary_end = st.date_input("Summary To", value=date.today(), label_visibility="collapsed", key="summary_end")
+            with col_summary_grain:
+                st.markdown("<div class='tiny'>Group by</div>", unsafe_allow_html=True)
+                summary_grain = st.selectbox(
+                    "Group by", options=["day", "week", "month", "quarter"], index=1,
+                    label_visibility="collapsed", key="summary_grain"
+                )
         
-        annotations = st.session_state.all_annotations
+            with profile_section("Snowflake counts"):
+                counts = get_snowflake_annotation_counts(
+                    start_date=summary_start.strftime("%Y-%m-%d"),
+                    end_date=summary_end.strftime("%Y-%m-%d"),
+                    grain=summary_grain
+                )
         
-        if annotations:
-            if view_mode:
-                # Timeline View
+            if not counts.empty:
+                col_total, col_cards, col_busiest = st.columns(3)
+                per_period = counts.groupby("PERIOD")["ANNOTATIONS"].sum()
+                stats = [
+                    (col_total, f"{counts['ANNOTATIONS'].sum():,}", "Annotations"),
+                    (col_cards, f"{counts['CARD_REF'].nunique():,}", "Cards"),
+                    (col_busiest, per_period.idxmax().strftime("%Y-%m-%d"), f"Busiest {summary_grain}"),
+                ]
+                for col, value, label in stats:
+                    with col:
+                        st.markdown(
+                            f"<div class='stat-box'><div class='stat-value'>{value}</div>"
+                            f"<div class='stat-label'>{label}</div></div>",
+                            unsafe_allow_html=True,
+                        )
+            
+                # Stacked bars per period, colored like the annotations
                 import plotly.graph_objects as go
-                
-                timeline_data = []
-                for ann in annotations:
-                    date_str = ann.get("ENTRY_DATE")
-                    if date_str:
-                        timeline_data.append({
-                            "Date": str(date_str),
-                            "Content": ann.get("CONTENT", ""),
-                            "Color": ann.get("COLOR", "#72B0D7"),
-                            "Card": f"Card {ann['CARD_ID']}" if ann.get("CARD_ID") else "Global",
-                        })
-                
-                if timeline_data:
-                    df_timeline = pd.DataFrame(timeline_data)
-                    df_timeline["Date"] = pd.to_datetime(df_timeline["Date"])
-                    df_timeline = df_timeline.sort_values("Date")
-                    
+            
+                with profile_section("Plotly figure"):
                     fig = go.Figure()
-                    
-                    for idx, row in df_timeline.iterrows():
-                        fig.add_trace(go.Scatter(
-                            x=[row["Date"]],
-                            y=[0],
-                            mode="markers+text",
-                            marker=dict(
-                                size=16,
-                                color=row["Color"],
-                                line=dict(width=2, color="white")
-                            ),
-                            text=[row["Content"][:20] + "..." if len(row["Content"]) > 20 else row["Content"]],
-                            textposition="top center",
-                            hovertemplate=(
-                                f"<b>{row['Content']}</b><br>"
-                                f"Date: {row['Date'].strftime('%Y-%m-%d')}<br>"
-                                f"{row['Card']}<extra></extra>"
-                            ),
-                            showlegend=False
+                    for color, color_counts in counts.groupby("COLOR"):
+                        by_period = color_counts.groupby("PERIOD")["ANNOTATIONS"].sum()
+                        fig.add_trace(go.Bar(
+                            x=by_period.index,
+                            y=by_period.values,
+                            name=COLOR_NAME_MAP.get(color, color),
+                            marker_color=color,
                         ))
-                    
                     fig.update_layout(
-                        height=300,
-                        margin=dict(l=20, r=20, t=40, b=20),
-                        xaxis=dict(title="", showgrid=True, gridcolor="rgba(0,0,0,0.05)"),
-                        yaxis=dict(visible=False, range=[-0.5, 1]),
+                        barmode="stack",
+                        height=260,
+                        margin=dict(l=20, r=20, t=20, b=20),
                         plot_bgcolor="rgba(0,0,0,0)",
                         paper_bgcolor="rgba(0,0,0,0)",
-                        hoverlabel=dict(bgcolor="white", font_size=13, font_family="Inter")
+                        legend=dict(orientation="h"),
                     )
-                    
                     st.plotly_chart(fig, use_container_width=True)
+            
+                per_card = (
+                    counts.assign(Card=counts["CARD_REF"].fillna("Global"))
+                    .groupby("Card")["ANNOTATIONS"].sum()
+                    .sort_values(ascending=False)
+                    .rename("Annotations")
+                    .reset_index()
+                )
+                st.dataframe(per_card, use_container_width=True, hide_index=True)
             else:
-                # Table View
-                df_data = []
-                for ann in annotations:
-                    created_date = ann.get("CREATED_DATE")
-                    created_str = created_date.strftime("%Y-%m-%d %H:%M") if created_date else "—"
-                    
-                    df_data.append({
-                        "Content": ann.get("CONTENT"),
-                        "Date": str(ann.get("ENTRY_DATE", "—")),
-                        "Color": COLOR_NAME_MAP.get(ann.get("COLOR"), ann.get("COLOR", "—")),
-                        "Card ID": str(ann.get("CARD_ID")) if ann.get("CARD_ID") else "Global",
-                        "Created By": ann.get("DOMO_USER_NAME", "—"),
-                        "Created": created_str,
-                        "ID": str(ann.get("ID")) if ann.get("ID") else "—",
-                    })
+                st.markdown("""
+                    <div class="empty-state">
+                        <div class="empty-state-icon">📊</div>
+                        <p>No annotations in this date range</p>
+                    </div>
+                """, unsafe_allow_html=True)
+    
+    summary_panel()
+    
+    st.write("")
+    
+    # ==========================
+    # VIEW ALL ANNOTATIONS
+    # ==========================
+    @st.fragment
+    @profiled("All Annotations")
+    def all_annotations_panel():
+        """Table / timeline of a store view, search and CSV export."""
+        with st.container(border=True):
+            col_header, col_toggle, col_refresh = st.columns([3, 1.5, 1])
+            with col_header:
+                st.markdown("""<div class='label'>All Annotations 
+                    <span class="info-tooltip">ⓘ
+                        <span class="tooltiptext">צפייה בכל ההערות מסנואופלייק. סננו לפי תאריכים ולחצו Apply. ניתן לעבור בין תצוגת טבלה לציר זמן, לייצא ל-CSV ולרענן.</span>
+                    </span>
+                </div>""", unsafe_allow_html=True)
+                st.markdown(
+                    "<div class='desc'>View all annotations from Snowflake.</div>",
+                    unsafe_allow_html=True,
+                )
+            with col_toggle:
+                view_mode = st.toggle("Timeline View", value=False)
+            with col_refresh:
+                if st.button("↻ Refresh", type="secondary", use_container_width=True, key="refresh_all"):
+                    refresh_annotation_panels()
+        
+            # Date filter
+            col_filter_start, col_filter_end, col_filter_btn = st.columns([2, 2, 1])
+            with col_filter_start:
+                st.markdown("<div class='tiny'>From Date</div>", unsafe_allow_html=True)
+                filter_start = st.date_input("From", value=date.today() - timedelta(days=1), label_visibility="collapsed", key="filter_start")
+            with col_filter_end:
+                st.markdown("<div class='tiny'>To Date</div>", unsafe_allow_html=True)
+                filter_end = st.date_input("To", value=date.today(), label_visibility="collapsed", key="filter_end")
+            with col_filter_btn:
+                st.markdown("<div class='tiny'>&nbsp;</div>", unsafe_allow_html=True)
+                if st.button("Apply", type="secondary", use_container_width=True, key="apply_filter"):
+                    st.session_state.all_annotations_view = {
+                        "start_date": filter_start.strftime("%Y-%m-%d"),
+                        "end_date": filter_end.strftime("%Y-%m-%d"),
+                        "touched": time.time(),
+                    }
+                    rerun_panel()
+        
+            # Show everything until a filter is applied
+            if "all_annotations_view" not in st.session_state:
+                st.session_state.all_annotations_view = {"start_date": None, "end_date": None, "touched": time.time()}
+        
+            search_query = st.text_input(
+                "Search", placeholder="🔍 Search annotation text (ignores the date filter)...",
+                label_visibility="collapsed", key="all_search"
+            )
+            if search_query.strip():
+                with profile_section("Search"):
+                    annotations_view = search_annotations(search_query)
+                st.markdown(f"<div class='tiny'>{len(annotations_view)} matches</div>", unsafe_allow_html=True)
+            else:
+                with profile_section("Snowflake load"):
+                    annotations_view = get_annotation_view("all_annotations_view")
+        
+            if not annotations_view.empty:
+                if view_mode:
+                    # Timeline View
+                    import plotly.graph_objects as go
                 
-                df = pd.DataFrame(df_data)
-                df = df.sort_values("Date", ascending=False)
+                    with profile_section("Plotly figure"):
+                        timeline_data = []
+                        for ann in frame_records(annotations_view):
+                            date_str = ann.get("ENTRY_DATE")
+                            if date_str:
+                                timeline_data.append({
+                                    "Date": str(date_str),
+                                    "Content": ann.get("CONTENT", ""),
+                                    "Color": ann.get("COLOR", "#72B0D7"),
+                                    "Card": f"Card {row_card_ref(ann)}" if ann.get("CARD_ID") is not None else "Global",
+                                })
                 
-                # Export CSV button
-                csv = df.to_csv(index=False).encode('utf-8-sig')
-                st.download_button(
-                    label="🡻 Export CSV",
-                    data=csv,
-                    file_name=f"annotations_{date.today().strftime('%Y%m%d')}.csv",
-                    mime="text/csv",
-                    type="secondary"
-                )
+                        if timeline_data:
+                            df_timeline = pd.DataFrame(timeline_data)
+                            df_timeline["Date"] = pd.to_datetime(df_timeline["Date"])
+                            df_timeline = df_timeline.sort_values("Date")
+                    
+                            fig = go.Figure()
+                    
+                            for idx, row in df_timeline.iterrows():
+                                fig.add_trace(go.Scatter(
+                                    x=[row["Date"]],
+                                    y=[0],
+                                    mode="markers+text",
+                                    marker=dict(
+                                        size=16,
+                                        color=row["Color"],
+                                        line=dict(width=2, color="white")
+                                    ),
+                                    text=[row["Content"][:20] + "..." if len(row["Content"]) > 20 else row["Content"]],
+                                    textposition="top center",
+                                    hovertemplate=(
+                                        f"<b>{row['Content']}</b><br>"
+                                        f"Date: {row['Date'].strftime('%Y-%m-%d')}<br>"
+                                        f"{row['Card']}<extra></extra>"
+                                    ),
+                                    showlegend=False
+                                ))
+                    
+                            fig.update_layout(
+                                height=300,
+                                margin=dict(l=20, r=20, t=40, b=20),
+                                xaxis=dict(title="", showgrid=True, gridcolor="rgba(0,0,0,0.05)"),
+                                yaxis=dict(visible=False, range=[-0.5, 1]),
+                                plot_bgcolor="rgba(0,0,0,0)",
+                                paper_bgcolor="rgba(0,0,0,0)",
+                                hoverlabel=dict(bgcolor="white", font_size=13, font_family="Inter")
+                            )
+                    
+                            st.plotly_chart(fig, use_container_width=True)
+                else:
+                    # Table View, built column-wise from the shared frame
+                    with profile_section("Table build"):
+                        card_refs = pd.Series([
+                            row_card_ref(ann) if ann["CARD_ID"] is not None else "Global"
+                            for ann in frame_records(annotations_view[["CARD_ID", "DOMO_INSTANCE"]])
+                        ], index=annotations_view.index, dtype="string")
+                        df = pd.DataFrame({
+                            "Content": annotations_view["CONTENT"],
+                            "Date": annotations_view["ENTRY_DATE"].fillna("—"),
+                            "Color": annotations_view["COLOR"].map(lambda c: COLOR_NAME_MAP.get(c, c), na_action="ignore").fillna("—"),
+                            "Card ID": card_refs,
+                            "Created By": annotations_view["DOMO_USER_NAME"].fillna("—"),
+                            "Created": annotations_view["CREATED_DATE"].dt.strftime("%Y-%m-%d %H:%M").fillna("—"),
+                            "ID": annotations_view["ID"].astype("string").fillna("—"),
+                        })
+                        df = df.sort_values("Date", ascending=False)
                 
-                st.dataframe(
-                    df,
-                    use_container_width=True,
-                    hide_index=True,
-                    column_config={
-                        "Content": st.column_config.TextColumn("Content", width="large"),
-                        "Date": st.column_config.TextColumn("Date", width="small"),
-                        "Color": st.column_config.TextColumn("Color", width="small"),
-                        "Card ID": st.column_config.TextColumn("Card ID", width="small"),
-                        "Created By": st.column_config.TextColumn("Created By", width="medium"),
-                        "Created": st.column_config.TextColumn("Created", width="medium"),
-                        "ID": st.column_config.TextColumn("ID", width="small"),
-                    }
-                )
-        else:
-            st.markdown("""
-                <div class="empty-state">
-                    <div class="empty-state-icon">📊</div>
-                    <p>No annotations found</p>
-                </div>
-            """, unsafe_allow_html=True)
+                    # Export CSV button - encoded only when clicked
+                    profiler = rerun_profiler()
+                    
+                    def export_csv() -> bytes:
+                        with profile_section("CSV encoding", profiler):
+                            return df.to_csv(index=False).encode('utf-8-sig')
+                    
+                    st.download_button(
+                        label="🡻 Export CSV",
+                        data=export_csv,
+                        on_click="ignore",
+                        file_name=f"annotations_{date.today().strftime('%Y%m%d')}.csv",
+                        mime="text/csv",
+                        type="secondary"
+                    )
+                
+                    st.dataframe(
+                        df,
+                        use_container_width=True,
+                        hide_index=True,
+                        column_config={
+                            "Content": st.column_config.TextColumn("Content", width="large"),
+                            "Date": st.column_config.TextColumn("Date", width="small"),
+                            "Color": st.column_config.TextColumn("Color", width="small"),
+                            "Card ID": st.column_config.TextColumn("Card ID", width="small"),
+                            "Created By": st.column_config.TextColumn("Created By", width="medium"),
+                            "Created": st.column_config.TextColumn("Created", width="medium"),
+                            "ID": st.column_config.TextColumn("ID", width="small"),
+                        }
+                    )
+            else:
+                st.markdown("""
+                    <div class="empty-state">
+                        <div class="empty-state-icon">📊</div>
+                        <p>No annotations found</p>
+                    </div>
+                """, unsafe_allow_html=True)
+    
+    all_annotations_panel()
+    
+    if PROFILING_ENABLED:
+        profiling_panel()
     
     # Footer
     st.markdown(
@@ -0,0 +1,637 @@
+"""
+Concurrent-session load test for the Annotations Manager.
+
+Drives N simulated analysts through app.py at once with Streamlit's AppTest,
+against in-process Domo and Snowflake stand-ins, and reports rerun latency
+percentiles, memory per session and throughput. Use it to size replicas and
+to catch scaling regressions:
+
+    python loadtest.py --sessions 1,5,10,20 --duration 60
+    python loadtest.py --sessions 20 --max-p95-ms 1500    # exit 1 when slower
+    python loadtest.py --check-migrations                 # upgrade the stand-in schema only
+
+Every session runs a weighted mix of Add, Delete, View and Sync scripts made of
+real widget interactions; each interaction is one timed rerun. AppTest reruns
+the whole page for every interaction (fragments included), so latencies are an
+upper bound for fragment-scoped clicks in a browser.
+"""
+
+import argparse
+import asyncio
+import gzip
+import itertools
+import json
+import logging
+import random
+import re
+import resource
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from unittest import mock
+
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.dataframe_source_manager import DataframeSourceManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.runtime.secrets import Secrets
+from streamlit.testing.v1 import AppTest
+
+import migrations
+
+APP_PATH = str(Path(__file__).with_name("app.py"))
+TABLE = "ANNOTATIONS"
+
+SECRETS = {
+    "app_auth": {"username": "loadtest", "password": "loadtest"},
+    "domo": {"instance": "loadtest", "developer_token": "loadtest"},
+    "snowflake": {
+        "account": "loadtest", "user": "loadtest", "private_key": "loadtest",
+        "database": "LOADTEST", "schema": "PUBLIC", "warehouse": "LOADTEST",
+        "role": "LOADTEST", "table": TABLE,
+    },
+}
+
+WORDS = ["release", "campaign", "outage", "holiday", "election", "launch", "promo", "migration", "הבחירות", "שידור"]
+COLORS = ["#72B0D7", "#80C25D", "#FD7F76", "#F5C43D", "#9B5EE3"]
+
+
+# ==========================
+# DOMO STAND-IN
+# ==========================
+class StandInResponse:
+    """The parts of a `requests` response the app reads."""
+
+    def __init__(self, status: int, body: Any):
+        self.status_code = status
+        self.text = json.dumps(body) if body is not None else ""
+        self.content = self.text.encode()
+        self.headers = {}
+        self._body = body
+
+    def json(self) -> Any:
+        return self._body
+
+
+class StandInAioResponse:
+    """An aiohttp response context manager over a StandInResponse."""
+
+    def __init__(self, response: StandInResponse, latency: float):
+        self.status = response.status_code
+        self.headers = {}
+        self._response = response
+        self._latency = latency
+
+    async def __aenter__(self):
+        await asyncio.sleep(self._latency)
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def text(self, encoding: Optional[str] = None) -> str:
+        return self._response.text
+
+    async def read(self) -> bytes:
+        return self._response.content
+
+
+class StandInDomo:
+    """
+    In-memory KPI cards answering the definition, save and admin-summary calls,
+    with `latency` seconds added to each request like a real round trip.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.cards = {}
+        self.requests = 0
+        self._ids = itertools.count(1_000_000)
+        self._lock = threading.Lock()
+
+    def card(self, card_id: str) -> Dict[str, Any]:
+        return self.cards.setdefault(str(card_id), {"title": f"Load test card {card_id}", "annotations": []})
+
+    def seed(self, card_id: str, content: str, entry_date: str, color: str) -> Dict[str, Any]:
+        annotation = {
+            "id": next(self._ids), "content": content, "dataPoint": {"point1": entry_date},
+            "color": color, "userId": 1, "userName": "loadtest", "createdDate": int(time.time() * 1000),
+        }
+        self.card(card_id)["annotations"].append(annotation)
+        return annotation
+
+    def handle(self, url: str, json_body: Optional[Dict[str, Any]], data, headers, params) -> StandInResponse:
+        if data is not None:
+            if (headers or {}).get("Content-Encoding") == "gzip":
+                data = gzip.decompress(data)
+            json_body = json.loads(data)
+        with self._lock:
+            self.requests += 1
+            if "adminsummary" in url:
+                params = params or {}
+                ids = sorted(self.cards)[params.get("skip", 0):params.get("skip", 0) + params.get("limit", 100)]
+                return StandInResponse(200, {"cardAdminSummaries": [
+                    {"id": int(card_id), "type": "kpi", "title": self.cards[card_id]["title"]} for card_id in ids
+                ]})
+            if url.endswith("/kpi/definition"):
+                card = self.card(json_body["urn"])
+                return StandInResponse(200, {
+                    "columns": [{"sourceId": "loadtest"}],
+                    "definition": {
+                        "title": card["title"],
+                        "subscriptions": {"main": {}},
+                        "annotations": [dict(a) for a in card["annotations"]],
+                    },
+                })
+            match = re.search(r"/kpi/(\d+)$", url)
+            if match:
+                card = self.card(match.group(1))
+                changes = json_body["definition"]["annotations"]
+                deleted = set(changes.get("deleted", []))
+                card["annotations"] = [a for a in card["annotations"] if a["id"] not in deleted]
+                for annotation in changes.get("new", []):
+                    card["annotations"].append({
+                        **annotation, "id": next(self._ids), "userId": 1,
+                        "userName": "loadtest", "createdDate": int(time.time() * 1000),
+                    })
+                return StandInResponse(200, {"definition": {"annotations": [dict(a) for a in card["annotations"]]}})
+        return StandInResponse(404, {"error": url})
+
+    def request(self, url: str, json=None, data=None, headers=None, params=None, **kwargs) -> StandInResponse:
+        time.sleep(self.latency)
+        return self.handle(url, json, data, headers, params)
+
+    def aio_request(self, url: str, json=None, data=None, headers=None, params=None, **kwargs) -> StandInAioResponse:
+        return StandInAioResponse(self.handle(url, json, data, headers, params), self.latency)
+
+
+# ==========================
+# SNOWFLAKE STAND-IN
+# ==========================
+class StandInCursor:
+    """Snowflake cursor over SQLite, translating the few dialect differences the app uses."""
+
+    def __init__(self, connection: "StandInConnection"):
+        self._cursor = connection.db.cursor()
+        self._latency = connection.latency
+
+    @staticmethod
+    def translate(sql: str) -> str:
+        sql = sql.replace("%s", "?").replace("CURRENT_TIMESTAMP()", "CURRENT_TIMESTAMP")
+        return re.sub(r"DATEADD\((\w+),", r"DATEADD('\1',", sql)
+
+    def execute(self, sql: str, params=()):
+        time.sleep(self._latency)
+        if re.match(r"\s*ALTER TABLE \w+ CLUSTER BY", sql):
+            # SQLite has no clustering keys; rows are always found through the statement's filters
+            return self
+        match = re.match(r"\s*ALTER TABLE (\w+) ADD COLUMN IF NOT EXISTS (\w+) (\w+)", sql)
+        if match:
+            table, column, column_type = match.groups()
+            if column not in [row[1] for row in self._cursor.execute(f"PRAGMA table_info({table})")]:
+                self._cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+            return self
+        self._cursor.execute(self.translate(sql), tuple(params or ()))
+        return self
+
+    def executemany(self, sql: str, seq):
+        time.sleep(self._latency)
+        self._cursor.executemany(self.translate(sql), [tuple(p) for p in seq])
+        return self
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size: int = 1):
+        return self._cursor.fetchmany(size)
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    def close(self) -> None:
+        self._cursor.close()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+class StandInConnection:
+    def __init__(self, path: str, latency: float):
+        self.db = StandInSnowflake.open(path)
+        self.latency = latency
+
+    def cursor(self) -> StandInCursor:
+        return StandInCursor(self)
+
+    def commit(self) -> None:
+        self.db.commit()
+
+    def rollback(self) -> None:
+        self.db.rollback()
+
+    def close(self) -> None:
+        self.db.close()
+
+
+class StandInSnowflake:
+    """
+    A SQLite file standing in for the annotations schema. Every `connect()` opens
+    its own connection, like the connector, with `latency` seconds per statement.
+    """
+
+    def __init__(self, directory: str, latency: float = 0.0):
+        self.path = str(Path(directory) / "snowflake.db")
+        self.latency = latency
+        db = self.open(self.path)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(f"""
+            CREATE TABLE IF NOT EXISTS {TABLE} (
+                CARD_ID INTEGER, ID INTEGER, DOMO_USER_ID INTEGER, DOMO_USER_NAME TEXT,
+                COLOR TEXT, CONTENT TEXT, ENTRY_DATE TEXT, CREATED_DATE TIMESTAMP, UPDATED_AT TIMESTAMP
+            )
+        """)
+        db.commit()
+        self._db = db
+
+    @staticmethod
+    def open(path: str) -> sqlite3.Connection:
+        db = sqlite3.connect(path, timeout=60, check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES)
+        db.create_function("DATE_TRUNC", 2, StandInSnowflake.date_trunc)
+        db.create_function("DATEADD", 3, StandInSnowflake.date_add)
+        db.create_function("UUID_STRING", 0, lambda: str(uuid.uuid4()))
+        return db
+
+    @staticmethod
+    def date_trunc(grain: str, value) -> Optional[str]:
+        if value is None:
+            return None
+        day = date.fromisoformat(str(value)[:10])
+        if grain == "week":
+            day -= timedelta(days=day.weekday())
+        elif grain == "month":
+            day = day.replace(day=1)
+        elif grain == "quarter":
+            day = day.replace(day=1, month=3 * ((day.month - 1) // 3) + 1)
+        return day.isoformat()
+
+    @staticmethod
+    def date_add(unit: str, amount: int, value) -> str:
+        moved = datetime.fromisoformat(str(value)) + timedelta(**{f"{unit.lower()}s": amount})
+        return moved.strftime("%Y-%m-%d %H:%M:%S")
+
+    def seed(self, card_id: str, annotation: Dict[str, Any]) -> None:
+        self._db.execute(
+            f"INSERT INTO {TABLE} VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)",
+            (int(card_id), annotation["id"], annotation["userId"], annotation["userName"],
+             annotation["color"], annotation["content"], annotation["dataPoint"]["point1"]),
+        )
+
+    def commit(self) -> None:
+        self._db.commit()
+
+    def connect(self, **kwargs) -> StandInConnection:
+        return StandInConnection(self.path, self.latency)
+
+
+def seed_stand_ins(domo: StandInDomo, snowflake: StandInSnowflake, cards: int, per_card: int, rng: random.Random) -> List[str]:
+    """Give both stand-ins the same synced annotations; returns the card IDs."""
+    card_ids = [str(100_000 + i) for i in range(cards)]
+    for card_id in card_ids:
+        for _ in range(per_card):
+            annotation = domo.seed(
+                card_id,
+                f"{rng.choice(WORDS)} {rng.randint(1, 9999)}",
+                (date.today() - timedelta(days=rng.randint(0, 90))).isoformat(),
+                rng.choice(COLORS),
+            )
+            snowflake.seed(card_id, annotation)
+    snowflake.commit()
+    return card_ids
+
+
+# ==========================
+# SESSIONS
+# ==========================
+def shared_bytecode():
+    """
+    A ScriptCache.get_bytecode that compiles app.py once for every session, as the
+    server does. AppTest builds a fresh cache per run, and concurrent compiles
+    can fail in CPython's AST constructor.
+    """
+    compile_script = ScriptCache.get_bytecode
+    lock = threading.Lock()
+    compiled = {}
+
+    def get_bytecode(self, script_path: str):
+        with lock:
+            if script_path not in compiled:
+                compiled[script_path] = compile_script(self, script_path)
+            return compiled[script_path]
+    return get_bytecode
+
+
+def shared_runtime() -> Runtime:
+    """
+    One runtime for every session, as in a server process. AppTest installs a
+    fresh one per run and clears it afterwards, which breaks concurrent runs.
+    """
+    runtime = mock.MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.dataframe_source_mgr = DataframeSourceManager()
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    return runtime
+
+
+class SimulatedSession:
+    """One analyst: an AppTest running a weighted mix of scripts until the deadline."""
+
+    def __init__(self, index: int, card_ids: List[str], mix: Dict[str, int], think: float, timeout: float):
+        self.index = index
+        self.card_ids = card_ids
+        self.mix = mix
+        self.think = think
+        self.timeout = timeout
+        self.rng = random.Random(index)
+        self.samples = []
+        self.errors = []
+        # Secrets are installed once in main(): AppTest swaps the global st.secrets
+        # around each run when given its own, which races between sessions
+        self.at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        self.at.session_state["authenticated"] = True
+
+    def interact(self, script: str, target) -> None:
+        """Run one rerun (`target` is the AppTest or a widget with a pending change) and time it."""
+        started = time.perf_counter()
+        target.run(timeout=self.timeout)
+        self.samples.append((script, time.perf_counter() - started))
+        if self.at.exception:
+            self.errors.append((script, self.at.exception[0].message))
+        time.sleep(self.think * self.rng.uniform(0.5, 1.5))
+
+    def button(self, label: str):
+        for button in self.at.button:
+            if button.label == label:
+                return button
+        raise KeyError(label)
+
+    def run(self, deadline: float) -> None:
+        self.interact("load", self.at)
+        scripts = list(self.mix)
+        weights = [self.mix[name] for name in scripts]
+        while time.time() < deadline:
+            script = self.rng.choices(scripts, weights)[0]
+            try:
+                getattr(self, f"script_{script}")()
+            except Exception as e:
+                # A widget missing after an earlier failure; start the next script fresh
+                self.errors.append((script, f"{type(e).__name__}: {e}"))
+                self.interact("load", self.at)
+
+    def script_add(self) -> None:
+        self.at.session_state["card_ids"] = [self.rng.choice(self.card_ids)]
+        self.interact("add", self.at.text_area(key="add_content").input(f"load test {self.rng.choice(WORDS)} {self.index}"))
+        self.interact("add", self.button("Add Annotation").click())
+
+    def script_delete(self) -> None:
+        self.interact("delete", self.at.date_input(key="del_start").set_value(date.today() - timedelta(days=90)))
+        self.interact("delete", self.button("Load Annotations").click())
+        options = [sb for sb in self.at.selectbox if sb.label == "Select annotation"]
+        if not options or not options[0].options:
+            return
+        self.interact("delete", options[0].set_value(self.rng.choice(options[0].options)))
+        self.interact("delete", self.button("Delete Selected").click())
+
+    def script_view(self) -> None:
+        self.interact("view", self.at.date_input(key="filter_start").set_value(date.today() - timedelta(days=self.rng.randint(1, 90))))
+        self.interact("view", self.at.button(key="apply_filter").click())
+        self.interact("view", self.at.toggle[0].set_value(True))
+        self.interact("view", self.at.toggle[0].set_value(False))
+        self.interact("view", self.at.text_input(key="all_search").input(self.rng.choice(WORDS)))
+        self.interact("view", self.at.text_input(key="all_search").input(""))
+
+    def finish_sync(self) -> None:
+        """
+        Multi-card sync takes a few reruns: the click starts the job, the next run
+        syncs every remaining card and reruns the app, and the one after reports
+        it. Rerun until Sync is enabled again.
+        """
+        for _ in range(20):
+            if not self.button("⇄ Sync").disabled:
+                return
+            self.interact("sync", self.at)
+
+    def script_sync(self) -> None:
+        self.finish_sync()
+        cards = self.rng.sample(self.card_ids, min(3, len(self.card_ids)))
+        self.at.session_state["sync_card_ids"] = cards
+        self.at.session_state["sync_card_ids_display"] = cards
+        self.interact("sync", self.button("⇄ Sync").click())
+        self.finish_sync()
+
+
+# ==========================
+# MIGRATIONS CHECK
+# ==========================
+def check_migrations() -> int:
+    """
+    Upgrade a pre-migration annotations table (card and global rows) on the
+    SQLite stand-in, twice, and check every version landed once and every row
+    got a unique ROW_KEY. Returns the exit code.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        snowflake = StandInSnowflake(directory)
+        domo = StandInDomo(0)
+        seed_stand_ins(domo, snowflake, 3, 5, random.Random(0))
+        snowflake._db.execute(
+            f"INSERT INTO {TABLE} (CONTENT, ENTRY_DATE, COLOR) VALUES ('global', ?, '#72B0D7')",
+            (date.today().isoformat(),)
+        )
+        snowflake.commit()
+
+        tables = migrations.schema_tables(TABLE)
+        conn = snowflake.connect()
+        first = migrations.migrate(conn, tables)
+        second = migrations.migrate(conn, tables)
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT COUNT(*), COUNT(ROW_KEY), COUNT(DISTINCT ROW_KEY) FROM {TABLE}")
+        rows, keyed, distinct = cursor.fetchone()
+        cursor.execute(f"SELECT VERSION FROM {tables['versions']}")
+        recorded = sorted(row[0] for row in cursor.fetchall())
+        conn.close()
+
+    expected = [version for version, _, _ in migrations.MIGRATIONS]
+    print(f"applied {first}, then {second or 'nothing'}; {keyed} of {rows} rows keyed ({distinct} distinct)")
+    if first != expected or second or recorded != expected or not rows == keyed == distinct:
+        print("FAIL: migrations did not upgrade the stand-in schema cleanly")
+        return 1
+    return 0
+
+
+# ==========================
+# REPORT
+# ==========================
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile (0 for no values)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))]
+
+
+def rss_mb() -> float:
+    """Current resident set size in MB (peak RSS where /proc is unavailable)."""
+    try:
+        for line in Path("/proc/self/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_level(sessions: int, card_ids: List[str], args) -> Dict[str, Any]:
+    """Run `sessions` concurrent sessions for the configured duration and summarize."""
+    baseline = rss_mb()
+    mix = {name: int(weight) for name, weight in (item.split("=") for item in args.mix.split(","))}
+    simulated = [SimulatedSession(i, card_ids, mix, args.think_ms / 1000, args.timeout) for i in range(sessions)]
+    deadline = time.time() + args.duration
+    started = time.perf_counter()
+    threads = [threading.Thread(target=s.run, args=(deadline,), daemon=True) for s in simulated]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    # Measured while every session (and its state) is still alive
+    per_session_mb = max(0.0, rss_mb() - baseline) / sessions
+
+    samples = [sample for s in simulated for sample in s.samples]
+    errors = [error for s in simulated for error in s.errors]
+    by_script = {}
+    for script, seconds in samples:
+        by_script.setdefault(script, []).append(seconds)
+    latencies = [seconds for _, seconds in samples]
+    return {
+        "sessions": sessions,
+        "reruns": len(samples),
+        "throughput": len(samples) / elapsed if elapsed else 0.0,
+        "latencies": latencies,
+        "by_script": by_script,
+        "errors": errors,
+        "error_rate": len(errors) / max(len(samples), 1),
+        "mb_per_session": per_session_mb,
+    }
+
+
+def print_level(result: Dict[str, Any]) -> None:
+    print(
+        f"{result['sessions']:>8} {result['reruns']:>7} {result['throughput']:>9.1f} "
+        + " ".join(f"{percentile(result['latencies'], p) * 1000:>8.0f}" for p in (50, 90, 95, 99, 100))
+        + f" {len(result['errors']):>7} {result['mb_per_session']:>10.1f}"
+    )
+
+
+def print_scripts(result: Dict[str, Any]) -> None:
+    print(f"\nPer script at {result['sessions']} sessions (ms per rerun):")
+    print(f"{'script':>8} {'reruns':>7} {'p50':>8} {'p95':>8} {'max':>8}")
+    for script, values in sorted(result["by_script"].items()):
+        print(
+            f"{script:>8} {len(values):>7} {percentile(values, 50) * 1000:>8.0f} "
+            f"{percentile(values, 95) * 1000:>8.0f} {max(values) * 1000:>8.0f}"
+        )
+    for script, message in result["errors"][:5]:
+        print(f"  error in {script}: {message[:200]}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--sessions", default="10", help="concurrent sessions, or a comma-separated ramp (1,5,10,20)")
+    parser.add_argument("--duration", type=float, default=60, help="seconds per level")
+    parser.add_argument("--mix", default="view=5,add=2,delete=1,sync=1", help="script weights")
+    parser.add_argument("--think-ms", type=float, default=500, help="mean pause between interactions")
+    parser.add_argument("--cards", type=int, default=50, help="seeded cards")
+    parser.add_argument("--annotations-per-card", type=int, default=40, help="seeded annotations per card")
+    parser.add_argument("--domo-latency-ms", type=float, default=150, help="added to every Domo request")
+    parser.add_argument("--snowflake-latency-ms", type=float, default=40, help="added to every Snowflake statement")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds before a rerun counts as hung")
+    parser.add_argument("--max-p95-ms", type=float, help="exit 1 if the last level's p95 is slower")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="exit 1 if the last level's error rate is higher")
+    parser.add_argument("--check-migrations", action="store_true", help="only run migrations.py against the stand-in and exit")
+    args = parser.parse_args()
+    if args.check_migrations:
+        return check_migrations()
+
+    # Streamlit's per-rerun deprecation and bare-mode warnings would drown the report
+    logging.disable(logging.WARNING)
+    levels = [int(n) for n in args.sessions.split(",")]
+
+    with tempfile.TemporaryDirectory() as directory, ExitStack() as patches:
+        domo = StandInDomo(args.domo_latency_ms / 1000)
+        snowflake = StandInSnowflake(directory, args.snowflake_latency_ms / 1000)
+        card_ids = seed_stand_ins(domo, snowflake, args.cards, args.annotations_per_card, random.Random(0))
+        # Like a deployed schema: reads expect it migrated, only the first write migrates it
+        migrations.migrate(snowflake.connect(), migrations.schema_tables(TABLE))
+        secrets = Secrets()
+        secrets._secrets = SECRETS
+        patches.enter_context(mock.patch("streamlit.secrets", secrets))
+        patches.enter_context(mock.patch.object(ScriptCache, "get_bytecode", shared_bytecode()))
+        runtime = shared_runtime()
+        patches.enter_context(mock.patch.object(Runtime, "instance", classmethod(lambda cls: runtime)))
+        patches.enter_context(mock.patch.object(Runtime, "exists", classmethod(lambda cls: True)))
+        key = mock.MagicMock()
+        key.private_bytes.return_value = b""
+        patches.enter_context(mock.patch("requests.Session.put", domo.request))
+        patches.enter_context(mock.patch("requests.Session.post", domo.request))
+        patches.enter_context(mock.patch("aiohttp.ClientSession.put", domo.aio_request))
+        patches.enter_context(mock.patch("aiohttp.ClientSession.post", domo.aio_request))
+        patches.enter_context(mock.patch("snowflake.connector.connect", snowflake.connect))
+        patches.enter_context(mock.patch(
+            "cryptography.hazmat.primitives.serialization.load_pem_private_key", lambda *a, **k: key
+        ))
+
+        # Warm imports and process-wide caches so the first level is not charged for them
+        warmup = SimulatedSession(-1, card_ids, {"view": 1}, 0, args.timeout)
+        warmup.interact("load", warmup.at)
+
+        print(f"{len(card_ids)} cards x {args.annotations_per_card} annotations, "
+              f"Domo +{args.domo_latency_ms:.0f} ms, Snowflake +{args.snowflake_latency_ms:.0f} ms, mix {args.mix}\n")
+        print(f"{'sessions':>8} {'reruns':>7} {'reruns/s':>9} {'p50 ms':>8} {'p90 ms':>8} "
+              f"{'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'errors':>7} {'MB/session':>10}")
+        results = []
+        for sessions in levels:
+            results.append(run_level(sessions, card_ids, args))
+            print_level(results[-1])
+        print_scripts(results[-1])
+        print(f"\nDomo requests: {domo.requests}")
+
+    last = results[-1]
+    p95_ms = percentile(last["latencies"], 95) * 1000
+    if args.max_p95_ms is not None and p95_ms > args.max_p95_ms:
+        print(f"\nFAIL: p95 {p95_ms:.0f} ms > {args.max_p95_ms:.0f} ms at {last['sessions']} sessions")
+        return 1
+    if last["error_rate"] > args.max_error_rate:
+        print(f"\nFAIL: error rate {last['error_rate']:.1%} > {args.max_error_rate:.1%} at {last['sessions']} sessions")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
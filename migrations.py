@@ -0,0 +1,145 @@
+"""
+Versioned schema migrations for the annotations tables in Snowflake.
+
+Each migration is a numbered list of idempotent statements. `migrate()` applies
+the ones a schema has not recorded yet, in order, and records each version in
+a versions table next to the annotations table, so every app process can call
+it before its first write and only the first one does any work:
+
+    tables = schema_tables("ANNOTATIONS")
+    migrate(conn, tables)
+
+Statements are plain Snowflake SQL; loadtest.py runs them against its SQLite
+stand-in (`python loadtest.py --check-migrations`).
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+# (version, description, statements); statements are formatted with schema_tables()
+MIGRATIONS: List[Tuple[int, str, List[str]]] = [
+    (1, "Annotations, tombstone, mapping, checkpoint and auto-sync tables", [
+        """
+        CREATE TABLE IF NOT EXISTS {table} (
+            CARD_ID NUMBER,
+            ID NUMBER,
+            DOMO_USER_ID NUMBER,
+            DOMO_USER_NAME VARCHAR,
+            COLOR VARCHAR,
+            CONTENT VARCHAR,
+            ENTRY_DATE DATE,
+            CREATED_DATE TIMESTAMP_NTZ
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS {tombstones} (
+            ID NUMBER,
+            CARD_ID NUMBER,
+            CONTENT VARCHAR,
+            ENTRY_DATE DATE,
+            DELETED_AT TIMESTAMP_NTZ
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS {mapping} (
+            SOURCE_KEY VARCHAR,
+            CARD_ID NUMBER,
+            DOMO_ANNOTATION_ID NUMBER,
+            CREATED_DATE TIMESTAMP_NTZ
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS {checkpoints} (
+            JOB_ID VARCHAR,
+            SHARD NUMBER,
+            CARD_ID NUMBER,
+            STATUS VARCHAR,
+            RESULTS VARCHAR,
+            UPDATED_AT TIMESTAMP_NTZ
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS {auto_sync} (
+            CARD_ID NUMBER,
+            REGISTERED_AT TIMESTAMP_NTZ
+        )
+        """,
+    ]),
+    (2, "Change watermark and Domo instance columns", [
+        "ALTER TABLE {table} ADD COLUMN IF NOT EXISTS UPDATED_AT TIMESTAMP_NTZ",
+        "ALTER TABLE {table} ADD COLUMN IF NOT EXISTS DOMO_INSTANCE VARCHAR",
+        "ALTER TABLE {mapping} ADD COLUMN IF NOT EXISTS DOMO_INSTANCE VARCHAR",
+        "ALTER TABLE {checkpoints} ADD COLUMN IF NOT EXISTS DOMO_INSTANCE VARCHAR",
+        "ALTER TABLE {auto_sync} ADD COLUMN IF NOT EXISTS DOMO_INSTANCE VARCHAR",
+    ]),
+    (3, "Surrogate ROW_KEY on every annotation, global ones included", [
+        "ALTER TABLE {table} ADD COLUMN IF NOT EXISTS ROW_KEY VARCHAR",
+        "UPDATE {table} SET ROW_KEY = UUID_STRING() WHERE ROW_KEY IS NULL",
+        "ALTER TABLE {tombstones} ADD COLUMN IF NOT EXISTS ROW_KEY VARCHAR",
+    ]),
+    (4, "Cluster annotations on the ENTRY_DATE / CARD_ID filters", [
+        "ALTER TABLE {table} CLUSTER BY (ENTRY_DATE, CARD_ID)",
+    ]),
+    (5, "Domo instance on tombstones, since Domo IDs are only unique per instance", [
+        "ALTER TABLE {tombstones} ADD COLUMN IF NOT EXISTS DOMO_INSTANCE VARCHAR",
+    ]),
+]
+
+
+def schema_tables(
+    table: str,
+    tombstones: Optional[str] = None,
+    mapping: Optional[str] = None,
+    checkpoints: Optional[str] = None,
+    auto_sync: Optional[str] = None
+) -> Dict[str, str]:
+    """Table names the migrations are formatted with; side tables default to `<table>_<suffix>`."""
+    return {
+        "table": table,
+        "tombstones": tombstones or f"{table}_TOMBSTONES",
+        "mapping": mapping or f"{table}_DOMO_MAP",
+        "checkpoints": checkpoints or f"{table}_JOB_CHECKPOINTS",
+        "auto_sync": auto_sync or f"{table}_AUTO_SYNC",
+        "versions": f"{table}_SCHEMA_VERSIONS",
+    }
+
+
+def applied_versions(cursor, tables: Dict[str, str]) -> List[int]:
+    """Versions already recorded for this schema, creating the versions table if needed."""
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {tables['versions']} (
+            VERSION NUMBER,
+            DESCRIPTION VARCHAR,
+            APPLIED_AT TIMESTAMP_NTZ
+        )
+    """)
+    cursor.execute(f"SELECT DISTINCT VERSION FROM {tables['versions']}")
+    return sorted(int(row[0]) for row in cursor.fetchall())
+
+
+def pending_migrations(cursor, tables: Dict[str, str]) -> List[Tuple[int, str, List[str]]]:
+    """Migrations not applied to this schema yet, in order."""
+    applied = set(applied_versions(cursor, tables))
+    return [migration for migration in MIGRATIONS if migration[0] not in applied]
+
+
+def migrate(conn, tables: Dict[str, str]) -> List[int]:
+    """
+    Apply every pending migration on an open connection, committing after each
+    version. Returns the versions applied. Raises on failure; versions applied
+    before the failure stay recorded, and the statements are safe to re-run.
+    """
+    cursor = conn.cursor()
+    applied = []
+    try:
+        for version, description, statements in pending_migrations(cursor, tables):
+            for statement in statements:
+                cursor.execute(statement.format(**tables))
+            cursor.execute(
+                f"INSERT INTO {tables['versions']} (VERSION, DESCRIPTION, APPLIED_AT) VALUES (%s, %s, CURRENT_TIMESTAMP())",
+                (version, description)
+            )
+            conn.commit()
+            applied.append(version)
+    finally:
+        cursor.close()
+    return applied
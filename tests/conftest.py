@@ -0,0 +1,36 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# app.py lives at the repository root; importing it defines the classes without running main()
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import app
+
+
+class FakeClock:
+    """Stand-in for time.monotonic or time.time that only moves when a test advances it."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(app.time, "monotonic", fake)
+    return fake
+
+
+@pytest.fixture
+def wall_clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(app.time, "time", fake)
+    return fake
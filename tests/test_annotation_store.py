@@ -0,0 +1,72 @@
+from datetime import datetime
+
+from app import AnnotationStore
+
+
+def row(id=None, content="Launch", entry_date="2024-01-01", instance=None, row_key=None, card_id=111, **extra):
+    return {
+        "ID": id, "CARD_ID": card_id if id is not None else None, "DOMO_USER_ID": 1, "DOMO_USER_NAME": "u",
+        "COLOR": "#72B0D7", "CONTENT": content, "ENTRY_DATE": entry_date,
+        "CREATED_DATE": datetime(2024, 1, 1), "DOMO_INSTANCE": instance, "ROW_KEY": row_key, **extra,
+    }
+
+
+def merge(frame_rows, rows=(), tombstones=()):
+    frame = AnnotationStore.to_frame(list(frame_rows))
+    return AnnotationStore.merge_changes(frame, list(rows), list(tombstones), default_instance="main")
+
+
+def contents(frame):
+    return sorted(frame["CONTENT"].tolist())
+
+
+def test_changed_row_replaces_the_row_with_its_row_key():
+    merged = merge([row(1, "Old", row_key="k1"), row(2, "Other", row_key="k2")], rows=[row(1, "New", row_key="k1")])
+    assert contents(merged) == ["New", "Other"]
+
+
+def test_new_row_is_added():
+    merged = merge([row(1, "Old", row_key="k1")], rows=[row(2, "New", row_key="k2")])
+    assert contents(merged) == ["New", "Old"]
+
+
+def test_tombstone_removes_the_row_with_its_row_key():
+    merged = merge([row(1, "Gone", row_key="k1"), row(2, "Kept", row_key="k2")], tombstones=[row(row_key="k1")])
+    assert contents(merged) == ["Kept"]
+
+
+def test_unkeyed_change_matches_id_on_the_same_instance_only():
+    merged = merge(
+        [row(1, "Main", instance="main", row_key="k1"), row(1, "Other", instance="other", row_key="k2")],
+        rows=[row(1, "Main edited", instance="main")],
+    )
+    assert contents(merged) == ["Main edited", "Other"]
+
+
+def test_null_instance_belongs_to_the_default_instance():
+    merged = merge(
+        [row(1, "Legacy", instance=None), row(1, "Other", instance="other")],
+        tombstones=[{"ID": 1, "DOMO_INSTANCE": "main"}],
+    )
+    assert contents(merged) == ["Other"]
+
+
+def test_global_tombstone_without_keys_matches_content_and_date():
+    merged = merge(
+        [row(content="Global", entry_date="2024-01-01"), row(content="Global", entry_date="2024-02-01")],
+        tombstones=[{"CONTENT": "Global", "ENTRY_DATE": "2024-01-01"}],
+    )
+    assert merged["ENTRY_DATE"].tolist() == ["2024-02-01"]
+
+
+def test_overlapping_deltas_do_not_repeat_unkeyed_global_rows():
+    merged = merge([row(content="Global")], rows=[row(content="Global")])
+    assert contents(merged) == ["Global"]
+
+
+def test_merged_frame_is_newest_entry_first():
+    merged = merge(
+        [row(1, "January", entry_date="2024-01-01", row_key="k1")],
+        rows=[row(2, "March", entry_date="2024-03-01", row_key="k2")],
+    )
+    assert merged["CONTENT"].tolist() == ["March", "January"]
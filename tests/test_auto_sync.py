@@ -0,0 +1,139 @@
+import time
+
+from app import AutoSyncScheduler
+
+
+class ScriptedSync:
+    """sync_card() stand-in returning the queued results (or raising queued exceptions) in order."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def __call__(self, card_id):
+        self.calls.append(card_id)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def changed():
+    return {"inserted": 1, "updated": 0, "skipped": 0, "failed": 0}
+
+
+def unchanged():
+    return {"inserted": 0, "updated": 0, "skipped": 3, "failed": 0}
+
+
+def scheduler(sync_card, budget_per_minute=0, **kwargs):
+    """A scheduler with card 111 registered. With no budget its own thread never polls, so tests call _poll."""
+    kwargs = {"min_interval": 10, "max_interval": 80, **kwargs}
+    auto_sync = AutoSyncScheduler(sync_card, lambda: ["111"], budget_per_minute, **kwargs)
+    auto_sync.register("111")
+    return auto_sync
+
+
+def card_status(auto_sync):
+    [status] = auto_sync.status()
+    return status
+
+
+# ==========================
+# TOKEN BUCKET
+# ==========================
+def test_bucket_starts_full_and_runs_dry(wall_clock):
+    auto_sync = AutoSyncScheduler(ScriptedSync(), lambda: [], budget_per_minute=3, min_interval=10, max_interval=80)
+    assert [auto_sync._take_token() for _ in range(4)] == [True, True, True, False]
+
+
+def test_bucket_refills_at_the_per_minute_rate(wall_clock):
+    auto_sync = AutoSyncScheduler(ScriptedSync(), lambda: [], budget_per_minute=3, min_interval=10, max_interval=80)
+    for _ in range(3):
+        auto_sync._take_token()
+    wall_clock.advance(10)
+    assert not auto_sync._take_token()
+    wall_clock.advance(10)
+    assert auto_sync._take_token()
+    assert not auto_sync._take_token()
+
+
+def test_bucket_never_holds_more_than_the_budget(wall_clock):
+    auto_sync = AutoSyncScheduler(ScriptedSync(), lambda: [], budget_per_minute=3, min_interval=10, max_interval=80)
+    wall_clock.advance(3600)
+    assert [auto_sync._take_token() for _ in range(4)] == [True, True, True, False]
+
+
+# ==========================
+# POLLING
+# ==========================
+def test_quiet_card_backs_off_to_max_interval(wall_clock):
+    auto_sync = scheduler(ScriptedSync(*[unchanged() for _ in range(4)]))
+    intervals = []
+    for _ in range(4):
+        auto_sync._poll("111")
+        intervals.append(card_status(auto_sync)["interval"])
+    assert intervals == [20, 40, 80, 80]
+
+
+def test_change_speeds_polling_up_to_min_interval(wall_clock):
+    on_change = []
+    auto_sync = scheduler(ScriptedSync(unchanged(), unchanged(), changed(), changed(), changed()), on_change=lambda: on_change.append(1))
+    for _ in range(5):
+        auto_sync._poll("111")
+    status = card_status(auto_sync)
+    assert status["interval"] == 10
+    assert status["last_change"] == wall_clock.now
+    assert status["polls"] == 5
+    assert len(on_change) == 3
+
+
+def test_next_poll_is_one_interval_away(wall_clock):
+    auto_sync = scheduler(ScriptedSync(unchanged()))
+    auto_sync._poll("111")
+    wall_clock.advance(5)
+    status = card_status(auto_sync)
+    assert status["next_run_in"] == 15
+    assert status["lag"] == 5
+
+
+def test_failed_sync_keeps_its_reason_and_pace(wall_clock):
+    auto_sync = scheduler(ScriptedSync(unchanged(), {"inserted": 0, "updated": 0, "skipped": 0, "failed": 1, "error": "HTTP 500: boom"}))
+    auto_sync._poll("111")
+    wall_clock.advance(20)
+    auto_sync._poll("111")
+    status = card_status(auto_sync)
+    assert status["last_error"] == "HTTP 500: boom"
+    assert status["interval"] == 20
+    assert status["next_run_in"] == 20
+    assert status["lag"] == 20
+
+
+def test_failure_without_a_reason(wall_clock):
+    auto_sync = scheduler(ScriptedSync({"inserted": 0, "updated": 0, "skipped": 0, "failed": 1}))
+    auto_sync._poll("111")
+    assert card_status(auto_sync)["last_error"] == "sync failed"
+
+
+def test_raised_error_is_recorded_and_cleared_by_the_next_good_poll(wall_clock):
+    auto_sync = scheduler(ScriptedSync(RuntimeError("Snowflake is down"), unchanged()))
+    auto_sync._poll("111")
+    assert card_status(auto_sync)["last_error"] == "Snowflake is down"
+    assert card_status(auto_sync)["lag"] is None
+    auto_sync._poll("111")
+    assert card_status(auto_sync)["last_error"] is None
+
+
+def test_poller_syncs_every_registered_card():
+    calls = []
+
+    def sync_card(card_id):
+        calls.append(card_id)
+        return unchanged()
+
+    auto_sync = AutoSyncScheduler(sync_card, lambda: ["111", "other:222"], budget_per_minute=60, min_interval=60, max_interval=120)
+    deadline = time.monotonic() + 5
+    while [status["polls"] for status in auto_sync.status()] != [1, 1] and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert sorted(calls) == ["111", "other:222"]
+    assert [status["interval"] for status in auto_sync.status()] == [120, 120]
@@ -0,0 +1,73 @@
+import pytest
+
+from app import CardCatalog
+
+CARDS = [
+    ("123", "Revenue daily", "Sales", "orders"),
+    ("1234", "Revenue weekly", "Sales", "orders"),
+    ("555", "50% of target", "KPIs", "targets"),
+    ("556", "500 of target", "KPIs", "targets"),
+    ("557", "a_b split", "KPIs", "ab_tests"),
+    ("558", "axb split", "KPIs", "tests"),
+    ("other:123", "Churn", "Retention", "customers"),
+]
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    def loader():
+        return [
+            {
+                "card_ref": card_ref, "instance": card_ref.split(":")[0] if ":" in card_ref else "main",
+                "card_id": card_ref.split(":")[-1], "title": title, "page": page, "dataset": dataset,
+            }
+            for card_ref, title, page, dataset in CARDS
+        ]
+
+    # The background refresh waits a day after its first load; tests refresh explicitly
+    catalog = CardCatalog(loader, str(tmp_path / "catalog.db"), refresh_seconds=86400)
+    catalog.refresh()
+    return catalog
+
+
+def refs(results):
+    return [card["card_ref"] for card in results]
+
+
+def test_id_prefix_matches_on_every_instance(catalog):
+    assert refs(catalog.search("123")) == ["123", "other:123", "1234"]
+
+
+def test_card_ref_prefix(catalog):
+    assert refs(catalog.search("other:")) == ["other:123"]
+
+
+def test_every_word_must_match_title_page_or_dataset(catalog):
+    assert refs(catalog.search("revenue weekly")) == ["1234"]
+    assert refs(catalog.search("retention")) == ["other:123"]
+
+
+def test_search_ignores_case(catalog):
+    assert refs(catalog.search("REVENUE DAILY")) == ["123"]
+
+
+def test_short_words_filter_without_the_trigram_index(catalog):
+    assert set(refs(catalog.search("ab"))) == {"557"}
+
+
+@pytest.mark.parametrize("query, expected", [("%", {"555"}), ("_", {"557"}), ("0%", {"555"})])
+def test_like_wildcards_in_short_words_are_literal(catalog, query, expected):
+    assert set(refs(catalog.search(query))) == expected
+
+
+def test_limit(catalog):
+    assert len(catalog.search("target", limit=1)) == 1
+
+
+def test_blank_or_quote_only_query(catalog):
+    assert catalog.search("   ") == []
+    assert catalog.search('"') == []
+
+
+def test_titles(catalog):
+    assert catalog.titles(["123", "other:123", "999"]) == {"123": "Revenue daily", "other:123": "Churn"}
@@ -0,0 +1,92 @@
+import threading
+
+import pytest
+
+from app import CardWriteQueue
+
+WINDOW = 0.05
+TIMEOUT = 5
+
+
+class RecordingFlush:
+    """flush() stand-in that records each merged write and creates one annotation per add."""
+
+    def __init__(self, created=None, error=None):
+        self.calls = []
+        self.created = created
+        self.error = error
+
+    def __call__(self, card_id, adds, deletes):
+        self.calls.append((card_id, adds, deletes))
+        if self.error:
+            raise self.error
+        if self.created is not None:
+            return self.created
+        return [dict(annotation, id=i) for i, annotation in enumerate(adds)]
+
+
+def test_writes_within_the_window_share_one_flush():
+    flush = RecordingFlush()
+    writes = CardWriteQueue(flush, WINDOW)
+    first = writes.add("111", {"content": "a"})
+    second = writes.add("111", {"content": "b"})
+    deleted = writes.delete("111", 7)
+    assert first.result(TIMEOUT) == {"content": "a", "id": 0}
+    assert second.result(TIMEOUT) == {"content": "b", "id": 1}
+    assert deleted.result(TIMEOUT) is True
+    assert flush.calls == [("111", [{"content": "a"}, {"content": "b"}], [7])]
+
+
+def test_each_card_gets_its_own_flush():
+    flush = RecordingFlush()
+    writes = CardWriteQueue(flush, WINDOW)
+    futures = [writes.add("111", {"content": "a"}), writes.add("other:111", {"content": "b"})]
+    for future in futures:
+        future.result(TIMEOUT)
+    assert sorted(card_id for card_id, _, _ in flush.calls) == ["111", "other:111"]
+
+
+def test_repeated_deletes_are_sent_once():
+    flush = RecordingFlush()
+    writes = CardWriteQueue(flush, WINDOW)
+    futures = [writes.delete("111", 7), writes.delete("111", 7), writes.delete("111", 8)]
+    assert [future.result(TIMEOUT) for future in futures] == [True, True, True]
+    assert flush.calls == [("111", [], [7, 8])]
+
+
+def test_adds_the_flush_did_not_confirm_resolve_to_none():
+    writes = CardWriteQueue(RecordingFlush(created=[{"id": 1}]), WINDOW)
+    first = writes.add("111", {"content": "a"})
+    second = writes.add("111", {"content": "b"})
+    assert first.result(TIMEOUT) == {"id": 1}
+    assert second.result(TIMEOUT) is None
+
+
+def test_flush_error_fails_every_write_in_the_batch():
+    writes = CardWriteQueue(RecordingFlush(error=RuntimeError("HTTP 500")), WINDOW)
+    futures = [writes.add("111", {"content": "a"}), writes.delete("111", 7)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="HTTP 500"):
+            future.result(TIMEOUT)
+
+
+def test_saves_to_a_card_never_overlap():
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow_flush(card_id, adds, deletes):
+        calls.append(adds)
+        started.set()
+        assert release.wait(TIMEOUT)
+        return adds
+
+    writes = CardWriteQueue(slow_flush, WINDOW)
+    first = writes.add("111", {"content": "a"})
+    assert started.wait(TIMEOUT)
+    # Queued while the first save is in flight: waits for it, then saves on its own
+    second = writes.add("111", {"content": "b"})
+    third = writes.add("111", {"content": "c"})
+    release.set()
+    assert first.result(TIMEOUT) == {"content": "a"}
+    assert [second.result(TIMEOUT), third.result(TIMEOUT)] == [{"content": "b"}, {"content": "c"}]
+    assert calls == [[{"content": "a"}], [{"content": "b"}, {"content": "c"}]]
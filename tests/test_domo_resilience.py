@@ -0,0 +1,135 @@
+from app import CircuitBreaker, LatencyTracker
+
+
+def open_breaker(clock) -> CircuitBreaker:
+    """A breaker (50% errors over 4 calls, 60s window, 30s cooldown) that has just opened."""
+    breaker = CircuitBreaker(error_rate=0.5, min_requests=4, window_seconds=60, cooldown_seconds=30)
+    for ok in (True, False, True, False):
+        breaker.record(ok)
+    assert not breaker.allow()
+    return breaker
+
+
+# ==========================
+# CIRCUIT BREAKER
+# ==========================
+def test_breaker_stays_closed_below_min_requests(clock):
+    breaker = CircuitBreaker(error_rate=0.5, min_requests=4, window_seconds=60, cooldown_seconds=30)
+    for _ in range(3):
+        breaker.record(False)
+    assert breaker.allow()
+    assert breaker.retry_in() is None
+
+
+def test_breaker_stays_closed_below_error_rate(clock):
+    breaker = CircuitBreaker(error_rate=0.5, min_requests=4, window_seconds=60, cooldown_seconds=30)
+    for ok in (True, True, True, False):
+        breaker.record(ok)
+    assert breaker.allow()
+
+
+def test_breaker_forgets_outcomes_outside_the_window(clock):
+    breaker = CircuitBreaker(error_rate=0.5, min_requests=4, window_seconds=60, cooldown_seconds=30)
+    breaker.record(False)
+    breaker.record(False)
+    clock.advance(61)
+    breaker.record(False)
+    breaker.record(True)
+    breaker.record(True)
+    assert breaker.allow()
+
+
+def test_breaker_opens_and_counts_down(clock):
+    breaker = open_breaker(clock)
+    assert breaker.retry_in() == 30
+    clock.advance(10)
+    assert not breaker.allow()
+    assert breaker.retry_in() == 20
+
+
+def test_breaker_lets_one_trial_through_after_cooldown(clock):
+    breaker = open_breaker(clock)
+    clock.advance(30)
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_breaker_closes_when_the_trial_succeeds(clock):
+    breaker = open_breaker(clock)
+    clock.advance(30)
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.allow()
+    assert breaker.allow()
+    assert breaker.retry_in() is None
+
+
+def test_breaker_reopens_when_the_trial_fails(clock):
+    breaker = open_breaker(clock)
+    clock.advance(30)
+    assert breaker.allow()
+    breaker.record(False)
+    assert not breaker.allow()
+    assert breaker.retry_in() == 30
+
+
+def test_breaker_ignores_late_answers_while_open(clock):
+    breaker = open_breaker(clock)
+    breaker.record(True)
+    assert not breaker.allow()
+
+
+def test_breaker_replaces_a_trial_that_never_reports(clock):
+    breaker = open_breaker(clock)
+    clock.advance(30)
+    assert breaker.allow()
+    clock.advance(29)
+    assert not breaker.allow()
+    clock.advance(1)
+    assert breaker.allow()
+
+
+# ==========================
+# LATENCY TRACKER
+# ==========================
+def test_latency_percentile_needs_min_samples():
+    tracker = LatencyTracker(window=10, min_samples=5)
+    for seconds in (0.1, 0.2, 0.3, 0.4):
+        tracker.record("definition", seconds)
+    assert tracker.percentile("definition", 95) is None
+    tracker.record("definition", 0.5)
+    assert tracker.percentile("definition", 95) == 0.5
+
+
+def test_latency_percentile_is_per_endpoint():
+    tracker = LatencyTracker(window=10, min_samples=1)
+    tracker.record("definition", 0.1)
+    tracker.record("save", 2.0)
+    assert tracker.percentile("definition", 50) == 0.1
+    assert tracker.percentile("save", 50) == 2.0
+    assert tracker.percentile("adminsummary", 50) is None
+
+
+def test_latency_percentile_picks_from_sorted_samples():
+    tracker = LatencyTracker(window=100, min_samples=1)
+    for ms in reversed(range(1, 101)):
+        tracker.record("definition", ms / 1000)
+    assert tracker.percentile("definition", 50) == 0.051
+    assert tracker.percentile("definition", 95) == 0.096
+    assert tracker.percentile("definition", 100) == 0.1
+
+
+def test_latency_window_keeps_the_newest_samples():
+    tracker = LatencyTracker(window=3, min_samples=3)
+    for seconds in (9.0, 9.0, 9.0, 0.1, 0.2, 0.3):
+        tracker.record("definition", seconds)
+    assert tracker.percentile("definition", 100) == 0.3
+
+
+def test_latency_summary_in_milliseconds():
+    tracker = LatencyTracker(window=10, min_samples=1)
+    for seconds in (0.1, 0.2):
+        tracker.record("definition", seconds)
+    assert tracker.summary() == [
+        {"Endpoint": "definition", "Samples": 2, "p50 ms": 200.0, "p95 ms": 200.0, "p99 ms": 200.0}
+    ]
@@ -0,0 +1,57 @@
+from datetime import date, datetime
+
+import pytest
+
+from app import parse_import_row
+
+COLORS = {"Blue": "#72B0D7", "Green": "#80C25D", "Red": "#FD7F76"}
+DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y"]
+
+
+def card_ref_from_input(card_input):
+    """Numeric IDs on the default instance, "other:ID" on a second one."""
+    instance, _, card_id = card_input.rpartition(":")
+    if instance not in ("", "other") or not card_id.isdigit():
+        return None
+    return card_input
+
+
+def parse(**row):
+    return parse_import_row(row, COLORS, DATE_FORMATS, card_ref_from_input)
+
+
+def test_minimal_row_defaults_to_blue_and_no_cards():
+    assert parse(content="  Launch ", date="2024-01-31") == {
+        "content": "Launch", "entry_date": "2024-01-31", "color": "#72B0D7", "card_refs": [],
+    }
+
+
+@pytest.mark.parametrize("raw_date", ["2024-03-15", "15/03/2024", date(2024, 3, 15), datetime(2024, 3, 15, 10, 30)])
+def test_dates_from_text_and_excel_cells(raw_date):
+    assert parse(content="x", date=raw_date)["entry_date"] == "2024-03-15"
+
+
+@pytest.mark.parametrize("raw_color", ["green", "GREEN", "#80c25d"])
+def test_colors_by_name_or_hex(raw_color):
+    assert parse(content="x", date="2024-01-01", color=raw_color)["color"] == "#80C25D"
+
+
+def test_cards_split_on_commas_semicolons_and_spaces_without_repeats():
+    row = parse(content="x", date="2024-01-01", cards="1, 2;3 other:4,1")
+    assert row["card_refs"] == ["1", "2", "3", "other:4"]
+
+
+def test_excel_number_card_id():
+    assert parse(content="x", date="2024-01-01", cards=954563232.0)["card_refs"] == ["954563232"]
+
+
+@pytest.mark.parametrize("row, message", [
+    ({"content": " ", "date": "2024-01-01"}, "Content is empty"),
+    ({"content": "x", "date": "2024-13-01"}, "is not YYYY-MM-DD"),
+    ({"content": "x"}, "is not YYYY-MM-DD"),
+    ({"content": "x", "date": "2024-01-01", "color": "Pink"}, "Unknown color 'Pink'"),
+    ({"content": "x", "date": "2024-01-01", "cards": "nope:12"}, "Unknown card or Domo instance: nope:12"),
+])
+def test_invalid_rows_name_the_problem(row, message):
+    with pytest.raises(ValueError, match=message):
+        parse(**row)
@@ -0,0 +1,57 @@
+from datetime import date
+
+import pytest
+
+from app import plan_push
+
+
+def row(content, entry_date="2024-01-01", color="#72B0D7"):
+    return {"CONTENT": content, "ENTRY_DATE": entry_date, "COLOR": color}
+
+
+def domo(annotation_id, content, entry_date="2024-01-01", color="#72B0D7"):
+    return {"id": annotation_id, "content": content, "dataPoint": {"point1": entry_date}, "color": color}
+
+
+ROWS = {"id:1": row("Launch"), "id:2": row("Price change", date(2024, 2, 1)), "g:abc": row("Holiday", "2024-12-25")}
+
+
+def no_card_read():
+    raise AssertionError("the card was read although every row is in the mapping index")
+
+
+def test_first_push_sends_every_row_not_on_the_card():
+    missing, adopted = plan_push(ROWS, {}, lambda: [])
+    assert missing == ROWS
+    assert adopted == []
+
+
+def test_second_push_sends_nothing_and_skips_the_card_read():
+    missing, _ = plan_push(ROWS, {}, lambda: [])
+    # What the first push records in the mapping index
+    already_pushed = {key: 100 + i for i, key in enumerate(missing)}
+    assert plan_push(ROWS, already_pushed, no_card_read) == ({}, [])
+
+
+def test_only_rows_missing_from_the_index_are_pushed():
+    missing, adopted = plan_push(ROWS, {"id:1": 100}, lambda: [])
+    assert set(missing) == {"id:2", "g:abc"}
+    assert adopted == []
+
+
+def test_rows_already_on_the_card_are_adopted():
+    card = [domo(500, "Launch"), domo(501, "Price change", "2024-02-01")]
+    missing, adopted = plan_push(ROWS, {}, lambda: card)
+    assert set(missing) == {"g:abc"}
+    assert sorted(adopted) == [("id:1", 500), ("id:2", 501)]
+
+
+@pytest.mark.parametrize("on_card", [
+    domo(500, "Launch", entry_date="2024-01-02"),
+    domo(500, "Launch", color="#FD7F76"),
+    domo(500, "Launch!"),
+])
+def test_adoption_needs_the_same_text_date_and_color(on_card):
+    missing, adopted = plan_push({"id:1": row("Launch")}, {}, lambda: [on_card])
+    assert set(missing) == {"id:1"}
+    assert adopted == []
@@ -0,0 +1,67 @@
+import pytest
+
+from app import resolve_created_annotations
+
+
+def new(content, entry_date="2024-01-01", color="#72B0D7"):
+    return {"content": content, "dataPoint": {"point1": entry_date}, "color": color}
+
+
+def domo(annotation_id, content, entry_date="2024-01-01", color="#72B0D7"):
+    return dict(new(content, entry_date, color), id=annotation_id)
+
+
+def no_refetch():
+    raise AssertionError("the card was refetched although the save response had every annotation")
+
+
+def ids(resolved):
+    return [ann["id"] if ann else None for ann in resolved]
+
+
+@pytest.mark.parametrize("response_key", ["annotations", "definition"])
+def test_save_response_resolves_without_a_refetch(response_key):
+    annotations = [domo(1, "Old"), domo(2, "Launch")]
+    save_response = {"annotations": annotations} if response_key == "annotations" else {"definition": {"annotations": annotations}}
+    assert ids(resolve_created_annotations({1}, [new("Launch")], save_response, no_refetch)) == [2]
+
+
+def test_annotation_on_the_card_before_the_save_is_never_picked():
+    save_response = {"annotations": [domo(1, "Launch"), domo(5, "Launch")]}
+    assert ids(resolve_created_annotations({1}, [new("Launch")], save_response, no_refetch)) == [5]
+
+
+def test_identical_adds_get_distinct_annotations_in_id_order():
+    save_response = {"annotations": [domo(9, "Launch"), domo(8, "Launch")]}
+    resolved = resolve_created_annotations(set(), [new("Launch"), new("Launch")], save_response, no_refetch)
+    assert ids(resolved) == [8, 9]
+
+
+def test_match_needs_the_same_date_and_color():
+    save_response = {"annotations": [domo(2, "Launch", entry_date="2024-01-02"), domo(3, "Launch", color="#FD7F76")]}
+    resolved = resolve_created_annotations(set(), [new("Launch")], save_response, lambda: [])
+    assert ids(resolved) == [None]
+
+
+def test_unresolved_adds_fall_back_to_one_refetch():
+    refetches = []
+
+    def refetch():
+        refetches.append(1)
+        return [domo(1, "Old"), domo(2, "Launch"), domo(3, "Price change")]
+
+    save_response = {"annotations": [domo(2, "Launch")]}
+    resolved = resolve_created_annotations({1}, [new("Launch"), new("Price change")], save_response, refetch)
+    assert ids(resolved) == [2, 3]
+    assert len(refetches) == 1
+
+
+@pytest.mark.parametrize("save_response", [None, {}, {"definition": None}, "ok"])
+def test_response_without_annotations_refetches(save_response):
+    resolved = resolve_created_annotations({1}, [new("Launch")], save_response, lambda: [domo(1, "Old"), domo(2, "Launch")])
+    assert ids(resolved) == [2]
+
+
+def test_add_that_never_appeared_resolves_to_none():
+    resolved = resolve_created_annotations(set(), [new("Launch"), new("Lost")], {"annotations": [domo(2, "Launch")]}, lambda: [])
+    assert ids(resolved) == [2, None]
@@ -0,0 +1,54 @@
+from app import stream_sync_chunks
+
+
+def domo(annotation_id, entry_date):
+    return {"id": annotation_id, "content": "x", "dataPoint": {"point1": entry_date}}
+
+
+def chunk_ids(domo_annotations, chunk_size):
+    return [[ann["id"] for ann in chunk] for chunk, _, _ in stream_sync_chunks(domo_annotations, chunk_size)]
+
+
+def windows(domo_annotations, chunk_size):
+    return [(date_range, id_range) for _, date_range, id_range in stream_sync_chunks(domo_annotations, chunk_size)]
+
+
+def test_chunks_follow_date_then_id_order():
+    annotations = [domo(5, "2024-03-01"), domo(3, "2024-01-01"), domo(9, "2024-02-01"), domo(1, "2024-02-01")]
+    assert chunk_ids(annotations, 2) == [[3, 1], [9, 5]]
+
+
+def test_every_annotation_lands_in_exactly_one_chunk():
+    annotations = [domo(i, f"2024-01-{i % 28 + 1:02d}") for i in range(1, 101)]
+    chunks = chunk_ids(annotations, 7)
+    assert [len(chunk) for chunk in chunks] == [7] * 14 + [2]
+    assert sorted(i for chunk in chunks for i in chunk) == list(range(1, 101))
+
+
+def test_window_is_the_chunk_date_and_id_range():
+    annotations = [domo(10, "2024-01-01"), domo(20, "2024-01-05"), domo(30, "2024-02-01"), domo(40, "2024-03-01")]
+    assert windows(annotations, 2) == [(("2024-01-01", "2024-01-05"), (10, 20)), (("2024-02-01", "2024-03-01"), (30, 40))]
+
+
+def test_busy_date_is_split_by_id_range():
+    annotations = [domo(i, "2024-01-01") for i in range(1, 7)]
+    assert windows(annotations, 4) == [(("2024-01-01", "2024-01-01"), (1, 4)), (("2024-01-01", "2024-01-01"), (5, 6))]
+
+
+def test_undated_annotations_come_first_and_read_by_id_only():
+    annotations = [domo(3, "2024-01-01"), domo(1, ""), domo(2, "")]
+    assert windows(annotations, 2) == [(None, (1, 2)), (("2024-01-01", "2024-01-01"), (3, 3))]
+
+
+def test_chunk_starting_undated_reads_up_to_its_last_date():
+    annotations = [domo(1, ""), domo(2, "2024-01-01")]
+    assert windows(annotations, 2) == [((None, "2024-01-01"), (1, 2))]
+
+
+def test_annotations_without_ids_leave_no_id_range():
+    annotations = [{"content": "x", "dataPoint": {"point1": "2024-01-01"}}]
+    assert windows(annotations, 2) == [(("2024-01-01", "2024-01-01"), None)]
+
+
+def test_no_annotations_no_chunks():
+    assert list(stream_sync_chunks([], 5)) == []
@@ -0,0 +1,61 @@
+from datetime import datetime
+
+from app import diff_card_annotations
+
+CREATED_MS = 1704103200000
+
+
+def domo(annotation_id, content="Launch", color="#72B0D7", entry_date="2024-01-01", created=CREATED_MS):
+    return {
+        "id": annotation_id, "content": content, "color": color, "dataPoint": {"point1": entry_date},
+        "userId": 7, "userName": "Dana", "createdDate": created,
+    }
+
+
+def sf(annotation_id, content="Launch", color="#72B0D7", created=datetime(2024, 1, 1, 10)):
+    return {"ID": annotation_id, "CONTENT": content, "COLOR": color, "CREATED_DATE": created}
+
+
+def diff(domo_annotations, sf_annotations, instance="main"):
+    return diff_card_annotations(instance, "111", domo_annotations, sf_annotations, default_instance="main")
+
+
+def test_unchanged_annotations_are_skipped():
+    assert diff([domo(1), domo(2)], [sf(1), sf(2)]) == {"inserts": [], "updates": [], "skipped": 2}
+
+
+def test_annotation_missing_from_snowflake_is_inserted():
+    changes = diff([domo(1)], [])
+    created = datetime.fromtimestamp(CREATED_MS / 1000)
+    assert changes["inserts"] == [(111, 1, 7, "Dana", "#72B0D7", "Launch", "2024-01-01", created, "main")]
+    assert changes["updates"] == []
+
+
+def test_changed_text_or_color_is_updated():
+    changes = diff([domo(1, content="Launch v2"), domo(2, color="#FD7F76")], [sf(1), sf(2)])
+    assert [update[:2] for update in changes["updates"]] == [("Launch v2", "#72B0D7"), ("Launch", "#FD7F76")]
+    assert changes["skipped"] == 0
+
+
+def test_missing_created_date_is_backfilled():
+    changes = diff([domo(1)], [sf(1, created=None)])
+    assert changes["updates"][0][5] == datetime.fromtimestamp(CREATED_MS / 1000)
+
+
+def test_update_matches_unlabelled_rows_as_the_default_instance():
+    # Parameters of the UPDATE's WHERE ID = %s AND COALESCE(DOMO_INSTANCE, %s) = %s
+    assert diff([domo(1, content="New")], [sf(1)], instance="other")["updates"][0][-3:] == (1, "main", "other")
+
+
+def test_snowflake_rows_without_an_id_never_match():
+    changes = diff([domo(1)], [{**sf(1), "ID": None}])
+    assert len(changes["inserts"]) == 1
+
+
+def test_snowflake_only_rows_are_left_alone():
+    assert diff([], [sf(1)]) == {"inserts": [], "updates": [], "skipped": 0}
+
+
+def test_undated_domo_annotation_without_created_date():
+    changes = diff([domo(1, entry_date="", created=0)], [])
+    assert changes["inserts"][0][6:8] == ("", None)